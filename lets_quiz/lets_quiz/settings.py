@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/1.11/ref/settings/
 """
 
 import os
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -47,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'quiz.instrumentation.RequestInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,6 +73,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'quiz.context_processors.current_quiz',
+                'quiz.context_processors.capabilities',
             ],
         },
     },
@@ -81,12 +85,87 @@ WSGI_APPLICATION = 'lets_quiz.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/1.11/ref/settings/#databases
 
-DATABASES = {
+# A profil környezeti változókból jön:
+#   QUIZ_DB_ENGINE         sqlite (alapértelmezett) | postgresql (psycopg2 kell hozzá)
+#   QUIZ_DB_NAME           SQLite-nál a fájl útvonala, PostgreSQL-nél az adatbázis neve
+#   QUIZ_DB_USER, QUIZ_DB_PASSWORD, QUIZ_DB_HOST, QUIZ_DB_PORT   PostgreSQL
+#   QUIZ_DB_CONN_MAX_AGE   perzisztens kapcsolat élettartama másodpercben (0: kérésenként új kapcsolat)
+#   QUIZ_DB_BUSY_TIMEOUT   SQLite: ennyi másodpercig vár a zárra, mielőtt "database is locked" hibát ad
+#   QUIZ_DB_TEST_NAME      a teszt-adatbázis neve; SQLite-nál fájl megadásával a tesztek is WAL módban futnak
+# A SQLite pragmákat (WAL, synchronous=NORMAL) és a zárolási újrapróbálást a quiz.database állítja be.
+
+DB_ENGINE = os.environ.get('QUIZ_DB_ENGINE', 'sqlite')
+DB_CONN_MAX_AGE = int(os.environ.get('QUIZ_DB_CONN_MAX_AGE', '60'))
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('QUIZ_DB_NAME', 'lets_quiz'),
+            'USER': os.environ.get('QUIZ_DB_USER', ''),
+            'PASSWORD': os.environ.get('QUIZ_DB_PASSWORD', ''),
+            'HOST': os.environ.get('QUIZ_DB_HOST', ''),
+            'PORT': os.environ.get('QUIZ_DB_PORT', ''),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        }
+    }
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('QUIZ_DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'OPTIONS': {
+                'timeout': float(os.environ.get('QUIZ_DB_BUSY_TIMEOUT', '20')),
+            },
+        }
+    }
+else:
+    raise ValueError('Unsupported QUIZ_DB_ENGINE: {}'.format(DB_ENGINE))
+
+if os.environ.get('QUIZ_DB_TEST_NAME'):
+    DATABASES['default']['TEST'] = {'NAME': os.environ['QUIZ_DB_TEST_NAME']}
+
+
+# Cache
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+
+# A cache-elt oldalak és részletek érvénytelenítése (quiz.page_cache generációk,
+# quiz.capabilities, quiz.results, a kvíz-pillanatképek) és a kérésstatisztika
+# (quiz.instrumentation, request_stats parancs) a cache-en keresztül jut el a többi
+# workerhez és a management parancsokhoz, ezért a backendnek minden folyamat
+# számára közösnek kell lennie. A folyamatonkénti locmem csak egyfolyamatos futásnál jó.
+#   QUIZ_CACHE_BACKEND     file (alapértelmezett, egy gépen futó workereknek) | memcached (python-memcached kell hozzá) | db | locmem
+#   QUIZ_CACHE_LOCATION    file: könyvtár, memcached: host:port, db: tábla (előtte: manage.py createcachetable)
+#   QUIZ_CACHE_MAX_ENTRIES file / db / locmem: ennyi bejegyzés fölött a régieket törli
+# A tesztek folyamaton belül futnak és cache.clear()-t hívnak, ezért ott mindig locmem van.
+
+CACHE_BACKEND = os.environ.get('QUIZ_CACHE_BACKEND', 'file')
+if len(sys.argv) > 1 and sys.argv[1] == 'test':
+    CACHE_BACKEND = 'locmem'
+
+CACHE_BACKENDS = {
+    'file': ('django.core.cache.backends.filebased.FileBasedCache',
+             os.path.join(tempfile.gettempdir(), 'lets_quiz_cache')),
+    'memcached': ('django.core.cache.backends.memcached.MemcachedCache', '127.0.0.1:11211'),
+    'db': ('django.core.cache.backends.db.DatabaseCache', 'quiz_cache'),
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'lets_quiz'),
+}
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ValueError('Unsupported QUIZ_CACHE_BACKEND: {}'.format(CACHE_BACKEND))
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.environ.get('QUIZ_CACHE_LOCATION', CACHE_BACKENDS[CACHE_BACKEND][1]),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('QUIZ_CACHE_MAX_ENTRIES', '10000')),
+        },
     }
 }
+if CACHE_BACKEND == 'memcached':
+    # a memcached maga kezeli a kiürítést
+    del CACHES['default']['OPTIONS']
 
 
 # Password validation
@@ -0,0 +1,120 @@
+"""
+Kvíz-hozzáférés: a Quiz.allowed_users / allowed_groups mezőkből számolt,
+denormalizált QuizAccess index karbantartása és lekérdezése.
+
+Logika (ugyanaz, mint korábban a get_accessible_quizzes_for_user-ben):
+- ha a kvízhez NINCS felhasználó és NINCS csoport hozzárendelve → mindenki láthatja
+- ha VAN hozzárendelve user/csoport → csak az láthatja, aki érintett
+- superuser mindent lát
+
+Az index a m2m_changed jelzésekre frissül (quiz.signals), így a kvízlista és a
+jogosultság-ellenőrzés is egyetlen indexelt lekérdezés.
+"""
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+
+from . import page_cache
+from .models import Quiz, QuizAccess
+
+# ennyi user / sor megy egy IN (...) listába, illetve egy INSERT-be
+BATCH_SIZE = 500
+
+
+def accessible_quizzes(user):
+    """A user által látható/kitölthető kvízek querysetje."""
+    if user.is_authenticated and user.is_superuser:
+        return Quiz.objects.all()
+    if not user.is_authenticated:
+        # nem belépett user csak a nyitott kvízeket lássa
+        return Quiz.objects.filter(is_restricted=False)
+    return Quiz.objects.filter(
+        Q(is_restricted=False) | Q(pk__in=QuizAccess.objects.filter(user_id=user.pk).values('quiz_id'))
+    )
+
+
+def can_access(user, quiz):
+    if not quiz.is_restricted or user.is_superuser:
+        return True
+    return QuizAccess.objects.filter(user_id=user.pk, quiz_id=quiz.pk).exists()
+
+
+@transaction.atomic
+def rebuild_quiz_access(quiz_id):
+    """Egy kvíz index-sorainak újraszámolása az allowed_users / allowed_groups alapján."""
+    User = get_user_model()
+    quiz = Quiz.objects.filter(pk=quiz_id).first()
+    if quiz is None:
+        return
+
+    user_ids = set(quiz.allowed_users.values_list('pk', flat=True))
+    group_ids = list(quiz.allowed_groups.values_list('pk', flat=True))
+    if group_ids:
+        user_ids.update(User.objects.filter(groups__in=group_ids).values_list('pk', flat=True))
+    is_restricted = bool(user_ids or group_ids)
+
+    if quiz.is_restricted != is_restricted:
+        Quiz.objects.filter(pk=quiz.pk).update(is_restricted=is_restricted)
+
+    existing = set(QuizAccess.objects.filter(quiz_id=quiz.pk).values_list('user_id', flat=True))
+    if existing - user_ids:
+        QuizAccess.objects.filter(quiz_id=quiz.pk, user_id__in=existing - user_ids).delete()
+    QuizAccess.objects.bulk_create(
+        [QuizAccess(quiz_id=quiz.pk, user_id=user_id) for user_id in user_ids - existing], batch_size=500
+    )
+    page_cache.bump(page_cache.QUIZZES)
+
+
+def rebuild_user_access(user_id):
+    """Egy user index-sorainak újraszámolása (pl. csoporttagság változásakor)."""
+    rebuild_users_access([user_id])
+
+
+@transaction.atomic
+def rebuild_users_access(user_ids):
+    """
+    Több user index-sorainak újraszámolása kötegenként néhány lekérdezéssel (a
+    tömeges csoporttagság-módosítás, quiz.memberships, nem küld m2m jelzést).
+    """
+    User = get_user_model()
+    user_ids = sorted(set(user_ids))
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        chunk = user_ids[start:start + BATCH_SIZE]
+        wanted = set(Quiz.allowed_users.through.objects.filter(user_id__in=chunk).values_list('user_id', 'quiz_id'))
+
+        groups_of_user = defaultdict(set)
+        for user_id, group_id in User.groups.through.objects.filter(user_id__in=chunk).values_list(
+                'user_id', 'group_id'):
+            groups_of_user[user_id].add(group_id)
+        quizzes_of_group = defaultdict(set)
+        group_ids = set().union(*groups_of_user.values()) if groups_of_user else set()
+        for group_id, quiz_id in Quiz.allowed_groups.through.objects.filter(group_id__in=group_ids).values_list(
+                'group_id', 'quiz_id'):
+            quizzes_of_group[group_id].add(quiz_id)
+        for user_id, user_group_ids in groups_of_user.items():
+            for group_id in user_group_ids:
+                wanted.update((user_id, quiz_id) for quiz_id in quizzes_of_group[group_id])
+
+        stale = []
+        existing = set()
+        for pk, user_id, quiz_id in QuizAccess.objects.filter(user_id__in=chunk).values_list('pk', 'user_id', 'quiz_id'):
+            if (user_id, quiz_id) in wanted:
+                existing.add((user_id, quiz_id))
+            else:
+                stale.append(pk)
+        for offset in range(0, len(stale), BATCH_SIZE):
+            QuizAccess.objects.filter(pk__in=stale[offset:offset + BATCH_SIZE]).delete()
+        QuizAccess.objects.bulk_create(
+            [QuizAccess(user_id=user_id, quiz_id=quiz_id) for user_id, quiz_id in wanted - existing],
+            batch_size=BATCH_SIZE,
+        )
+    for user_id in user_ids:
+        page_cache.bump_user(user_id)
+
+
+def rebuild_all():
+    for quiz_id in Quiz.objects.values_list('pk', flat=True):
+        rebuild_quiz_access(quiz_id)
+
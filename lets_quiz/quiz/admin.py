@@ -2,6 +2,8 @@ from django.contrib import admin
 
 from .models import Question, Choice, Quiz, QuizQuestion, QuizAttempt
 from .forms import QuestionForm, ChoiceForm, ChoiceInlineFormset
+from . import search
+from .snapshot import bump_content_version, bump_content_version_for_question
 # Register your models here.
 
 class QuizQuestionInline(admin.TabularInline):
@@ -13,6 +15,10 @@ class QuizAdmin(admin.ModelAdmin):
     list_display = ('title', 'created_by', 'is_published', 'time_limit_seconds', 'immediate_feedback')
     inlines = [QuizQuestionInline]
 
+    def save_related(self, request, form, formsets, change):
+        super(QuizAdmin, self).save_related(request, form, formsets, change)
+        bump_content_version(form.instance)
+
 @admin.register(QuizAttempt)
 class QuizAttemptAdmin(admin.ModelAdmin):
     list_display = ('quiz', 'user', 'started_at', 'finished_at', 'total_score', 'is_finished')
@@ -35,6 +41,23 @@ class QuestionAdmin(admin.ModelAdmin):
     actions = None
     form = QuestionForm
 
+    def get_search_results(self, request, queryset, search_term):
+        # a teljes szöveges indexből (quiz.search), relevancia szerint, a LIKE-os join
+        # (és a miatta kellő DISTINCT) helyett; index nélkül marad az alapértelmezett
+        if not search_term or search.backend() is None:
+            return super(QuestionAdmin, self).get_search_results(request, queryset, search_term)
+        return search.ranked(queryset, search.search_ids(search_term, limit=search.ADMIN_MAX_RESULTS)), False
+
+    def get_ordering(self, request):
+        # kereséskor a relevancia-sorrend marad (hacsak nem rendez oszlop szerint)
+        if request.GET.get('q') and search.backend() is not None:
+            return ['search_rank']
+        return super(QuestionAdmin, self).get_ordering(request)
+
+    def save_related(self, request, form, formsets, change):
+        super(QuestionAdmin, self).save_related(request, form, formsets, change)
+        bump_content_version_for_question(form.instance)
+
     # def has_delete_permission(self, request, obj=None):
     #     return False
 
@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class QuizConfig(AppConfig):
     name = 'quiz'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import database
+        database.install()
+        from . import instrumentation
+        instrumentation.install()
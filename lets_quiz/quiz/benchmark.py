@@ -0,0 +1,341 @@
+"""
+Osztálytermi terhelésteszt a kitöltési ciklusra.
+
+A seed_classroom() egy valószerű adathalmazt hoz létre (diákok csoportokban, kvízek
+mind a négy kérdéstípussal), a run_classroom() pedig N párhuzamos szimulált diákkal
+végigjátssza a play → beküldés → submission_result → quiz_end → quiz_results kört, vagy
+annak a JSON válasz-API-s (kérdésenként egy kérés) vagy az egyben letöltött, kötegelten
+szinkronizált (prefetch) változatát.
+Kérésenként mérjük a késleltetést, a lekérdezésszámot pedig a
+quiz.instrumentation middleware számlálójából olvassuk ki.
+
+A benchmark_play parancs eldobható SQLite adatbázison futtatja, a tests.py pedig
+kis méretben, lekérdezés-kerettel, regressziós kapuként.
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import Group, User
+from django.db import connection, transaction
+from django.test import Client
+
+from . import access, prefetch, search
+from .grading import MATCHING, MULTIPLE, SINGLE, TEXT, pair_token
+from .models import Choice, MatchingPair, Question, Quiz, QuizQuestion
+from .snapshot import get_quiz_snapshot
+
+USERNAME_PREFIX = 'bench_student_'
+
+QUESTION_PK_RE = re.compile(r'name="question_pk" value="(\d+)"')
+
+# a diák ekkora eséllyel válaszol helyesen egy kérdésre
+CORRECT_RATE = 0.7
+
+
+def seed_classroom(students=30, groups=3, quizzes=2, questions_per_type=3, seed=0, immediate_feedback=True):
+    """
+    Diákok, csoportok és kvízek létrehozása. Minden kvíz mind a négy kérdéstípusból
+    questions_per_type darabot tartalmaz, (alapból) azonnali visszajelzéssel, és a
+    csoportokra van korlátozva (így a hozzáférési index is a mért úton van).
+    Visszatérési érték: (a kvízek id-listája, a diákok username-listája)
+    """
+    rng = random.Random(seed)
+    with transaction.atomic():
+        group_objs = [Group.objects.create(name='bench_group_{}'.format(i)) for i in range(groups)]
+
+        usernames = ['{}{}'.format(USERNAME_PREFIX, i) for i in range(students)]
+        User.objects.bulk_create([User(username=username, password='!') for username in usernames])
+        through = User.groups.through
+        through.objects.bulk_create([
+            through(user_id=user_id, group_id=group_objs[i % groups].pk)
+            for i, user_id in enumerate(User.objects.filter(username__in=usernames).order_by('pk')
+                                        .values_list('pk', flat=True))
+        ])
+
+        quiz_ids = []
+        for quiz_index in range(quizzes):
+            quiz = Quiz.objects.create(
+                title='Benchmark kvíz {}'.format(quiz_index),
+                immediate_feedback=immediate_feedback,
+                is_published=True,
+            )
+            order = 0
+            for kind in (SINGLE, MULTIPLE, TEXT, MATCHING):
+                for _ in range(questions_per_type):
+                    question = _create_question(quiz, kind, rng)
+                    QuizQuestion.objects.create(quiz=quiz, question=question, order=order)
+                    order += 1
+            quiz.allowed_groups.add(*group_objs)
+            quiz_ids.append(quiz.pk)
+
+    # a tömeges csoporttagság megkerüli az m2m jelzéseket
+    access.rebuild_all()
+    return quiz_ids, usernames
+
+
+def _create_question(quiz, kind, rng):
+    number = rng.randint(1, 1000)
+    question = Question.objects.create(
+        quiz=quiz,
+        html='<p>{} kérdés #{}</p>'.format(kind, number),
+        is_published=True,
+        maximum_marks=4,
+        is_multiple_choice=(kind == MULTIPLE),
+        correct_text_answer='valasz{}'.format(number) if kind == TEXT else None,
+    )
+    if kind in (SINGLE, MULTIPLE):
+        correct_count = 2 if kind == MULTIPLE else 1
+        Choice.objects.bulk_create([
+            Choice(question=question, html='Válasz {}'.format(i), is_correct=i < correct_count)
+            for i in range(4)
+        ])
+    elif kind == MATCHING:
+        MatchingPair.objects.bulk_create([
+            MatchingPair(question=question, left_text='Bal {}'.format(i), right_text='Jobb {}'.format(i))
+            for i in range(3)
+        ])
+    # a bulk_create nem küld jelzést, a keresőindexbe a válaszokkal együtt kerüljön be
+    search.index_questions([question.pk])
+    return question
+
+
+def _answer(question, rng):
+    """A play oldal űrlapjának megfelelő POST adat egy (pillanatképes) kérdésre."""
+    correct = rng.random() < CORRECT_RATE
+    data = {'question_pk': question.pk}
+    if question.kind == MATCHING:
+        right_ids = [pair.id for pair in question.pairs]
+        if not correct:
+            rng.shuffle(right_ids)
+        for pair, right_id in zip(question.pairs, right_ids):
+            data['mapping_{}'.format(pair.id)] = pair_token(question.pk, right_id)
+    elif question.kind == TEXT:
+        data['text_answer'] = question.correct_text_answer if correct else 'rossz válasz'
+    elif question.kind == MULTIPLE:
+        data['choices'] = [c.pk for c in question.choices if c.is_correct == correct]
+    else:
+        pool = [c.pk for c in question.choices if c.is_correct == correct]
+        data['choice_pk'] = rng.choice(pool)
+    return data
+
+
+def _sync_answer(question, rng):
+    """Ugyanaz a válasz a szinkron-végpont formájában (quiz.prefetch)."""
+    data = _answer(question, rng)
+    answer = {'question': question.pk}
+    if question.kind == MATCHING:
+        # az űrlap már tokeneket küld, ugyanazokat, mint a szinkron-végpont
+        answer['mapping'] = dict((str(pair.id), data['mapping_{}'.format(pair.id)]) for pair in question.pairs)
+    elif question.kind == TEXT:
+        answer['text'] = data['text_answer']
+    elif question.kind == MULTIPLE:
+        answer['choices'] = data['choices']
+    else:
+        answer['choices'] = [data['choice_pk']]
+    return answer
+
+
+class ViewReport(object):
+    def __init__(self, name):
+        self.name = name
+        self.latencies_ms = []
+        self.queries = []
+        self.errors = 0
+
+    def percentile(self, p):
+        if not self.latencies_ms:
+            return 0.0
+        ordered = sorted(self.latencies_ms)
+        index = max(0, min(len(ordered) - 1, int(round(p / 100.0 * len(ordered))) - 1))
+        return ordered[index]
+
+    def summary(self, wall_seconds):
+        count = len(self.latencies_ms)
+        return OrderedDict([
+            ('requests', count),
+            ('errors', self.errors),
+            ('req_per_s', round(count / wall_seconds, 2) if wall_seconds else 0.0),
+            ('p50_ms', round(self.percentile(50), 2)),
+            ('p95_ms', round(self.percentile(95), 2)),
+            ('p99_ms', round(self.percentile(99), 2)),
+            ('avg_queries', round(float(sum(self.queries)) / count, 2) if count else 0.0),
+            ('max_queries', max(self.queries) if self.queries else 0),
+        ])
+
+
+class BenchmarkReport(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views = OrderedDict()
+        self.wall_seconds = 0.0
+        self.students = 0
+
+    def add(self, name, duration_ms, queries, error=False):
+        with self._lock:
+            report = self.views.get(name)
+            if report is None:
+                report = self.views[name] = ViewReport(name)
+            if error:
+                report.errors += 1
+            else:
+                report.latencies_ms.append(duration_ms)
+                report.queries.append(queries)
+
+    @property
+    def total_requests(self):
+        return sum(len(v.latencies_ms) for v in self.views.values())
+
+    @property
+    def total_errors(self):
+        return sum(v.errors for v in self.views.values())
+
+    def summary(self):
+        return OrderedDict([
+            ('students', self.students),
+            ('wall_seconds', round(self.wall_seconds, 3)),
+            ('requests', self.total_requests),
+            ('errors', self.total_errors),
+            ('req_per_s', round(self.total_requests / self.wall_seconds, 2) if self.wall_seconds else 0.0),
+            ('views', OrderedDict((name, view.summary(self.wall_seconds)) for name, view in self.views.items())),
+        ])
+
+
+class _Student(object):
+    def __init__(self, user, report, seed):
+        self.client = Client()
+        self.client.force_login(user)
+        self.report = report
+        self.rng = random.Random(seed)
+
+    def request(self, label, method, path, data=None, **extra):
+        start = time.perf_counter()
+        try:
+            response = getattr(self.client, method)(path, data or {}, **extra)
+        except Exception:
+            self.report.add(label, 0, 0, error=True)
+            raise
+        duration_ms = (time.perf_counter() - start) * 1000
+        counters = getattr(response.wsgi_request, 'instrumentation', None) or [0, 0.0]
+        error = response.status_code >= 400
+        self.report.add(label, duration_ms, counters[0], error=error)
+        if error:
+            raise RuntimeError('{} {} -> {}'.format(method.upper(), path, response.status_code))
+        return response
+
+    def play_quiz(self, quiz_id, max_questions=1000):
+        play_url = '/{}/play/'.format(quiz_id)
+        snapshot = get_quiz_snapshot(Quiz.objects.get(pk=quiz_id))
+        for _ in range(max_questions):
+            response = self.request('play GET', 'get', play_url)
+            if response.status_code == 302:
+                break
+            # a kérdést a böngészőhöz hasonlóan az űrlapból olvassuk ki (a response.context
+            # a test client jelzései miatt szálak között összekeveredhet)
+            question_pk = int(QUESTION_PK_RE.search(response.content.decode('utf-8')).group(1))
+            question = snapshot.get_question(question_pk)
+            response = self.request('play POST', 'post', play_url, _answer(question, self.rng))
+            if response.status_code == 302 and '/submission-result/' in response['Location']:
+                self.request('submission_result', 'get', response['Location'])
+        self.request('quiz_end', 'get', '/{}/end/'.format(quiz_id))
+        self.request('quiz_results', 'get', '/{}/results/'.format(quiz_id))
+
+    def play_quiz_api(self, quiz_id, max_questions=1000):
+        """Ugyanaz a kör a play oldal JS-es útvonalán: egy play GET, utána kérdésenként egy API hívás."""
+        snapshot = get_quiz_snapshot(Quiz.objects.get(pk=quiz_id))
+        response = self.request('play GET', 'get', '/{}/play/'.format(quiz_id))
+        if response.status_code != 302:
+            question_pk = int(QUESTION_PK_RE.search(response.content.decode('utf-8')).group(1))
+            answer_url = '/{}/answer/'.format(quiz_id)
+            for _ in range(max_questions):
+                question = snapshot.get_question(question_pk)
+                payload = self.request('answer API', 'post', answer_url, _answer(question, self.rng)).json()
+                if payload['finished']:
+                    break
+                question_pk = payload['question']['id']
+        self.request('quiz_end', 'get', '/{}/end/'.format(quiz_id))
+        self.request('quiz_results', 'get', '/{}/results/'.format(quiz_id))
+
+    def play_quiz_prefetch(self, quiz_id, batch_size=None):
+        """
+        Azonnali visszajelzés nélküli kvíz egyben: letöltés, a válaszok kötegelt szinkronja
+        (batch_size válaszonként, alapból egyetlen köteg), végül az eredmények.
+        """
+        snapshot = get_quiz_snapshot(Quiz.objects.get(pk=quiz_id))
+        payload = self.request('prefetch', 'get', '/{}/prefetch/'.format(quiz_id)).json()
+        attempt = payload['attempt']
+        answers = [_sync_answer(snapshot.get_question(question_id), self.rng)
+                   for question_id in attempt['order'][attempt['start_index']:]]
+        batch_size = batch_size or len(answers) or 1
+        sync_url = '/{}/sync/'.format(quiz_id)
+        for start in range(0, max(len(answers), 1), batch_size):
+            batch = answers[start:start + batch_size]
+            body = json.dumps({'attempt': attempt['id'], 'answers': batch,
+                               'finish': start + batch_size >= len(answers)})
+            self.request('sync', 'post', sync_url, body, content_type='application/json')
+        self.request('quiz_results', 'get', '/{}/results/'.format(quiz_id))
+
+
+# a kitöltés útvonalai: a _Student megfelelő metódusa
+CLASSIC = 'classic'
+API = 'api'
+PREFETCH = 'prefetch'
+MODES = OrderedDict([
+    (CLASSIC, 'play_quiz'),
+    (API, 'play_quiz_api'),
+    (PREFETCH, 'play_quiz_prefetch'),
+])
+
+
+def _run_student(user, quiz_ids, report, seed, close_connection, mode=CLASSIC):
+    try:
+        student = _Student(user, report, seed)
+        play_quiz = getattr(student, MODES[mode])
+        for quiz_id in quiz_ids:
+            try:
+                play_quiz(quiz_id)
+            except Exception:
+                # a hibát a report már számolta, a diák a következő kvízzel folytatja
+                continue
+    finally:
+        if close_connection:
+            connection.close()
+
+
+def run_classroom(quiz_ids, usernames, concurrency=10, seed=0, mode=CLASSIC):
+    """
+    A diákok párhuzamos végigjátszatása a megadott kvízeken (diákonként egy szál-feladat,
+    legfeljebb concurrency egyszerre). concurrency=1 esetén minden a hívó szálán fut,
+    így tesztben a tranzakcióba zárt adatokat is látja. mode: a kitöltés útvonala (MODES).
+    Visszatérési érték: BenchmarkReport
+    """
+    report = BenchmarkReport()
+    users = list(User.objects.filter(username__in=usernames).order_by('pk'))
+    report.students = len(users)
+
+    start = time.perf_counter()
+    if concurrency <= 1:
+        for i, user in enumerate(users):
+            _run_student(user, quiz_ids, report, seed + i, close_connection=False, mode=mode)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(_run_student, user, quiz_ids, report, seed + i, True, mode)
+                       for i, user in enumerate(users)]
+            for future in futures:
+                future.result()
+    report.wall_seconds = time.perf_counter() - start
+    return report
+
+
+def query_budget_violations(report, budgets):
+    """{view címke: max lekérdezés/kérés} keretek ellenőrzése; a túllépők listája."""
+    violations = []
+    for name, budget in budgets.items():
+        view = report.views.get(name)
+        if view is not None and view.queries and max(view.queries) > budget:
+            violations.append((name, max(view.queries), budget))
+    return violations
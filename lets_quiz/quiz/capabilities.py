@@ -0,0 +1,54 @@
+"""
+A user szerepköre (tanár-e) kérésenként legfeljebb egyszer kiszámolva.
+
+get_capabilities(request) a kéréshez köti az eredményt, a sablonok pedig a
+quiz.context_processors.capabilities lusta objektumán keresztül érik el, így csak
+akkor kerül bármibe, ha tényleg használják. A csoporttagságból számolt részt
+userenként rövid ideig a Django cache-ben is tartjuk; a kulcs része a user
+quiz.page_cache generációja, ami csoporttagság-változáskor nő.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from . import page_cache
+
+TEACHER_GROUP = 'Tanár'
+
+CACHE_KEY = 'quiz_capabilities:{user_id}:{generation}'
+CACHE_TIMEOUT = getattr(settings, 'QUIZ_CAPABILITIES_CACHE_TIMEOUT', 60)
+
+
+class Capabilities(object):
+    """Egy user jogai; az is_teacher csak az első használatkor számolódik."""
+
+    def __init__(self, user):
+        self.user = user
+        self._is_teacher = None
+
+    @property
+    def is_teacher(self):
+        if self._is_teacher is None:
+            self._is_teacher = self.user.is_authenticated and _is_teacher(self.user)
+        return self._is_teacher
+
+    @property
+    def can_manage_quizzes(self):
+        """Tanár vagy superuser: kvízt hozhat létre, szerkeszthet, exportálhat."""
+        return self.user.is_authenticated and (self.user.is_superuser or self.is_teacher)
+
+
+def _is_teacher(user):
+    key = CACHE_KEY.format(user_id=user.pk, generation=page_cache.generation(page_cache.USER.format(user.pk)))
+    is_teacher = cache.get(key)
+    if is_teacher is None:
+        is_teacher = user.groups.filter(name=TEACHER_GROUP).exists()
+        cache.set(key, is_teacher, CACHE_TIMEOUT)
+    return is_teacher
+
+
+def get_capabilities(request):
+    """A kérés Capabilities objektuma (kérésenként egy)."""
+    capabilities = getattr(request, '_quiz_capabilities', None)
+    if capabilities is None or capabilities.user is not request.user:
+        capabilities = request._quiz_capabilities = Capabilities(request.user)
+    return capabilities
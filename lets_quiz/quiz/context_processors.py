@@ -1,11 +1,18 @@
+from django.utils.functional import SimpleLazyObject
+
+from .capabilities import get_capabilities
 from .models import Quiz
 
+
 def current_quiz(request):
-    quiz_id = request.session.get('current_quiz_id')
-    quiz = None
-    if quiz_id:
-        try:
-            quiz = Quiz.objects.get(id=quiz_id)
-        except Quiz.DoesNotExist:
-            pass
-    return {'quiz': quiz}
+    # csak akkor kérdezzük le, ha a sablon tényleg használja
+    def load():
+        quiz_id = request.session.get('current_quiz_id')
+        if quiz_id:
+            return Quiz.objects.filter(id=quiz_id).first()
+        return None
+    return {'quiz': SimpleLazyObject(load)}
+
+
+def capabilities(request):
+    return {'capabilities': SimpleLazyObject(lambda: get_capabilities(request))}
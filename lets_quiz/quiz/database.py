@@ -0,0 +1,95 @@
+"""
+Adatbázis-kapcsolat hangolása és zárolási ütközések kezelése.
+
+SQLite-on minden új kapcsolatra beállítjuk a QUIZ_SQLITE_PRAGMAS pragmákat
+(alapból WAL napló és synchronous=NORMAL): WAL módban az olvasók nem várnak az
+íróra, az írás pedig commitonként nem fsync-el. A várakozási időt (busy timeout)
+a DATABASES OPTIONS 'timeout' kulcsa adja (lásd settings.py).
+
+A busy timeout nem segít, ha egy olvasással indult (deferred) tranzakció akar
+írni, miközben más már írt: ilyenkor az SQLite várakozás nélkül "database is
+locked" hibát ad. Ezért fájl alapú adatbázisnál az atomic blokkok BEGIN
+IMMEDIATE-tel indulnak (a Django 1.11 sima BEGIN-t küld), a kritikus írásokat
+(pl. a quiz.grading könyvelését) pedig a retry_on_lock-kal futtatjuk, ami a
+teljes tranzakciót rövid, növekvő várakozással újrapróbálja. PostgreSQL-en az
+újrapróbálás a sorosítási hibákra és a deadlockra vonatkozik.
+"""
+import functools
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+SQLITE_PRAGMAS = getattr(settings, 'QUIZ_SQLITE_PRAGMAS', (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+))
+# az atomic blokkok BEGIN IMMEDIATE-tel indulnak (lásd fent)
+IMMEDIATE_TRANSACTIONS = getattr(settings, 'QUIZ_SQLITE_IMMEDIATE_TRANSACTIONS', True)
+LOCK_RETRIES = getattr(settings, 'QUIZ_DB_LOCK_RETRIES', 5)
+LOCK_RETRY_DELAY = getattr(settings, 'QUIZ_DB_LOCK_RETRY_DELAY', 0.05)
+
+# ezek a hibaüzenetek jelentenek újrapróbálható ütközést
+LOCK_ERROR_MESSAGES = (
+    'database is locked',
+    'database table is locked',
+    'could not serialize access',
+    'deadlock detected',
+)
+
+
+def _begin_immediate(connection):
+    # az írási zárat már a tranzakció elején kérjük, így a busy timeout-ig várunk rá
+    connection.cursor().execute('BEGIN IMMEDIATE')
+
+
+def _configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    in_memory = connection.is_in_memory_db()
+    for pragma, value in SQLITE_PRAGMAS:
+        # a memóriabeli (teszt) adatbázisnak nincs WAL naplója
+        if pragma == 'journal_mode' and in_memory:
+            continue
+        connection.connection.execute('PRAGMA {} = {}'.format(pragma, value))
+    if IMMEDIATE_TRANSACTIONS and not in_memory:
+        connection._start_transaction_under_autocommit = functools.partial(_begin_immediate, connection)
+
+
+def install():
+    connection_created.connect(_configure_sqlite, dispatch_uid='quiz_sqlite_pragmas')
+
+
+def is_lock_error(exc):
+    message = str(exc).lower()
+    return isinstance(exc, OperationalError) and any(text in message for text in LOCK_ERROR_MESSAGES)
+
+
+def retry_on_lock(func, retries=None, delay=None):
+    """
+    func() futtatása, zárolási ütközésnél legfeljebb retries újrapróbálással. A func
+    maga nyissa a tranzakciót; egy külső tranzakción belül nem próbálunk újra, mert
+    a visszagörgetett munkát csak a külső tranzakció gazdája tudja megismételni.
+    """
+    retries = LOCK_RETRIES if retries is None else retries
+    delay = LOCK_RETRY_DELAY if delay is None else delay
+    if connection.in_atomic_block:
+        return func()
+
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except OperationalError as exc:
+            if attempt >= retries or not is_lock_error(exc):
+                raise
+            attempt += 1
+            # exponenciális várakozás véletlen szórással, hogy az ütköző írók ne egyszerre próbálkozzanak
+            wait = delay * (2 ** (attempt - 1)) * (0.5 + random.random())
+            logger.warning('database lock contention, retry %s/%s in %.3f s: %s', attempt, retries, wait, exc)
+            time.sleep(wait)
@@ -0,0 +1,126 @@
+"""
+Egy kvíz összes kitöltésének (QuizAttempt) és válaszának folyamatos exportja
+CSV-be vagy NDJSON-ba.
+
+A sorok számától függetlenül fix 3 lekérdezés fut: a válaszok, a kiválasztott
+válaszlehetőségek és a párosítások, mindhárom az AttemptedQuestion id szerint
+rendezve, .iterator()-ral (PostgreSQL-en szerveroldali kurzorral) olvasva. A
+hármat összefésüljük, így egyszerre csak az aktuális sor van a memóriában.
+"""
+import csv
+import json
+
+from django.utils.html import strip_tags
+
+from .models import AttemptedMatch, AttemptedQuestion
+
+FIELDS = (
+    'attempt_id', 'username', 'started_at', 'finished_at', 'is_finished', 'attempt_total_score',
+    'attempted_question_id', 'question_id', 'question', 'is_correct', 'marks_obtained',
+    'text_answer', 'selected_choices', 'matches',
+)
+
+# a listás mezők elválasztója a CSV-ben
+LIST_SEPARATOR = ' | '
+
+
+def _groups(rows):
+    """(kulcs, érték) sorokból kulcsonként csoportosít; a bemenet kulcs szerint rendezett."""
+    key = None
+    values = []
+    for row_key, value in rows:
+        if row_key != key and values:
+            yield key, values
+            values = []
+        key = row_key
+        values.append(value)
+    if values:
+        yield key, values
+
+
+class _Lookup(object):
+    """Rendezett (kulcs, értékek) folyam, amiből növekvő kulcsokkal kérdezünk."""
+
+    def __init__(self, groups):
+        self._groups = iter(groups)
+        self._current = next(self._groups, None)
+
+    def get(self, key):
+        while self._current is not None and self._current[0] < key:
+            self._current = next(self._groups, None)
+        if self._current is not None and self._current[0] == key:
+            return self._current[1]
+        return []
+
+
+def iter_results(quiz_id):
+    """Az export sorai dict-ként, AttemptedQuestion id szerinti sorrendben."""
+    answers = AttemptedQuestion.objects.filter(attempt__quiz_id=quiz_id).order_by('pk').values_list(
+        'attempt_id', 'attempt__user__username', 'attempt__started_at', 'attempt__finished_at',
+        'attempt__is_finished', 'attempt__total_score', 'pk', 'question_id', 'question__html',
+        'is_correct', 'marks_obtained', 'text_answer',
+    )
+    choices = AttemptedQuestion.selected_choices.through.objects.filter(
+        attemptedquestion__attempt__quiz_id=quiz_id
+    ).order_by('attemptedquestion_id', 'choice_id').values_list('attemptedquestion_id', 'choice__html')
+    matches = AttemptedMatch.objects.filter(
+        attempted_question__attempt__quiz_id=quiz_id
+    ).order_by('attempted_question_id', 'left_pair_id').values_list(
+        'attempted_question_id', 'left_pair__left_text', 'chosen_right_pair__right_text'
+    )
+
+    choice_lookup = _Lookup(_groups(choices.iterator()))
+    match_lookup = _Lookup(_groups((aq_id, (left, right)) for aq_id, left, right in matches.iterator()))
+
+    for row in answers.iterator():
+        result = dict(zip(FIELDS, row))
+        result['question'] = strip_tags(result['question'] or '').strip()
+        result['selected_choices'] = [strip_tags(html).strip() for html in choice_lookup.get(row[6])]
+        result['matches'] = [
+            {'left': left, 'right': right} for left, right in match_lookup.get(row[6])
+        ]
+        yield result
+
+
+class _Echo(object):
+    """csv.writer-nek átadható "fájl", ami a sort egyszerűen visszaadja."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(quiz_id):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FIELDS)
+    for result in iter_results(quiz_id):
+        result['selected_choices'] = LIST_SEPARATOR.join(result['selected_choices'])
+        result['matches'] = LIST_SEPARATOR.join(
+            '{} -> {}'.format(match['left'], match['right'] or '') for match in result['matches']
+        )
+        yield writer.writerow([_csv_value(result[field]) for field in FIELDS])
+
+
+def _json_value(value):
+    # dátumok ISO formában, Decimal szövegként (pontosság megtartása)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def iter_ndjson(quiz_id):
+    for result in iter_results(quiz_id):
+        yield json.dumps(result, default=_json_value, ensure_ascii=False) + '\n'
+
+
+FORMATS = {
+    'csv': (iter_csv, 'text/csv; charset=utf-8'),
+    'ndjson': (iter_ndjson, 'application/x-ndjson; charset=utf-8'),
+}
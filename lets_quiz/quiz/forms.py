@@ -1,7 +1,9 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import authenticate, get_user_model
-from django.contrib.auth.models import Group
+from django.urls import reverse
+from . import pickers
+from .capabilities import TEACHER_GROUP
 from django.utils.translation import gettext as _
 from .models import Question, Choice, Quiz
 from django import forms
@@ -179,35 +181,68 @@ class ChoiceInlineFormset(forms.BaseInlineFormSet):
                 raise forms.ValidationError(_('Többválaszos kérdéshez legalább 1 helyes válasz szükséges.'))
 
 
+class SearchSelectMultiple(forms.SelectMultiple):
+    """
+    Többes választó, ami csak a kijelölt elemeket rendereli; a többit a quiz_picker.js
+    keresi a quiz:access_search végponton (quiz.pickers), így az oldal mérete nem
+    függ a userek számától.
+    """
+
+    def __init__(self, kind, students_only=False, attrs=None):
+        super(SearchSelectMultiple, self).__init__(attrs)
+        self.kind = kind
+        self.students_only = students_only
+
+    def get_context(self, name, value, attrs):
+        context = super(SearchSelectMultiple, self).get_context(name, value, attrs)
+        url = '{}?kind={}'.format(reverse('quiz:access_search'), self.kind)
+        if self.students_only:
+            url += '&students=1'
+        context['widget']['attrs']['data-search-url'] = url
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        # csak a kijelölt elemek kellenek, azokat egy lekérdezéssel töltjük be
+        choices = self.choices
+        selected = [pk for pk in value if str(pk).isdigit()]
+        self.choices = [
+            (obj.pk, choices.field.label_from_instance(obj)) for obj in choices.queryset.filter(pk__in=selected)
+        ] if selected else []
+        try:
+            return super(SearchSelectMultiple, self).optgroups(name, value, attrs)
+        finally:
+            self.choices = choices
+
+
 class QuizCreateForm(forms.ModelForm):
 
     allowed_users = forms.ModelMultipleChoiceField(
         queryset=User.objects.none(),
         required=False,
-        widget=forms.SelectMultiple(attrs={'class': 'form-control', 'size': '10'}),
+        widget=SearchSelectMultiple(pickers.USERS, students_only=True, attrs={'class': 'form-control', 'size': '6'}),
         label="Diákok, akik kitölthetik"
     )
 
     class Meta:
         model = Quiz
-        fields = ['title', 'description', 'time_limit_seconds', 'immediate_feedback', 'allow_multiple_attempts']
+        # az allowed_users is itt van, hogy a save_m2m() el is mentse
+        fields = ['title', 'description', 'time_limit_seconds', 'immediate_feedback', 'allow_multiple_attempts',
+                  'pool_size', 'shuffle_questions', 'allowed_users']
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Kvíz címe'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Kvíz leírása'}),
             'time_limit_seconds': forms.NumberInput(attrs={'class': 'form-control', 'min': '0'}),
             'immediate_feedback': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'allow_multiple_attempts': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'pool_size': forms.NumberInput(attrs={'class': 'form-control', 'min': '0'}),
+            'shuffle_questions': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
 
     def __init__(self, *args, **kwargs):
         super(QuizCreateForm, self).__init__(*args, **kwargs)
-        # próbáljuk meg a "Tanár" csoportot kiszűrni -> ami marad, az diák
-        try:
-            teacher_group = Group.objects.get(name='Tanár')
-            self.fields['allowed_users'].queryset = User.objects.exclude(groups=teacher_group)
-        except Group.DoesNotExist:
-            # ha nincs ilyen csoport, akkor minden user listázható
-            self.fields['allowed_users'].queryset = User.objects.all()
+        # a "Tanár" csoport tagjait kiszűrjük -> ami marad, az diák
+        # (ha nincs ilyen csoport, minden user listázható; külön lekérdezés nélkül)
+        self.fields['allowed_users'].queryset = User.objects.exclude(groups__name=TEACHER_GROUP)
 
 
 class UserLoginForm(forms.Form):
@@ -0,0 +1,358 @@
+"""
+Kérdéstípusonkénti értékelés.
+
+Minden kérdéstípushoz tartozik egy grader, a grade_many() pedig egyszerre
+sok AttemptedQuestion-t értékel: a megoldókulcsokat (helyes választások,
+párok, szöveges válasz) és szükség esetén a tárolt válaszokat tömegesen
+tölti be, az eredményt pedig tömegesen írja vissza. Ezt használja az élő
+beküldés (play), az újraértékelés (regrade_answers) és az importált
+válaszlapok pontozása is.
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.utils.crypto import salted_hmac
+
+from .database import retry_on_lock
+from .models import (AttemptedMatch, AttemptedQuestion, Choice, MatchingPair, Question, QuizAttempt, QuizProfile,
+                     to_marks)
+
+logger = logging.getLogger(__name__)
+
+SINGLE = 'single'
+MULTIPLE = 'multiple'
+TEXT = 'text'
+MATCHING = 'matching'
+
+CHOICE_KINDS = (SINGLE, MULTIPLE)
+
+PAIR_TOKEN_SALT = 'quiz.prefetch.pair'
+
+
+def pair_token(question_id, pair_id):
+    """
+    A párosítás jobb oldali elemének aláírt, átlátszatlan azonosítója a kliens felé
+    (a pár id-ja maga lenne a megoldókulcs, hiszen a bal oldali elem is azt viseli).
+    """
+    return salted_hmac(PAIR_TOKEN_SALT, '{}:{}'.format(question_id, pair_id)).hexdigest()[:16]
+
+
+class AnswerKey(object):
+    """Egy kérdés megoldókulcsa, a pontozáshoz szükséges minimális adatokkal."""
+
+    def __init__(self, question_id, maximum_marks, is_multiple_choice, correct_text_answer):
+        self.question_id = question_id
+        self.maximum_marks = to_marks(maximum_marks)
+        self.is_multiple_choice = is_multiple_choice
+        self.correct_text_answer = correct_text_answer
+        self.choice_ids = set()
+        self.correct_choice_ids = set()
+        self.pair_ids = []
+
+    @property
+    def kind(self):
+        # ugyanaz a sorrend, mint az edit_question típusfelismerésénél
+        if self.pair_ids:
+            return MATCHING
+        if self.correct_text_answer:
+            return TEXT
+        if self.is_multiple_choice:
+            return MULTIPLE
+        return SINGLE
+
+
+class Submission(object):
+    """
+    Egy kérdésre beküldött nyers válasz.
+    choice_ids: kiválasztott Choice id-k, text: szöveges válasz,
+    mapping: {bal MatchingPair id: választott jobb MatchingPair id} (az űrlapon a jobb
+    oldali elemek pair_token-nel jönnek, from_post ezeket fejti vissza)
+    """
+
+    def __init__(self, choice_ids=None, text=None, mapping=None):
+        self.choice_ids = [int(pk) for pk in (choice_ids or []) if pk is not None]
+        self.text = text
+        self.mapping = dict(mapping or {})
+
+    @classmethod
+    def from_post(cls, data):
+        """A play.html űrlapjából (vagy bármilyen QueryDict-ből) épít Submission-t."""
+        choice_ids = []
+        for value in data.getlist('choices') + [data.get('choice_pk')]:
+            try:
+                choice_ids.append(int(value))
+            except (TypeError, ValueError):
+                pass
+
+        chosen = {}
+        for name in data.keys():
+            if not name.startswith('mapping_'):
+                continue
+            try:
+                chosen[int(name[len('mapping_'):])] = data.get(name)
+            except (TypeError, ValueError):
+                pass
+        # a kérdés minden párja bal oldali elemként is szerepel, így a választható
+        # jobb oldali párok id-i éppen a bal oldali id-k
+        tokens = dict((pair_token(data.get('question_pk'), left_id), left_id) for left_id in chosen)
+        mapping = dict((left_id, tokens[token]) for left_id, token in chosen.items() if token in tokens)
+
+        return cls(choice_ids=choice_ids, text=data.get('text_answer', ''), mapping=mapping)
+
+
+class GradeResult(object):
+    def __init__(self, is_correct, marks_obtained):
+        self.is_correct = is_correct
+        self.marks_obtained = to_marks(marks_obtained)
+
+
+class BaseGrader(object):
+    kind = None
+
+    def grade(self, key, submission):
+        raise NotImplementedError
+
+
+class SingleChoiceGrader(BaseGrader):
+    kind = SINGLE
+
+    def grade(self, key, submission):
+        chosen_ids = set(submission.choice_ids) & key.choice_ids
+        if len(chosen_ids) == 1 and chosen_ids <= key.correct_choice_ids:
+            return GradeResult(True, key.maximum_marks)
+        return GradeResult(False, 0)
+
+
+class MultipleChoiceGrader(BaseGrader):
+    kind = MULTIPLE
+
+    def grade(self, key, submission):
+        chosen_ids = set(submission.choice_ids) & key.choice_ids
+        correct_selected = len(chosen_ids & key.correct_choice_ids)
+        incorrect_selected = len(chosen_ids - key.correct_choice_ids)
+        total_correct = len(key.correct_choice_ids)
+
+        if correct_selected == total_correct and incorrect_selected == 0:
+            return GradeResult(True, key.maximum_marks)
+        ratio = (correct_selected / total_correct) if total_correct > 0 else 0
+        return GradeResult(False, float(key.maximum_marks) * ratio)
+
+
+class TextGrader(BaseGrader):
+    kind = TEXT
+
+    def grade(self, key, submission):
+        # kisbetű-független összehasonlítás
+        user_text = (submission.text or '').strip()
+        is_correct = user_text.lower() == (key.correct_text_answer or '').strip().lower()
+        return GradeResult(is_correct, key.maximum_marks if is_correct else 0)
+
+
+class MatchingGrader(BaseGrader):
+    kind = MATCHING
+
+    def grade(self, key, submission):
+        # helyes akkor, ha a bal párhoz ugyanazt a párt (jobb oldalát) választotta
+        total = len(key.pair_ids)
+        correct_count = sum(1 for pair_id in key.pair_ids if submission.mapping.get(pair_id) == pair_id)
+        ratio = (float(correct_count) / float(total)) if total > 0 else 0.0
+        return GradeResult(correct_count == total and total > 0, float(key.maximum_marks) * ratio)
+
+
+GRADERS = {}
+
+
+def register_grader(grader):
+    GRADERS[grader.kind] = grader
+    return grader
+
+
+for _grader_class in (SingleChoiceGrader, MultipleChoiceGrader, TextGrader, MatchingGrader):
+    register_grader(_grader_class())
+
+
+def load_answer_keys(question_ids):
+    """Megoldókulcsok betöltése: kérdéstípustól függetlenül fix 3 lekérdezés."""
+    keys = {}
+    questions = Question.objects.filter(pk__in=question_ids).values_list(
+        'pk', 'maximum_marks', 'is_multiple_choice', 'correct_text_answer'
+    )
+    for pk, maximum_marks, is_multiple_choice, correct_text_answer in questions:
+        keys[pk] = AnswerKey(pk, maximum_marks, is_multiple_choice, correct_text_answer)
+
+    choices = Choice.objects.filter(question_id__in=keys).values_list('question_id', 'pk', 'is_correct')
+    for question_id, pk, is_correct in choices:
+        keys[question_id].choice_ids.add(pk)
+        if is_correct:
+            keys[question_id].correct_choice_ids.add(pk)
+
+    pairs = MatchingPair.objects.filter(question_id__in=keys).order_by('pk').values_list('question_id', 'pk')
+    for question_id, pk in pairs:
+        keys[question_id].pair_ids.append(pk)
+    return keys
+
+
+def load_submissions(attempted_questions):
+    """A már eltárolt válaszok visszaolvasása újraértékeléshez (fix 2 lekérdezés)."""
+    pks = [aq.pk for aq in attempted_questions]
+    choice_ids = defaultdict(list)
+    through = AttemptedQuestion.selected_choices.through
+    for aq_id, choice_id in through.objects.filter(attemptedquestion_id__in=pks).values_list(
+            'attemptedquestion_id', 'choice_id'):
+        choice_ids[aq_id].append(choice_id)
+
+    mappings = defaultdict(dict)
+    for aq_id, left_id, right_id in AttemptedMatch.objects.filter(attempted_question_id__in=pks).values_list(
+            'attempted_question_id', 'left_pair_id', 'chosen_right_pair_id'):
+        mappings[aq_id][left_id] = right_id
+
+    return {
+        aq.pk: Submission(choice_ids=choice_ids[aq.pk], text=aq.text_answer, mapping=mappings[aq.pk])
+        for aq in attempted_questions
+    }
+
+
+def grade_many(attempted_questions, submissions=None):
+    """
+    Több AttemptedQuestion értékelése egyszerre.
+
+    submissions: {attempted_question.pk: Submission}. Ha a beküldött válasz is
+    itt jön (élő beküldés, import), a válaszokat is elmentjük; ha None, a már
+    tárolt válaszokat értékeljük újra. A pontváltozások a profilok és a
+    QuizAttempt-ek összpontszámán deltaként könyvelődnek.
+    Visszatérési érték: {attempted_question.pk: GradeResult}
+    """
+    attempted_questions = list(attempted_questions)
+    if not attempted_questions:
+        return {}
+
+    store_answers = submissions is not None
+    keys = load_answer_keys(set(aq.question_id for aq in attempted_questions))
+
+    results = {}
+    kinds = {}
+
+    def grade(submissions):
+        for aq in attempted_questions:
+            key = keys[aq.question_id]
+            submission = submissions.get(aq.pk) or Submission()
+            kinds[aq.pk] = key.kind
+            results[aq.pk] = GRADERS[key.kind].grade(key, submission)
+            logger.debug('grading aq=%s question=%s kind=%s -> %s/%s', aq.pk, aq.question_id, key.kind,
+                         results[aq.pk].is_correct, results[aq.pk].marks_obtained)
+
+    if store_answers:
+        grade(submissions)
+
+    def write():
+        with transaction.atomic():
+            # a pontdeltát a zárolt, tranzakción belül újraolvasott pontszámból számoljuk,
+            # nem a memóriabeli (esetleg egy párhuzamos beküldés óta elavult) sorból; így két
+            # egyidejű értékelés és az újrapróbálás sem könyveli kétszer ugyanazt a változást
+            locked_marks = dict(
+                AttemptedQuestion.objects.select_for_update().filter(pk__in=[aq.pk for aq in attempted_questions])
+                .order_by('pk').values_list('pk', 'marks_obtained')
+            )
+            if store_answers:
+                _store_answers(attempted_questions, submissions, keys, kinds)
+            else:
+                # újraértékelésnél a tárolt válaszokat is a zár alatt olvassuk, hogy egy
+                # közben beérkezett beküldés ne a régi válasza szerint kapjon pontot
+                grade(load_submissions(attempted_questions))
+            _write_results(attempted_questions, results, submissions if store_answers else None, kinds,
+                           locked_marks)
+
+    # párhuzamos beküldéseknél (SQLite) a könyvelés zárolási ütközésbe futhat
+    retry_on_lock(write)
+    return results
+
+
+def _store_answers(attempted_questions, submissions, keys, kinds):
+    choice_aqs = [aq for aq in attempted_questions if kinds[aq.pk] in CHOICE_KINDS]
+    matching_aqs = [aq for aq in attempted_questions if kinds[aq.pk] == MATCHING]
+
+    if choice_aqs:
+        through = AttemptedQuestion.selected_choices.through
+        through.objects.filter(attemptedquestion_id__in=[aq.pk for aq in choice_aqs]).delete()
+        rows = []
+        for aq in choice_aqs:
+            valid_ids = keys[aq.question_id].choice_ids
+            for choice_id in sorted(set(submissions[aq.pk].choice_ids) & valid_ids):
+                rows.append(through(attemptedquestion_id=aq.pk, choice_id=choice_id))
+        through.objects.bulk_create(rows)
+
+    if matching_aqs:
+        AttemptedMatch.objects.filter(attempted_question_id__in=[aq.pk for aq in matching_aqs]).delete()
+        rows = []
+        for aq in matching_aqs:
+            pair_ids = keys[aq.question_id].pair_ids
+            mapping = submissions[aq.pk].mapping
+            for pair_id in pair_ids:
+                chosen_id = mapping.get(pair_id)
+                rows.append(AttemptedMatch(
+                    attempted_question_id=aq.pk,
+                    left_pair_id=pair_id,
+                    # csak ennek a kérdésnek a párjai közül lehet választani
+                    chosen_right_pair_id=chosen_id if chosen_id in pair_ids else None
+                ))
+        AttemptedMatch.objects.bulk_create(rows)
+
+
+def _write_results(attempted_questions, results, submissions, kinds, locked_marks):
+    """
+    Egyetlen CASE-es UPDATE az összes értékelt sorra, majd a pontdelták könyvelése.
+    locked_marks: {attempted_question.pk: tárolt pontszám} a zárolt sorokból; ami
+    közben törlődött, az kimarad.
+    """
+    attempted_questions = [aq for aq in attempted_questions if aq.pk in locked_marks]
+    if not attempted_questions:
+        return
+    profile_deltas = defaultdict(Decimal)
+    attempt_deltas = defaultdict(Decimal)
+    correct_whens = []
+    marks_whens = []
+    text_whens = []
+
+    # a profil pontszámába kvízenként csak a legutóbbi futás számít (QuizAttempt.superseded)
+    attempt_ids = set(aq.attempt_id for aq in attempted_questions if aq.attempt_id)
+    superseded = set()
+    if attempt_ids:
+        superseded = set(QuizAttempt.superseded().filter(pk__in=attempt_ids).values_list('pk', flat=True))
+
+    for aq in attempted_questions:
+        result = results[aq.pk]
+        delta = result.marks_obtained - to_marks(locked_marks[aq.pk])
+        if aq.attempt_id not in superseded:
+            profile_deltas[aq.quiz_profile_id] += delta
+        if aq.attempt_id:
+            attempt_deltas[aq.attempt_id] += delta
+
+        correct_whens.append(models.When(pk=aq.pk, then=models.Value(result.is_correct)))
+        marks_whens.append(models.When(pk=aq.pk, then=models.Value(result.marks_obtained)))
+        aq.is_correct = result.is_correct
+        aq.marks_obtained = result.marks_obtained
+
+        if submissions is not None and kinds[aq.pk] in (TEXT, MATCHING):
+            # párosításnál nincs szöveges válasz
+            aq.text_answer = (submissions[aq.pk].text or '').strip() if kinds[aq.pk] == TEXT else None
+            text_whens.append(models.When(pk=aq.pk, then=models.Value(aq.text_answer)))
+
+    fields = {
+        'is_correct': models.Case(*correct_whens, output_field=models.BooleanField()),
+        'marks_obtained': models.Case(
+            *marks_whens, output_field=models.DecimalField(decimal_places=2, max_digits=6)
+        ),
+    }
+    if text_whens:
+        fields['text_answer'] = models.Case(
+            *text_whens, default=models.F('text_answer'), output_field=models.TextField()
+        )
+    AttemptedQuestion.objects.filter(pk__in=[aq.pk for aq in attempted_questions]).update(**fields)
+
+    QuizProfile.apply_score_deltas(profile_deltas, attempt_deltas)
+
+    # a lezárt futások cache-elt eredményoldala elavult
+    from . import results
+    results.invalidate(aq.attempt_id for aq in attempted_questions)
@@ -0,0 +1,223 @@
+"""
+Kérdésbank tömeges importja CSV-ből vagy NDJSON-ból (soronként egy JSON objektum).
+
+A sorokat folyamként olvassuk, és ugyanazokkal a formokkal validáljuk, mint az
+add_*_question nézetek, így a szabályok egy helyen maradnak. Az érvényes sorok
+fix méretű kötegekben, kötegenként egy tranzakcióban kerülnek be (a válasz-
+lehetőségek, párok és a QuizQuestion sorrend bulk_create-tel; a kérdések is: ahol
+az adatbázis nem adja vissza az új id-kat (SQLite), ott a kiosztott folytonos
+tartományból), így a memóriahasználat a fájl méretétől független.
+
+Oszlopok / kulcsok (a formmezők nevei):
+    type                 single | multiple | text | matching
+    html, maximum_marks
+    option1..option4     single / multiple
+    correct_option       single: a helyes válasz sorszáma (1-4)
+    correct_options      multiple: sorszámok "|"-vel elválasztva (JSON-ban lista is lehet)
+    correct_text_answer  text
+    pair1_left..pair8_right  matching
+"""
+import csv
+import json
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Max
+from django.utils.datastructures import MultiValueDict
+
+from .forms import MatchingQuestionForm, MultipleChoiceQuestionForm, SingleChoiceQuestionForm, TextQuestionForm
+from . import search
+from .grading import MATCHING, MULTIPLE, SINGLE, TEXT
+from .models import Choice, MatchingPair, Question, QuizQuestion
+from .snapshot import bump_content_version
+
+BATCH_SIZE = 500
+
+# ennyi hibás sort jegyzünk fel részletesen, a többit csak számoljuk
+MAX_REPORTED_ERRORS = 100
+
+FORMS = {
+    SINGLE: SingleChoiceQuestionForm,
+    MULTIPLE: MultipleChoiceQuestionForm,
+    TEXT: TextQuestionForm,
+    MATCHING: MatchingQuestionForm,
+}
+
+
+class ImportResult(object):
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+class _PendingQuestion(object):
+    """Egy validált, még be nem szúrt kérdés a kapcsolódó sorokkal együtt."""
+
+    def __init__(self, question, choices=(), pairs=()):
+        self.question = question
+        self.choices = choices
+        self.pairs = pairs
+
+
+def iter_rows(stream, fmt):
+    """(sorszám, dict) párok folyamként; fmt: 'csv' vagy 'ndjson'."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield line_number, exc
+                continue
+            yield line_number, row
+    else:
+        raise ValueError('Ismeretlen formátum: {}'.format(fmt))
+
+
+def guess_format(filename):
+    return 'csv' if filename.lower().endswith('.csv') else 'ndjson'
+
+
+def _form_data(row):
+    data = MultiValueDict()
+    for key, value in row.items():
+        if key is None or value is None:
+            continue
+        if key == 'correct_options':
+            if isinstance(value, (list, tuple)):
+                values = [str(v) for v in value]
+            else:
+                values = [v.strip() for v in str(value).split('|') if v.strip()]
+            data.setlist(key, values)
+        else:
+            data[key] = str(value)
+    return data
+
+
+def build_question(row):
+    """
+    Egy sor validálása a megfelelő formmal. Visszaad egy _PendingQuestion-t,
+    vagy ValueError-t dob a hibaüzenettel.
+    """
+    if not isinstance(row, dict):
+        raise ValueError('A sor nem objektum.')
+    kind = (row.get('type') or '').strip().lower()
+    if kind not in FORMS:
+        raise ValueError('Ismeretlen kérdéstípus: {!r}'.format(row.get('type')))
+
+    form = FORMS[kind](_form_data(row))
+    if not form.is_valid():
+        raise ValueError('; '.join(
+            '{}: {}'.format(field, ' '.join(messages)) for field, messages in form.errors.items()
+        ))
+
+    question = form.save(commit=False)
+    question.is_multiple_choice = (kind == MULTIPLE)
+    data = form.cleaned_data
+
+    if kind in (SINGLE, MULTIPLE):
+        options = [data['option1'], data['option2'], data.get('option3'), data.get('option4')]
+        if kind == SINGLE:
+            correct = {int(data['correct_option'])}
+        else:
+            correct = set(int(i) for i in data['correct_options'] or [])
+        choices = [(text, index in correct) for index, text in enumerate(options, start=1) if text]
+        return _PendingQuestion(question, choices=choices)
+    if kind == MATCHING:
+        return _PendingQuestion(question, pairs=list(form.iter_pairs()))
+    return _PendingQuestion(question)
+
+
+def import_questions(quiz, rows, batch_size=BATCH_SIZE):
+    """
+    (sorszám, dict) sorok importja a kvízbe. A hibás sorokat kihagyjuk és
+    feljegyezzük; a jók kötegenként egy tranzakcióban kerülnek be.
+    Visszatérési érték: ImportResult
+    """
+    result = ImportResult()
+    batch = []
+    for line, row in rows:
+        if isinstance(row, Exception):
+            result.add_error(line, str(row))
+            continue
+        try:
+            batch.append(build_question(row))
+        except ValueError as exc:
+            result.add_error(line, str(exc))
+            continue
+        if len(batch) >= batch_size:
+            result.created += _insert_batch(quiz, batch)
+            batch = []
+    if batch:
+        result.created += _insert_batch(quiz, batch)
+    return result
+
+
+@transaction.atomic
+def _insert_batch(quiz, batch):
+    # a kérdések mentésének jelzései és a tömeges beszúrások után egyszer indexelünk
+    with search.deferred():
+        _insert_rows(quiz, batch)
+        bump_content_version(quiz)
+    return len(batch)
+
+
+def _bulk_create_questions(questions):
+    """
+    A kérdések beszúrása tömegesen, id-kkal. Az id-t mindig az adatbázis osztja ki
+    (AUTOINCREMENT / sequence), mert egy törölt kérdés id-je még szerepelhet régi
+    futások kérdéssorrendjében és a pillanatképekben.
+    """
+    Question.objects.bulk_create(questions, batch_size=BATCH_SIZE)
+    if connection.features.can_return_ids_from_bulk_insert:
+        return
+    # SQLite: a bulk_create nem adja vissza az id-kat. A tranzakcióban mi vagyunk az
+    # egyetlen író, így az AUTOINCREMENT a listánk sorrendjében, folytonosan osztotta
+    # ki őket, az utolsó beszúrt sorig; a tartományt visszaolvasva ellenőrizzük.
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT last_insert_rowid()')
+        last_id = cursor.fetchone()[0]
+    ids = list(Question.objects.filter(
+        pk__gt=last_id - len(questions), pk__lte=last_id
+    ).order_by('pk').values_list('pk', flat=True))
+    if len(ids) != len(questions):
+        raise DatabaseError('Az importált kérdések id-tartománya nem folytonos.')
+    for question, pk in zip(questions, ids):
+        question.pk = pk
+
+
+def _insert_rows(quiz, batch):
+    questions = [pending.question for pending in batch]
+    _bulk_create_questions(questions)
+
+    choices = []
+    pairs = []
+    for pending in batch:
+        question_id = pending.question.pk
+        choices.extend(Choice(question_id=question_id, html=text, is_correct=is_correct)
+                       for text, is_correct in pending.choices)
+        pairs.extend(MatchingPair(question_id=question_id, left_text=left, right_text=right)
+                     for left, right in pending.pairs)
+    Choice.objects.bulk_create(choices, batch_size=BATCH_SIZE)
+    MatchingPair.objects.bulk_create(pairs, batch_size=BATCH_SIZE)
+
+    # a sorrendet kötegenként egyszer olvassuk, nem kérdésenként
+    max_order = QuizQuestion.objects.filter(quiz=quiz).aggregate(Max('order'))['order__max'] or 0
+    QuizQuestion.objects.bulk_create([
+        QuizQuestion(quiz=quiz, question_id=question.pk, order=max_order + offset)
+        for offset, question in enumerate(questions, start=1)
+    ], batch_size=BATCH_SIZE)
+
+    # a bulk_create nem küld post_save jelzést (a válaszokét sem), ezért az id-kat mi adjuk át
+    search.index_questions(question.pk for question in questions)
@@ -0,0 +1,226 @@
+"""
+Kérésenkénti mérés: URL-névenként késleltetés-hisztogram, SQL lekérdezésszám és SQL idő.
+
+A RequestInstrumentationMiddleware méri a kérés teljes idejét, a lekérdezéseket pedig
+egy becsomagolt adatbázis-kurzor számolja (Django 1.11-ben még nincs
+connection.execute_wrapper, ezért a connection_created jelzésre a kapcsolat
+make_cursor / make_debug_cursor metódusát cseréljük). A számlálók folyamaton belül,
+zár alatt gyűlnek, és QUIZ_INSTRUMENTATION_FLUSH_INTERVAL másodpercenként a Django
+cache-be is kikerülnek, így a request_stats parancs és a staff végpont több worker
+adatait is össze tudja fésülni (a settings.CACHES alapból közös, fájl alapú backend).
+"""
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.backends import utils as backend_utils
+from django.db.backends.signals import connection_created
+
+ENABLED = getattr(settings, 'QUIZ_INSTRUMENTATION', True)
+FLUSH_INTERVAL = getattr(settings, 'QUIZ_INSTRUMENTATION_FLUSH_INTERVAL', 10)
+
+# a hisztogram vödreinek felső határai (ms); az utolsó vödör a "ennél lassabb"
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+CACHE_KEY = 'quiz_instrumentation:{pid}'
+PIDS_CACHE_KEY = 'quiz_instrumentation:pids'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+_local = threading.local()
+
+
+class ViewStats(object):
+    """Egy URL-név összesített mérőszámai."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, duration_ms, queries, sql_ms):
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.queries += queries
+        self.sql_ms += sql_ms
+        for i, bound in enumerate(BUCKETS_MS):
+            if duration_ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def merge(self, data):
+        self.count += data['count']
+        self.total_ms += data['total_ms']
+        self.max_ms = max(self.max_ms, data['max_ms'])
+        self.queries += data['queries']
+        self.sql_ms += data['sql_ms']
+        for i, value in enumerate(data['buckets']):
+            self.buckets[i] += value
+
+    def percentile(self, p):
+        """A p-edik percentilis becslése: annak a vödörnek a felső határa, amibe esik."""
+        if not self.count:
+            return 0.0
+        threshold = self.count * p / 100.0
+        seen = 0
+        for i, value in enumerate(self.buckets):
+            seen += value
+            if seen >= threshold:
+                return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': self.total_ms,
+            'max_ms': self.max_ms,
+            'queries': self.queries,
+            'sql_ms': self.sql_ms,
+            'buckets': list(self.buckets),
+        }
+
+    def summary(self):
+        count = self.count or 1
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / count, 2),
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': round(self.max_ms, 2),
+            'avg_queries': round(float(self.queries) / count, 2),
+            'avg_sql_ms': round(self.sql_ms / count, 2),
+            'histogram': dict(zip([str(b) for b in BUCKETS_MS] + ['inf'], self.buckets)),
+        }
+
+
+class Registry(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._last_flush = time.time()
+
+    def record(self, name, duration_ms, queries, sql_ms):
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = ViewStats()
+            stats.add(duration_ms, queries, sql_ms)
+            flush = time.time() - self._last_flush >= FLUSH_INTERVAL
+            if flush:
+                self._last_flush = time.time()
+        if flush:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+    def flush(self):
+        """A folyamat eddigi (kumulált) számlálóinak kiírása a cache-be."""
+        pid = os.getpid()
+        cache.set(CACHE_KEY.format(pid=pid), self.snapshot(), CACHE_TIMEOUT)
+        pids = cache.get(PIDS_CACHE_KEY) or []
+        if pid not in pids:
+            cache.set(PIDS_CACHE_KEY, pids + [pid], CACHE_TIMEOUT)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+registry = Registry()
+
+
+def collected_stats():
+    """Az összes worker (cache) és a saját folyamat számlálói URL-névenként összefésülve."""
+    own_pid = os.getpid()
+    merged = {}
+    snapshots = [registry.snapshot()]
+    pids = [pid for pid in cache.get(PIDS_CACHE_KEY) or [] if pid != own_pid]
+    snapshots += [s for s in cache.get_many([CACHE_KEY.format(pid=pid) for pid in pids]).values()]
+    for snapshot in snapshots:
+        for name, data in snapshot.items():
+            merged.setdefault(name, ViewStats()).merge(data)
+    return merged
+
+
+def reset_stats():
+    registry.reset()
+    pids = cache.get(PIDS_CACHE_KEY) or []
+    cache.delete_many([CACHE_KEY.format(pid=pid) for pid in pids] + [PIDS_CACHE_KEY])
+
+
+# --- adatbázis-kurzor ---
+
+class _TimedExecuteMixin(object):
+    def execute(self, sql, params=None):
+        return self._timed(super(_TimedExecuteMixin, self).execute, sql, params)
+
+    def executemany(self, sql, param_list):
+        return self._timed(super(_TimedExecuteMixin, self).executemany, sql, param_list)
+
+    def _timed(self, method, sql, params):
+        current = getattr(_local, 'current', None)
+        if current is None:
+            return method(sql, params)
+        start = time.perf_counter()
+        try:
+            return method(sql, params)
+        finally:
+            current[0] += 1
+            current[1] += (time.perf_counter() - start) * 1000
+
+
+class InstrumentedCursorWrapper(_TimedExecuteMixin, backend_utils.CursorWrapper):
+    pass
+
+
+class InstrumentedCursorDebugWrapper(_TimedExecuteMixin, backend_utils.CursorDebugWrapper):
+    pass
+
+
+def _instrument_connection(sender, connection, **kwargs):
+    if getattr(connection, '_quiz_instrumented', False):
+        return
+    connection.make_cursor = lambda cursor: InstrumentedCursorWrapper(cursor, connection)
+    connection.make_debug_cursor = lambda cursor: InstrumentedCursorDebugWrapper(cursor, connection)
+    connection._quiz_instrumented = True
+
+
+def install():
+    if ENABLED:
+        connection_created.connect(_instrument_connection, dispatch_uid='quiz_instrumentation')
+
+
+# --- middleware ---
+
+class RequestInstrumentationMiddleware(object):
+    """A kérés idejét és lekérdezéseit a feloldott URL-név alá könyveli."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not ENABLED:
+            return self.get_response(request)
+
+        # [lekérdezésszám, SQL idő ms]; a kérésen is elérhető (pl. a quiz.benchmark-nak)
+        _local.current = request.instrumentation = current = [0, 0.0]
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            _local.current = None
+            match = getattr(request, 'resolver_match', None)
+            name = match.view_name if match is not None and match.view_name else '<unresolved>'
+            registry.record(name, duration_ms, current[0], current[1])
+        return response
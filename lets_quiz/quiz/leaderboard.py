@@ -0,0 +1,206 @@
+"""
+A materializált globális ranglista (LeaderboardEntry) karbantartása.
+
+A LeaderboardEntry csak a profil nevét és pontszámát tartja; egy pontszám-
+változás a profil saját sorának egyetlen UPDATE-je, más sorokat nem ír, és nem
+is zárol: ugyanannak a profilnak a párhuzamos változásait a QuizProfile sorának
+zárja (apply_score_deltas) sorosítja. A helyezést olvasáskor számoljuk: az első
+oldal a (-total_score, username) indexből egy tartomány-olvasás, a sűrű (dense)
+helyezés pedig a lapon belül, a pontszám-szintek váltásából adódik.
+
+A ranglista oldal-cache-ét csak akkor dobjuk el, ha a változás a látható első
+oldalt érintheti. Ehhez az első oldal utolsó pontszámát (a "határt") az oldal
+olvasásakor a cache-be tesszük, így a pontszám-változás ezt nem kérdezi le.
+
+A kvízenkénti / csoportonkénti ranglistát (quiz_ranking) nem materializáljuk,
+hanem a lezárt QuizAttempt-ekből egy ablakfüggvényes lekérdezés számolja.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from . import page_cache
+from .models import LeaderboardEntry, QuizAttempt, QuizProfile, to_marks
+
+PAGE_SIZE = 500
+
+# az első oldal utolsó pontszáma; 'open', ha az oldal nincs tele (minden változás látszik)
+BOUNDARY_KEY = 'leaderboard_boundary'
+OPEN = 'open'
+
+
+def _visible(total_score):
+    """Érintheti-e az adott pontszám az első oldalt. Ismeretlen határnál igen."""
+    boundary = cache.get(BOUNDARY_KEY)
+    return boundary is None or boundary == OPEN or to_marks(total_score) >= to_marks(boundary)
+
+
+def sync_profiles(profile_ids):
+    """A megadott profilok ranglista-sorainak frissítése az aktuális pontszámukra."""
+    profiles = QuizProfile.objects.filter(pk__in=list(profile_ids)).values_list(
+        'pk', 'user__username', 'total_score', 'leaderboard_entry__total_score'
+    )
+    for pk, username, total_score, entry_score in profiles:
+        move_entry(pk, username, total_score, entry_score)
+
+
+def move_entry(profile_id, username, total_score, old_score=None):
+    """
+    A profil ranglista-sorának pontszáma. old_score: a sor eddigi pontszáma, vagy
+    None, ha még nincs sora (ilyenkor létrehozzuk).
+    """
+    total_score = to_marks(total_score)
+    if old_score is not None and to_marks(old_score) == total_score:
+        return
+    if old_score is None:
+        LeaderboardEntry.objects.update_or_create(
+            quiz_profile_id=profile_id, defaults={'username': username, 'total_score': total_score}
+        )
+    else:
+        LeaderboardEntry.objects.filter(quiz_profile_id=profile_id).update(total_score=total_score)
+
+    if _visible(total_score) or (old_score is not None and _visible(old_score)):
+        _bump_page()
+
+
+def _bump_page():
+    # az első oldal (és vele a határ) megváltozhatott: a határ a következő olvasásig ismeretlen
+    transaction.on_commit(lambda: cache.delete(BOUNDARY_KEY))
+    page_cache.bump(page_cache.LEADERBOARD)
+
+
+def page_size():
+    return PAGE_SIZE
+
+
+def top_entries(limit=None, offset=0):
+    """
+    A ranglista egy szelete, a sorokon sűrű helyezéssel (entry.rank). Az első oldal
+    egy lekérdezés; későbbi szeletnél a kezdő helyezéshez a fölötte lévő pontszám-
+    szinteket is megszámoljuk.
+    """
+    limit = limit or page_size()
+    entries = list(LeaderboardEntry.objects.order_by('-total_score', 'username')[offset:offset + limit])
+    if offset == 0 and limit == page_size():
+        cache.set(BOUNDARY_KEY, str(entries[-1].total_score) if len(entries) >= limit else OPEN, None)
+
+    rank = 0
+    if offset and entries:
+        rank = LeaderboardEntry.objects.filter(total_score__gt=entries[0].total_score).values(
+            'total_score'
+        ).distinct().count()
+    previous_score = None
+    for entry in entries:
+        if entry.total_score != previous_score:
+            rank += 1
+            previous_score = entry.total_score
+        entry.rank = rank
+    return entries
+
+
+@transaction.atomic
+def rebuild():
+    """A teljes ranglista újraépítése a QuizProfile-okból (egyeztetéshez)."""
+    LeaderboardEntry.objects.all().delete()
+    entries = [
+        LeaderboardEntry(quiz_profile_id=pk, username=username, total_score=total_score)
+        for pk, username, total_score in QuizProfile.objects.values_list(
+            'pk', 'user__username', 'total_score'
+        ).iterator()
+    ]
+    LeaderboardEntry.objects.bulk_create(entries, batch_size=500)
+    _bump_page()
+    return len(entries)
+
+
+# --- Kvízenkénti és csoportonkénti ranglista ---
+
+RANKING_PAGE_SIZE = 50
+RANKING_CACHE_TIMEOUT = getattr(settings, 'QUIZ_RANKING_CACHE_TIMEOUT', 30)
+
+RANKING_SQL = """
+SELECT best.user_id, best.username, best.best_score,
+       DENSE_RANK() OVER (ORDER BY best.best_score DESC) AS user_rank,
+       COUNT(*) OVER () AS total_count
+FROM (
+    SELECT a.user_id, u.username, MAX(a.total_score) AS best_score
+    FROM {attempt_table} a
+    INNER JOIN {user_table} u ON u.id = a.user_id
+    {group_join}
+    WHERE a.quiz_id = %s AND a.is_finished = %s
+    GROUP BY a.user_id, u.username
+) best
+ORDER BY user_rank, best.username
+LIMIT %s OFFSET %s
+"""
+
+
+class RankingRow(namedtuple('RankingRow', 'user_id username best_score rank')):
+    __slots__ = ()
+
+
+class RankingPage(namedtuple('RankingPage', 'rows number page_size total_count')):
+    __slots__ = ()
+
+    @property
+    def num_pages(self):
+        return max(1, (self.total_count + self.page_size - 1) // self.page_size)
+
+    @property
+    def has_previous(self):
+        return self.number > 1
+
+    @property
+    def has_next(self):
+        return self.number < self.num_pages
+
+
+def quiz_ranking(quiz_id, group_id=None, page=1, page_size=RANKING_PAGE_SIZE):
+    """
+    Egy kvíz ranglistája a lezárt QuizAttempt-ek alapján (userenként a legjobb
+    futás számít), opcionálisan egy csoport tagjaira szűrve. A rangsorolás és a
+    lapozás egyetlen ablakfüggvényes lekérdezés, az eredményt rövid ideig cache-eljük.
+    """
+    page = max(1, int(page))
+    key = 'quiz_ranking:{}:{}:{}:{}'.format(quiz_id, group_id or 0, page, page_size)
+    ranking = cache.get(key)
+    if ranking is None:
+        ranking = _fetch_ranking(quiz_id, group_id, page, page_size)
+        cache.set(key, ranking, RANKING_CACHE_TIMEOUT)
+    return ranking
+
+
+def ranking_sql(quiz_id, group_id=None, page=1, page_size=RANKING_PAGE_SIZE):
+    """A ranglista lekérdezése (sql, params) formában (a quiz.query_audit is ezt vizsgálja)."""
+    User = get_user_model()
+    qn = connection.ops.quote_name
+    params = []
+    group_join = ''
+    if group_id:
+        group_join = 'INNER JOIN {} ug ON ug.user_id = a.user_id AND ug.group_id = %s'.format(
+            qn(User.groups.through._meta.db_table)
+        )
+        params.append(group_id)
+    params += [quiz_id, True, page_size, (page - 1) * page_size]
+
+    sql = RANKING_SQL.format(
+        attempt_table=qn(QuizAttempt._meta.db_table),
+        user_table=qn(User._meta.db_table),
+        group_join=group_join,
+    )
+    return sql, params
+
+
+def _fetch_ranking(quiz_id, group_id, page, page_size):
+    sql, params = ranking_sql(quiz_id, group_id, page, page_size)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        result = cursor.fetchall()
+
+    rows = [RankingRow(user_id, username, to_marks(best_score), rank)
+            for user_id, username, best_score, rank, _ in result]
+    total_count = result[0][4] if result else 0
+    return RankingPage(rows=rows, number=page, page_size=page_size, total_count=total_count)
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz import query_audit
+
+
+class Command(BaseCommand):
+    help = ('Runs EXPLAIN for every query in the quiz.query_audit hot-query registry against the current '
+            'database and reports full table scans and temporary sorts. Exits non-zero when any query '
+            'is flagged, so it can run as a deployment or CI check.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query', action='append', default=[], metavar='NAME',
+                            help='Only audit the named registry entry (repeatable).')
+        parser.add_argument('--list', action='store_true', help='List the registry entries and exit.')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for hot_query in query_audit.HOT_QUERIES:
+                self.stdout.write(hot_query.name)
+            return
+
+        queries = query_audit.HOT_QUERIES
+        if options['query']:
+            known = set(hot_query.name for hot_query in queries)
+            unknown = [name for name in options['query'] if name not in known]
+            if unknown:
+                raise CommandError('Unknown hot query: {}'.format(', '.join(unknown)))
+            queries = [hot_query for hot_query in queries if hot_query.name in options['query']]
+
+        flagged = 0
+        for report in query_audit.audit(queries):
+            if report.ok:
+                self.stdout.write('{} {}'.format(self.style.SUCCESS('OK  '), report.name))
+            else:
+                flagged += 1
+                self.stdout.write('{} {}'.format(self.style.ERROR('FAIL'), report.name))
+                for kind, line in report.findings:
+                    self.stdout.write('       {}: {}'.format(kind, line))
+            if options['verbosity'] > 1 or not report.ok:
+                for line in report.plan:
+                    self.stdout.write('       | {}'.format(line))
+
+        if flagged:
+            raise CommandError('{} of {} hot queries have a full scan or temporary sort.'.format(
+                flagged, len(queries)))
+        self.stdout.write('All {} hot queries use indexes.'.format(len(queries)))
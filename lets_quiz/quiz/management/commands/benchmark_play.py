@@ -0,0 +1,87 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from quiz import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Load-tests the play -> submit -> submission_result -> quiz_end -> quiz_results loop '
+            'with N concurrent simulated students on a throwaway SQLite database, and reports '
+            'requests/sec, p50/p95/p99 latency and queries per request for each view.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=30)
+        parser.add_argument('--groups', type=int, default=3)
+        parser.add_argument('--quizzes', type=int, default=2)
+        parser.add_argument('--questions-per-type', type=int, default=3)
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--mode', choices=list(benchmark.MODES), default=benchmark.CLASSIC,
+                            help='classic: play POST + redirect; api: JSON answer API; prefetch: whole-quiz '
+                                 'download with batched answer sync (seeds quizzes without immediate feedback).')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+        parser.add_argument('--max-p95-ms', type=float, default=None,
+                            help='Fail if any view has a higher p95 latency.')
+        parser.add_argument('--max-queries', type=int, default=None,
+                            help='Fail if any request runs more queries.')
+
+    def handle(self, *args, **options):
+        # eldobható, fájl alapú SQLite adatbázis, hogy a szálak ugyanazt lássák
+        temp_dir = tempfile.mkdtemp(prefix='quiz_benchmark_')
+        for alias in connections:
+            settings_dict = connections[alias].settings_dict
+            settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(temp_dir, '{}.sqlite3'.format(alias))
+
+        # a test client 'testserver' hostként küldi a kéréseket
+        hosts = override_settings(ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver'])
+        hosts.enable()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            quiz_ids, usernames = benchmark.seed_classroom(
+                students=options['students'],
+                groups=options['groups'],
+                quizzes=options['quizzes'],
+                questions_per_type=options['questions_per_type'],
+                seed=options['seed'],
+                immediate_feedback=options['mode'] != benchmark.PREFETCH,
+            )
+            report = benchmark.run_classroom(
+                quiz_ids, usernames, concurrency=options['concurrency'], seed=options['seed'],
+                mode=options['mode'],
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            hosts.disable()
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        summary = report.summary()
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+        else:
+            self._print_table(summary)
+
+        failures = []
+        if report.total_errors:
+            failures.append('{} request(s) failed'.format(report.total_errors))
+        for name, view in summary['views'].items():
+            if options['max_p95_ms'] is not None and view['p95_ms'] > options['max_p95_ms']:
+                failures.append('{}: p95 {} ms > {} ms'.format(name, view['p95_ms'], options['max_p95_ms']))
+            if options['max_queries'] is not None and view['max_queries'] > options['max_queries']:
+                failures.append('{}: {} queries > {}'.format(name, view['max_queries'], options['max_queries']))
+        if failures:
+            raise CommandError('Benchmark gate failed: ' + '; '.join(failures))
+
+    def _print_table(self, summary):
+        self.stdout.write('{students} students, {requests} requests in {wall_seconds} s '
+                          '({req_per_s} req/s), {errors} error(s)'.format(**summary))
+        columns = ('requests', 'errors', 'req_per_s', 'p50_ms', 'p95_ms', 'p99_ms', 'avg_queries', 'max_queries')
+        self.stdout.write('{:<18} '.format('view') + ' '.join('{:>11}'.format(c) for c in columns))
+        for name, view in summary['views'].items():
+            self.stdout.write('{:<18} '.format(name) + ' '.join('{:>11}'.format(view[c]) for c in columns))
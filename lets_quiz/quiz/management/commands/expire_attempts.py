@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from quiz.models import QuizAttempt
+
+
+class Command(BaseCommand):
+    help = ('Finishes expired quiz attempts in bulk: timed attempts past their deadline, attempts paused '
+            'for too long and, optionally, untimed attempts abandoned for too long. '
+            'Use --loop to keep sweeping in the background.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--paused-after', type=int,
+                            default=getattr(settings, 'QUIZ_ATTEMPT_PAUSE_TIMEOUT', 30 * 60),
+                            help='Seconds after which a paused attempt counts as abandoned.')
+        parser.add_argument('--abandoned-after', type=int,
+                            default=getattr(settings, 'QUIZ_ATTEMPT_ABANDON_AFTER', 7 * 24 * 60 * 60),
+                            help='Seconds after which an untimed open attempt is finished (0 disables).')
+        parser.add_argument('--loop', type=int, default=0, metavar='SECONDS',
+                            help='Repeat the sweep every SECONDS seconds instead of running once.')
+
+    def handle(self, *args, **options):
+        while True:
+            finished = QuizAttempt.finish_expired(
+                batch_size=options['batch_size'],
+                paused_after=options['paused_after'],
+                abandoned_after=options['abandoned_after'] or None,
+            )
+            self.stdout.write('Finished {} expired attempt(s).'.format(finished))
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
@@ -0,0 +1,33 @@
+import io
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz import exporter
+from quiz.models import Quiz
+
+
+class Command(BaseCommand):
+    help = ("Streams every attempt and answer of a quiz (selected choices, text answers and matching "
+            "choices included) as CSV or NDJSON, with a fixed number of queries.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_id', type=int)
+        parser.add_argument('--format', choices=sorted(exporter.FORMATS), default='csv')
+        parser.add_argument('--output', default=None, help='Output file (defaults to stdout).')
+
+    def handle(self, *args, **options):
+        if not Quiz.objects.filter(pk=options['quiz_id']).exists():
+            raise CommandError('Quiz {} does not exist.'.format(options['quiz_id']))
+        generate = exporter.FORMATS[options['format']][0]
+
+        if options['output']:
+            stream = io.open(options['output'], 'w', encoding='utf-8', newline='')
+        else:
+            stream = sys.stdout
+        try:
+            for chunk in generate(options['quiz_id']):
+                stream.write(chunk)
+        finally:
+            if options['output']:
+                stream.close()
@@ -0,0 +1,39 @@
+import io
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz import importer
+from quiz.models import Quiz
+
+
+class Command(BaseCommand):
+    help = ('Streams a CSV or NDJSON question bank into a quiz. Rows are validated with the '
+            'question forms and inserted with bulk_create in fixed-size transactional batches.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_id', type=int)
+        parser.add_argument('path', help='CSV (.csv) or NDJSON (one JSON object per line) file.')
+        parser.add_argument('--format', choices=('csv', 'ndjson'), default=None,
+                            help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=importer.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        quiz = Quiz.objects.filter(pk=options['quiz_id']).first()
+        if quiz is None:
+            raise CommandError('Quiz {} does not exist.'.format(options['quiz_id']))
+        fmt = options['format'] or importer.guess_format(options['path'])
+
+        start = time.time()
+        with io.open(options['path'], encoding='utf-8-sig', newline='') as stream:
+            result = importer.import_questions(
+                quiz, importer.iter_rows(stream, fmt), batch_size=options['batch_size']
+            )
+
+        for line, message in result.errors:
+            self.stderr.write('line {}: {}'.format(line, message))
+        if result.failed > len(result.errors):
+            self.stderr.write('... and {} more invalid row(s)'.format(result.failed - len(result.errors)))
+        self.stdout.write(self.style.SUCCESS('Imported {} question(s) into "{}" in {:.2f} s, {} row(s) rejected.'.format(
+            result.created, quiz.title, time.time() - start, result.failed
+        )))
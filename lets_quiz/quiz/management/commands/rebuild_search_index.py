@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from quiz import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of the question bank (question, choice and pair texts).'
+
+    def handle(self, *args, **options):
+        kind = search.backend()
+        if kind is None:
+            raise CommandError('No full-text index on this database (SQLite without FTS5 or unsupported '
+                               'backend); searches fall back to LIKE.')
+        with transaction.atomic():
+            count = search.rebuild()
+        self.stdout.write('Indexed {} question(s) ({}).'.format(count, kind))
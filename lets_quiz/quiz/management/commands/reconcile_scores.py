@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from quiz import leaderboard
+from quiz.models import AttemptedQuestion, QuizAttempt, QuizProfile, to_marks
+
+
+class Command(BaseCommand):
+    help = ('Recomputes QuizProfile and QuizAttempt total scores from the AttemptedQuestion rows '
+            'and rebuilds the leaderboard.')
+
+    def handle(self, *args, **options):
+        # kvízenként csak a legutóbbi futás (és a futáshoz nem kötött régi válaszok) számít
+        profile_totals = dict(
+            AttemptedQuestion.objects.exclude(attempt__in=QuizAttempt.superseded()).values_list('quiz_profile_id')
+            .annotate(total=Sum('marks_obtained')).order_by()
+        )
+        attempt_totals = dict(
+            AttemptedQuestion.objects.filter(attempt__isnull=False).values_list('attempt_id')
+            .annotate(total=Sum('marks_obtained')).order_by()
+        )
+
+        fixed_profiles = 0
+        fixed_attempts = 0
+        with transaction.atomic():
+            for pk, total_score in QuizProfile.objects.values_list('pk', 'total_score').iterator():
+                expected = to_marks(profile_totals.get(pk))
+                if to_marks(total_score) != expected:
+                    QuizProfile.objects.filter(pk=pk).update(total_score=expected)
+                    fixed_profiles += 1
+
+            for pk, total_score in QuizAttempt.objects.values_list('pk', 'total_score').iterator():
+                expected = to_marks(attempt_totals.get(pk))
+                if to_marks(total_score) != expected:
+                    QuizAttempt.objects.filter(pk=pk).update(total_score=expected)
+                    fixed_attempts += 1
+
+            leaderboard.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Reconciled scores: {fixed_profiles} profile(s) and {fixed_attempts} attempt(s) corrected.'
+        ))
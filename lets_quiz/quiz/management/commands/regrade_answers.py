@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from quiz import grading
+from quiz.models import AttemptedQuestion
+
+
+class Command(BaseCommand):
+    help = 'Re-grades stored answers in batches (e.g. after an answer key was edited).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, help='Only answers given to questions of this quiz.')
+        parser.add_argument('--question', type=int, help='Only answers given to this question.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        attempted_questions = AttemptedQuestion.objects.order_by('pk')
+        if options['quiz']:
+            attempted_questions = attempted_questions.filter(question__quizquestions__quiz_id=options['quiz']).distinct()
+        if options['question']:
+            attempted_questions = attempted_questions.filter(question_id=options['question'])
+
+        batch_size = options['batch_size']
+        graded = 0
+        changed = 0
+        last_pk = 0
+        while True:
+            # keyset lapozás, így a memóriahasználat a batch méretétől függ csak
+            batch = list(attempted_questions.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            previous = {aq.pk: aq.marks_obtained for aq in batch}
+            results = grading.grade_many(batch)
+            changed += sum(1 for pk, result in results.items() if result.marks_obtained != previous[pk])
+            graded += len(batch)
+            last_pk = batch[-1].pk
+
+        self.stdout.write(self.style.SUCCESS(f'Re-graded {graded} answer(s), {changed} score(s) changed.'))
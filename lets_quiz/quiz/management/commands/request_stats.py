@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from quiz.instrumentation import collected_stats, reset_stats
+
+SORT_KEYS = ('count', 'avg_ms', 'p95_ms', 'avg_queries', 'avg_sql_ms')
+
+
+class Command(BaseCommand):
+    help = ('Prints the per-view request latency histogram, query count and SQL time collected by '
+            'quiz.instrumentation from every worker, merged through the shared cache backend '
+            '(settings.CACHES, see QUIZ_CACHE_BACKEND).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Print the raw summary as JSON.')
+        parser.add_argument('--sort', choices=SORT_KEYS, default='count', help='Sort column (descending).')
+        parser.add_argument('--reset', action='store_true', help='Clear the collected numbers after printing.')
+
+    def handle(self, *args, **options):
+        stats = collected_stats()
+        summaries = {name: stats[name].summary() for name in stats}
+
+        if options['json']:
+            self.stdout.write(json.dumps(summaries, indent=2, sort_keys=True))
+        elif not summaries:
+            self.stdout.write('No requests recorded yet.')
+        else:
+            columns = ('count', 'avg_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'avg_queries', 'avg_sql_ms')
+            width = max(len(name) for name in summaries)
+            self.stdout.write('{:<{}} '.format('view', width) + ' '.join('{:>11}'.format(c) for c in columns))
+            ordered = sorted(summaries.items(), key=lambda item: item[1][options['sort']], reverse=True)
+            for name, summary in ordered:
+                self.stdout.write('{:<{}} '.format(name, width) +
+                                  ' '.join('{:>11}'.format(summary[c]) for c in columns))
+
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('Request statistics reset.'))
@@ -0,0 +1,67 @@
+"""
+Csoporttagságok tömeges módosítása a manage_user_groups oldalhoz.
+
+A beküldött állapotot a kapcsolótábla (auth_user_groups) aktuális soraival vetjük
+össze, és csak a különbséget írjuk: a megszűnő sorokat egy DELETE, az újakat egy
+bulk INSERT kezeli, egy tranzakcióban. Mivel ez megkerüli a m2m_changed jelzést,
+a hozzáférési indexet (quiz.access) a ténylegesen érintett userekre magunk
+számoljuk újra.
+"""
+from collections import defaultdict, namedtuple
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .access import BATCH_SIZE, rebuild_users_access
+
+
+class MembershipChange(namedtuple('MembershipChange', 'added removed users')):
+    """added / removed: a beszúrt / törölt tagságok száma, users: az érintett user id-k"""
+    __slots__ = ()
+
+
+def current_memberships(user_ids):
+    """
+    {user_id: {group_id: kapcsolósor pk}} a megadott userekre, kötegenként egy
+    lekérdezéssel (a pk-val a törlés külön olvasás nélkül megy).
+    """
+    Membership = get_user_model().groups.through
+    user_ids = list(user_ids)
+    memberships = defaultdict(dict)
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        for pk, user_id, group_id in Membership.objects.filter(
+                user_id__in=user_ids[start:start + BATCH_SIZE]).values_list('pk', 'user_id', 'group_id'):
+            memberships[user_id][group_id] = pk
+    return memberships
+
+
+@transaction.atomic
+def set_memberships(desired):
+    """
+    desired: {user_id: {group_id, ...}} – a felsorolt userek csoportjai pontosan ezek
+    legyenek; a nem felsorolt userekhez nem nyúlunk.
+    Visszatérési érték: MembershipChange
+    """
+    Membership = get_user_model().groups.through
+    current = current_memberships(desired)
+
+    to_add = []
+    stale = []
+    changed = set()
+    for user_id, group_ids in desired.items():
+        group_ids = set(group_ids)
+        existing = current.get(user_id, {})
+        new = [Membership(user_id=user_id, group_id=group_id) for group_id in group_ids - set(existing)]
+        gone = [pk for group_id, pk in existing.items() if group_id not in group_ids]
+        if new or gone:
+            changed.add(user_id)
+            to_add.extend(new)
+            stale.extend(gone)
+
+    for start in range(0, len(stale), BATCH_SIZE):
+        Membership.objects.filter(pk__in=stale[start:start + BATCH_SIZE]).delete()
+    Membership.objects.bulk_create(to_add, batch_size=BATCH_SIZE)
+
+    if changed:
+        rebuild_users_access(changed)
+    return MembershipChange(added=len(to_add), removed=len(stale), users=sorted(changed))
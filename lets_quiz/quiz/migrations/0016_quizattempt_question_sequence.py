@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 20:38
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0015_remove_attemptedquestion_matching_answer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attemptedquestion',
+            name='attempt',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='attempted_questions', to='quiz.QuizAttempt'),
+        ),
+        migrations.AddField(
+            model_name='quizattempt',
+            name='question_sequence',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
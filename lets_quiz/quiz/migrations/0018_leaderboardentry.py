@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 20:43
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_leaderboard(apps, schema_editor):
+    QuizProfile = apps.get_model('quiz', 'QuizProfile')
+    LeaderboardEntry = apps.get_model('quiz', 'LeaderboardEntry')
+
+    entries = []
+    rank = 0
+    previous_score = None
+    profiles = QuizProfile.objects.order_by('-total_score').values_list('pk', 'user__username', 'total_score')
+    for pk, username, total_score in profiles.iterator():
+        if total_score != previous_score:
+            rank += 1
+            previous_score = total_score
+        entries.append(LeaderboardEntry(quiz_profile_id=pk, username=username, total_score=total_score, rank=rank))
+    LeaderboardEntry.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0017_quiz_content_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=150)),
+                ('total_score', models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=10)),
+                ('rank', models.PositiveIntegerField(default=1)),
+                ('quiz_profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entry', to='quiz.QuizProfile')),
+            ],
+            options={
+                'ordering': ['rank', 'username'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['rank', 'username'], name='quiz_leader_rank_83bac8_idx'),
+        ),
+        migrations.RunPython(populate_leaderboard, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 20:44
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_quiz_access(apps, schema_editor):
+    Quiz = apps.get_model('quiz', 'Quiz')
+    QuizAccess = apps.get_model('quiz', 'QuizAccess')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    for quiz in Quiz.objects.all():
+        user_ids = set(quiz.allowed_users.values_list('pk', flat=True))
+        group_ids = list(quiz.allowed_groups.values_list('pk', flat=True))
+        if group_ids:
+            user_ids.update(User.objects.filter(groups__in=group_ids).values_list('pk', flat=True))
+        if not user_ids and not group_ids:
+            continue
+        Quiz.objects.filter(pk=quiz.pk).update(is_restricted=True)
+        QuizAccess.objects.bulk_create(
+            [QuizAccess(quiz_id=quiz.pk, user_id=user_id) for user_id in user_ids], batch_size=500
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quiz', '0018_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizAccess',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='is_restricted',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AddField(
+            model_name='quizaccess',
+            name='quiz',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='access_entries', to='quiz.Quiz'),
+        ),
+        migrations.AddField(
+            model_name='quizaccess',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_access', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='quizaccess',
+            unique_together=set([('user', 'quiz')]),
+        ),
+        migrations.RunPython(populate_quiz_access, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 20:58
+from __future__ import unicode_literals
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def populate_deadlines(apps, schema_editor):
+    # a folyamatban lévő, időkorlátos futások határideje a kezdéstől számítva
+    QuizAttempt = apps.get_model('quiz', 'QuizAttempt')
+    attempts = QuizAttempt.objects.filter(is_finished=False, quiz__time_limit_seconds__gt=0).values_list(
+        'pk', 'started_at', 'quiz__time_limit_seconds'
+    )
+    for pk, started_at, time_limit_seconds in attempts.iterator():
+        QuizAttempt.objects.filter(pk=pk).update(deadline=started_at + timedelta(seconds=time_limit_seconds))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0020_quizattempt_ranking_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizattempt',
+            name='deadline',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='quizattempt',
+            name='paused_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['is_finished', 'deadline'], name='quiz_quizat_is_fini_db730c_idx'),
+        ),
+        migrations.RunPython(populate_deadlines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 21:01
+from __future__ import unicode_literals
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def attach_legacy_answers(apps, schema_editor):
+    """
+    A futáshoz nem kötött (attempt=NULL) régi válaszokat a user legutóbbi futásához
+    kötjük azon a kvízen, amiben a kérdés szerepel; ha nincs ilyen futás, egy lezárt
+    futást hozunk létre nekik. Amelyik kérdés egyik kvízben sem szerepel, az marad.
+    """
+    AttemptedQuestion = apps.get_model('quiz', 'AttemptedQuestion')
+    QuizAttempt = apps.get_model('quiz', 'QuizAttempt')
+    QuizQuestion = apps.get_model('quiz', 'QuizQuestion')
+
+    legacy = list(AttemptedQuestion.objects.filter(attempt__isnull=True).values_list(
+        'pk', 'question_id', 'quiz_profile__user_id'
+    ))
+    if not legacy:
+        return
+
+    quizzes_of_question = defaultdict(list)
+    for question_id, quiz_id in QuizQuestion.objects.filter(
+            question_id__in=set(row[1] for row in legacy)).order_by('pk').values_list('question_id', 'quiz_id'):
+        quizzes_of_question[question_id].append(quiz_id)
+
+    latest = {}
+    for pk, quiz_id, user_id in QuizAttempt.objects.filter(
+            user_id__in=set(row[2] for row in legacy)).order_by('pk').values_list('pk', 'quiz_id', 'user_id'):
+        latest[(user_id, quiz_id)] = pk
+
+    attach = defaultdict(list)
+    for aq_id, question_id, user_id in legacy:
+        quiz_ids = quizzes_of_question.get(question_id)
+        if not quiz_ids:
+            continue
+        # ahol már van futása, azt választjuk, különben a kérdés első kvízét
+        quiz_id = next((q for q in quiz_ids if (user_id, q) in latest), quiz_ids[0])
+        attempt_id = latest.get((user_id, quiz_id))
+        if attempt_id is None:
+            now = timezone.now()
+            attempt_id = QuizAttempt.objects.create(
+                quiz_id=quiz_id, user_id=user_id, is_finished=True, finished_at=now
+            ).pk
+            latest[(user_id, quiz_id)] = attempt_id
+        attach[attempt_id].append(aq_id)
+
+    for attempt_id, aq_ids in attach.items():
+        AttemptedQuestion.objects.filter(pk__in=aq_ids).update(attempt_id=attempt_id)
+        total = AttemptedQuestion.objects.filter(attempt_id=attempt_id).aggregate(
+            total=models.Sum('marks_obtained')
+        )['total'] or 0
+        QuizAttempt.objects.filter(pk=attempt_id).update(total_score=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0021_quizattempt_deadline'),
+    ]
+
+    operations = [
+        migrations.RunPython(attach_legacy_answers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 21:03
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0022_attach_legacy_answers'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attemptedquestion',
+            index=models.Index(fields=['quiz_profile', 'question'], name='quiz_attemp_quiz_pr_5738a0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['created_at'], name='quiz_quiz_created_8a9e8a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['user', 'quiz'], name='quiz_quizat_user_id_2f0af4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizprofile',
+            index=models.Index(fields=['total_score'], name='quiz_quizpr_total_s_51da10_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 22:10
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations
+
+# (index neve, modell, mező): kis- és nagybetűtől független előtag-keresés (quiz.pickers)
+SEARCH_INDEXES = (
+    ('quiz_user_username_lower_idx', settings.AUTH_USER_MODEL, 'username'),
+    ('quiz_user_first_name_lower_idx', settings.AUTH_USER_MODEL, 'first_name'),
+    ('quiz_user_last_name_lower_idx', settings.AUTH_USER_MODEL, 'last_name'),
+    ('quiz_group_name_lower_idx', 'auth.Group', 'name'),
+)
+
+
+def _targets(apps, schema_editor):
+    qn = schema_editor.quote_name
+    for name, model_label, field_name in SEARCH_INDEXES:
+        model = apps.get_model(model_label)
+        column = model._meta.get_field(field_name).column
+        yield qn(name), qn(model._meta.db_table), qn(column)
+
+
+def create_search_indexes(apps, schema_editor):
+    # kifejezés-indexet a Django 1.11 Meta.indexes még nem tud, ezért nyers SQL
+    vendor = schema_editor.connection.vendor
+    for name, table, column in _targets(apps, schema_editor):
+        expression = 'LOWER({})'.format(column)
+        if vendor == 'mysql':
+            # MySQL 8.0.13+: funkcionális index, dupla zárójellel
+            expression = '({})'.format(expression)
+        schema_editor.execute('CREATE INDEX {} ON {} ({})'.format(name, table, expression))
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for name, table, column in _targets(apps, schema_editor):
+        if vendor == 'mysql':
+            schema_editor.execute('DROP INDEX {} ON {}'.format(name, table))
+        else:
+            schema_editor.execute('DROP INDEX {}'.format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('auth', '0008_alter_user_username_max_length'),
+        ('quiz', '0023_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
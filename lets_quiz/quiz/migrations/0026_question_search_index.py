@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 22:40
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+from quiz import search
+
+
+def create_search_index(apps, schema_editor):
+    # a virtuális tábla / tsvector tábla nem modell, ezért nyers SQL (quiz.search)
+    if search.create_index(schema_editor) is None:
+        return
+    models = (apps.get_model('quiz', 'Question'), apps.get_model('quiz', 'Choice'),
+              apps.get_model('quiz', 'MatchingPair'))
+    search.rebuild(models=models, using=schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0025_question_pools'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 21:54
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0026_question_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='leaderboardentry',
+            options={'ordering': ['-total_score', 'username']},
+        ),
+        migrations.RemoveIndex(
+            model_name='leaderboardentry',
+            name='quiz_leader_rank_83bac8_idx',
+        ),
+        migrations.RemoveField(
+            model_name='leaderboardentry',
+            name='rank',
+        ),
+        migrations.AlterField(
+            model_name='leaderboardentry',
+            name='total_score',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['-total_score', 'username'], name='quiz_leader_total_s_c11645_idx'),
+        ),
+    ]
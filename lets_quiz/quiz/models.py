@@ -6,8 +6,11 @@ from model_utils.models import TimeStampedModel
 from django.conf import settings
 from django.utils import timezone
 import logging
+from datetime import timedelta
 from decimal import Decimal
-from django.db import models
+from django.db import models, transaction
+
+from . import pools
 
 
 
@@ -15,6 +18,12 @@ logger = logging.getLogger(__name__)
 
 User = settings.AUTH_USER_MODEL
 
+
+def to_marks(value):
+    """Pontszám normalizálása két tizedesjegyre (Decimal), a DecimalField-ekhez."""
+    return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+
+
 class Quiz(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
@@ -24,6 +33,19 @@ class Quiz(models.Model):
     immediate_feedback = models.BooleanField(default=False)
     allow_multiple_attempts = models.BooleanField(default=True)
     is_published = models.BooleanField(default=False)
+    # tartalmi módosításkor nő, ez a kulcsa a cache-elt pillanatképnek (quiz.snapshot)
+    content_version = models.PositiveIntegerField(default=1)
+    # van-e user/csoport korlátozás (az allowed_* mezőkből számolt, quiz.access tartja karban)
+    is_restricted = models.BooleanField(default=False, db_index=True)
+    # kérdéshúzás (quiz.pools): futásonként ennyi kérdés a kvíz kérdései közül, 0 = mind
+    pool_size = models.PositiveIntegerField(default=0)
+    shuffle_questions = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # tanári kvízlista (legújabb elöl)
+            models.Index(fields=['created_at']),
+        ]
 
 
     allowed_users = models.ManyToManyField(
@@ -48,6 +70,22 @@ class Quiz(models.Model):
 
     
 
+class QuizAccess(models.Model):
+    """
+    Denormalizált user -> kvíz hozzáférési index a korlátozott kvízekhez: az
+    allowed_users és az allowed_groups tagjainak uniója. A nyitott kvízekhez nincs
+    sor, azokat a Quiz.is_restricted jelzi. A quiz.access tartja karban.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_access')
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='access_entries')
+
+    class Meta:
+        unique_together = ('user', 'quiz')
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.quiz_id}"
+
+
 class QuizQuestion(models.Model):
     """
     Egy QuizQuestion csupán a sorrendet és a kapcsolatot tárolja
@@ -77,22 +115,176 @@ class QuizAttempt(models.Model):
     current_index = models.IntegerField(default=0)  # hányadik kérdésnél tart (0-based)
     total_score = models.DecimalField(default=Decimal('0.00'), decimal_places=2, max_digits=10)
     is_finished = models.BooleanField(default=False)
+    # a kezdéskor rögzített kérdéssorrend (Question id-k vesszővel elválasztva)
+    question_sequence = models.TextField(blank=True, default='')
+    # szerveroldali határidő (időkorlátos kvíznél), a szüneteltetés ideje kitolja
+    deadline = models.DateTimeField(null=True, blank=True)
+    # azonnali visszajelzésnél a visszajelző oldal idejére megáll az óra
+    paused_at = models.DateTimeField(null=True, blank=True)
+    # a kérdéshúzás seed-je (quiz.pools): ebből számoltuk a question_sequence-t
+    seed = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # kvízenkénti ranglista (quiz.leaderboard.quiz_ranking)
+            models.Index(fields=['quiz', 'is_finished', 'user', 'total_score']),
+            # lejárt futások tömeges lezárása (finish_expired)
+            models.Index(fields=['is_finished', 'deadline']),
+            # a user legutóbbi futása egy kvízen (start_or_resume, superseded)
+            models.Index(fields=['user', 'quiz']),
+        ]
+
+    @classmethod
+    def start_or_resume(cls, quiz, quiz_profile):
+        """
+        Visszaadja a user legutóbbi futását az adott kvízen, vagy ha még nincs, újat indít.
+        Új futásnál egyszer, a kezdéskor kiszámoljuk és rögzítjük a kérdések
+        sorrendjét, így később a következő kérdés egy index alapján megvan.
+        """
+        attempt = cls.objects.filter(quiz=quiz, user_id=quiz_profile.user_id).order_by('-pk').first()
+        if attempt is not None:
+            return attempt
+        return cls.start_new(quiz, quiz_profile)
 
-    def time_left(self):
-        """Ha van time_limit a quiz-en, mennyi van még (másodperc)"""
-        if self.quiz.time_limit_seconds <= 0:
+    @classmethod
+    def start_new(cls, quiz, quiz_profile):
+        """
+        Új futás indítása; a korábbi futások (és válaszaik) előzményként megmaradnak.
+        A kérdéseket a kvíz beállítása szerint a futás seed-jéből húzzuk (quiz.pools).
+        """
+        from .snapshot import get_quiz_snapshot
+
+        # a régi, futáshoz nem kötött válaszokat a 0022-es migráció futásokhoz kötötte, így
+        # a húzás a kvíz teljes kérdéssorából megy (más kvízben adott válasz nem számít)
+        question_ids = get_quiz_snapshot(quiz).question_ids
+
+        attempt = cls(quiz=quiz, user_id=quiz_profile.user_id, seed=pools.new_seed())
+        attempt.set_question_ids(pools.draw(question_ids, attempt.seed, quiz.pool_size, quiz.shuffle_questions))
+        if quiz.time_limit_seconds > 0:
+            attempt.deadline = timezone.now() + timedelta(seconds=quiz.time_limit_seconds)
+        attempt.save()
+        return attempt
+
+    @classmethod
+    def superseded(cls):
+        """
+        Azok a futások, amiknél a usernek van újabb futása ugyanazon a kvízen. A profil
+        összpontszámába kvízenként csak a legutóbbi futás számít, ezek már nem.
+        """
+        newer = cls.objects.filter(quiz=models.OuterRef('quiz'), user=models.OuterRef('user'),
+                                   pk__gt=models.OuterRef('pk'))
+        return cls.objects.annotate(has_newer=models.Exists(newer)).filter(has_newer=True)
+
+    def get_question_ids(self):
+        if not self.question_sequence:
+            return []
+        return [int(pk) for pk in self.question_sequence.split(',')]
+
+    def set_question_ids(self, question_ids):
+        self.question_sequence = ','.join(str(pk) for pk in question_ids)
+
+    def current_question_id(self):
+        """Az aktuális (még ki nem osztott) kérdés id-ja, vagy None, ha elfogytak."""
+        question_ids = self.get_question_ids()
+        if self.current_index < len(question_ids):
+            return question_ids[self.current_index]
+        return None
+
+    def advance(self):
+        """
+        Továbblépés a következő kérdésre. A feltételes UPDATE miatt két párhuzamos
+        kérés nem tudja ugyanazt az indexet kétszer léptetni.
+        """
+        advanced = QuizAttempt.objects.filter(
+            pk=self.pk, current_index=self.current_index
+        ).update(current_index=models.F('current_index') + 1)
+        self.current_index += 1
+        return bool(advanced)
+
+    def attempted_question_for(self, question_id):
+        """
+        A futásban az adott kérdésre kiosztott AttemptedQuestion. Ha (régebbi, párhuzamos
+        kiszolgálásból) több is van, a legutóbbit adja, MultipleObjectsReturned helyett.
+        """
+        attempted_question = self.attempted_questions.filter(question_id=question_id).order_by('-pk').first()
+        if attempted_question is None:
+            raise AttemptedQuestion.DoesNotExist("Nincs ilyen kérdéskísérlet")
+        return attempted_question
+
+    def time_left(self, now=None):
+        """Hátralévő idő másodpercben, vagy None, ha nincs időkorlát. Szünetben nem fogy."""
+        if self.deadline is None:
             return None
-        elapsed = (timezone.now() - self.started_at).total_seconds()
-        remaining = self.quiz.time_limit_seconds - elapsed
-        return max(0, int(remaining))
+        now = self.paused_at or now or timezone.now()
+        return max(0, int((self.deadline - now).total_seconds()))
+
+    def is_expired(self, now=None):
+        remaining = self.time_left(now)
+        return remaining is not None and remaining <= 0
+
+    def pause(self):
+        """Az óra megállítása (pl. az azonnali visszajelzés oldalára lépéskor)."""
+        if self.deadline is None or self.paused_at is not None:
+            return
+        self.paused_at = timezone.now()
+        QuizAttempt.objects.filter(pk=self.pk, paused_at__isnull=True).update(paused_at=self.paused_at)
+
+    def resume(self):
+        """A szünet hosszával kitolja a határidőt; feltételes UPDATE, így csak egyszer tolódik."""
+        if self.paused_at is None:
+            return
+        now = timezone.now()
+        paused_for = now - self.paused_at
+        resumed = QuizAttempt.objects.filter(pk=self.pk, paused_at=self.paused_at).update(
+            deadline=models.F('deadline') + paused_for, paused_at=None
+        )
+        if resumed:
+            self.deadline += paused_for
+            self.paused_at = None
+        else:
+            self.refresh_from_db(fields=['deadline', 'paused_at'])
 
     def finish(self):
+        # az összpontszámot a QuizProfile.record_marks válaszonként már vezeti
         self.is_finished = True
         self.finished_at = timezone.now()
-        # összesítés: AttemptedQuestion-ök alapján (ha ilyeneket használsz)
+        self.save(update_fields=['is_finished', 'finished_at'])
+
+    @classmethod
+    def finish_expired(cls, now=None, batch_size=500, abandoned_after=None, paused_after=None):
+        """
+        A lejárt futások tömeges lezárása, kötegenként egy UPDATE-tel (a pontszámok
+        válaszonként már könyvelve vannak, újraszámolni nem kell). Lejárt:
+        - az időkorlátos, nem szüneteltetett futás, aminek elmúlt a határideje,
+        - a paused_after másodpercnél régebben szüneteltetett futás,
+        - abandoned_after megadásakor az ennél régebben indított időkorlát nélküli futás.
+        Visszatérési érték: a lezárt futások száma.
+        """
+        now = now or timezone.now()
+        expired = models.Q(paused_at__isnull=True, deadline__lte=now)
+        if paused_after is not None:
+            expired |= models.Q(paused_at__lte=now - timedelta(seconds=paused_after))
+        if abandoned_after is not None:
+            expired |= models.Q(deadline__isnull=True, started_at__lte=now - timedelta(seconds=abandoned_after))
+        candidates = cls.objects.filter(expired, is_finished=False)
+
+        finished = 0
+        last_pk = 0
+        while True:
+            pks = list(candidates.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return finished
+            last_pk = pks[-1]
+            # az is_finished=False feltétel miatt a közben lezárt futásokat nem írjuk felül
+            finished += cls.objects.filter(pk__in=pks, is_finished=False).update(
+                is_finished=True, finished_at=now, paused_at=None
+            )
+
+    def update_score(self):
+        """Teljes újraszámolás az AttemptedQuestion-ök alapján (egyeztetéshez)."""
         total = self.attempted_questions.aggregate(total=models.Sum('marks_obtained'))['total'] or 0
         self.total_score = total
-        self.save(update_fields=['is_finished', 'finished_at', 'total_score'])
+        self.save(update_fields=['total_score'])
 
     def __str__(self):
         return f"{self.user.username} - {self.quiz.title} - started {self.started_at}"
@@ -137,26 +329,32 @@ class QuizProfile(TimeStampedModel):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     total_score = models.DecimalField(_('Total Score'), default=0, decimal_places=2, max_digits=10)
 
+    class Meta:
+        indexes = [
+            # pontszám szerinti sorrend (a ranglista újraépítése)
+            models.Index(fields=['total_score']),
+        ]
+
     def __str__(self):
         return f'<QuizProfile: user={self.user}>'
 
-    def get_new_question(self):
-        used_questions_pk = AttemptedQuestion.objects.filter(quiz_profile=self).values_list('question__pk', flat=True)
-        remaining_questions = Question.objects.exclude(pk__in=used_questions_pk)
-        if not remaining_questions.exists():
-            return
-        return random.choice(remaining_questions)
+    def get_new_question(self, rng=random):
+        """Egy véletlen, a user által még meg nem válaszolt kérdés a teljes kérdésbankból (vagy None)."""
+        used_questions = AttemptedQuestion.objects.filter(quiz_profile=self).values('question_id')
+        return pools.pick_one(Question.objects.exclude(pk__in=used_questions), rng)
 
-    def create_attempt(self, question):
-        attempted_question = AttemptedQuestion(question=question, quiz_profile=self)
+    def create_attempt(self, question, quiz_attempt=None):
+        # question lehet Question vagy a pillanatképből származó QuestionSnapshot is
+        attempted_question = AttemptedQuestion(question_id=question.pk, quiz_profile=self, attempt=quiz_attempt)
         attempted_question.save()
         return attempted_question
 
     def evaluate_attempt(self, attempted_question, selected_choices):
         """
         selected_choices: iterable of Choice objects or QuerySet
+        Az értékelést a quiz.grading végzi, ez csak a régi hívási formát tartja meg.
         """
-        question = attempted_question.question
+        from . import grading
 
         # Normalize selected_choices to a list
         try:
@@ -164,54 +362,92 @@ class QuizProfile(TimeStampedModel):
         except Exception:
             selected_list = [selected_choices] if selected_choices else []
 
-        chosen_ids = set(int(c.pk) for c in selected_list if c is not None)
-        correct_ids = set(question.choices.filter(is_correct=True).values_list('pk', flat=True))
-
-        # --- DEBUG prints ---
-        print("### EVAL DEBUG: Question ID:", question.pk)
-        print("### EVAL DEBUG: Correct IDs:", correct_ids)
-        print("### EVAL DEBUG: Chosen IDs:", chosen_ids)
-
-        # Save selected choices
-        attempted_question.selected_choices.set(selected_list)
-
-        # --- Evaluation logic ---
-        if not question.is_multiple_choice:
-            print("### EVAL DEBUG: SINGLE mode")
-            if len(chosen_ids) == 1 and list(chosen_ids)[0] in correct_ids:
-                attempted_question.is_correct = True
-                attempted_question.marks_obtained = question.maximum_marks
-            else:
-                attempted_question.is_correct = False
-                attempted_question.marks_obtained = 0
-        else:
-            print("### EVAL DEBUG: MULTIPLE mode")
-            correct_selected = len(chosen_ids & correct_ids)
-            incorrect_selected = len(chosen_ids - correct_ids)
-            total_correct = len(correct_ids)
-
-            print(f"### EVAL DEBUG: correct_selected={correct_selected}, incorrect_selected={incorrect_selected}, total_correct={total_correct}")
+        submission = grading.Submission(choice_ids=[c.pk for c in selected_list if c is not None])
+        grading.grade_many([attempted_question], {attempted_question.pk: submission})
+        self.refresh_from_db(fields=['total_score'])
 
-            if correct_selected == total_correct and incorrect_selected == 0:
-                attempted_question.is_correct = True
-                attempted_question.marks_obtained = question.maximum_marks
-            else:
-                ratio = (correct_selected / total_correct) if total_correct > 0 else 0
-                attempted_question.is_correct = False
-                attempted_question.marks_obtained = round(float(question.maximum_marks) * ratio, 2)
-
-        attempted_question.save(update_fields=['is_correct', 'marks_obtained'])
+    def record_marks(self, attempted_question, previous_marks):
+        """
+        Egy (újra)értékelt válasz pontváltozását könyveli el: a profil és a
+        hozzá tartozó QuizAttempt összpontszámát atomikus delta-UPDATE-tel
+        frissítjük, így a válaszonkénti írás költsége nem függ az előzményektől.
+        """
+        delta = to_marks(attempted_question.marks_obtained) - to_marks(previous_marks)
+        if not delta:
+            return
+        attempt_deltas = {attempted_question.attempt_id: delta} if attempted_question.attempt_id else {}
+        QuizProfile.apply_score_deltas({self.pk: delta}, attempt_deltas)
+        self.total_score = to_marks(self.total_score) + delta
 
-        print(f"### EVAL DEBUG RESULT: is_correct={attempted_question.is_correct}, marks={attempted_question.marks_obtained}")
-        self.update_score()
+    def restart_quiz(self, quiz):
+        """
+        Új futás a kvízen. Semmit nem törlünk: a profil összpontszámából kivonjuk az
+        eddigi (legutóbbi) futás pontjait, mert ezentúl az új futás számít helyette.
+        """
+        with transaction.atomic():
+            previous = QuizAttempt.objects.select_for_update().filter(
+                quiz=quiz, user_id=self.user_id
+            ).order_by('-pk').first()
+            if previous is not None and not previous.is_finished:
+                previous.finish()
+            attempt = QuizAttempt.start_new(quiz, self)
+            if previous is not None:
+                self.apply_score_deltas({self.pk: -to_marks(previous.total_score)}, {})
+        self.refresh_from_db(fields=['total_score'])
+        return attempt
+
+    @staticmethod
+    def apply_score_deltas(profile_deltas, attempt_deltas):
+        """
+        {profile_pk: delta} és {attempt_pk: delta} szótárak alapján F()-es
+        UPDATE-ekkel írja a pontváltozásokat, egy tranzakcióban, a ranglistával együtt.
+        """
+        from . import leaderboard
+
+        with transaction.atomic():
+            for pk, delta in profile_deltas.items():
+                if delta:
+                    QuizProfile.objects.filter(pk=pk).update(total_score=models.F('total_score') + delta)
+            for pk, delta in attempt_deltas.items():
+                if delta:
+                    QuizAttempt.objects.filter(pk=pk).update(total_score=models.F('total_score') + delta)
+            # a materializált ranglista követi a változást
+            leaderboard.sync_profiles(pk for pk, delta in profile_deltas.items() if delta)
 
     def update_score(self):
-        total_score = self.attempts.aggregate(
+        """
+        Teljes újraszámolás: kvízenként a legutóbbi futás válaszai (és a futáshoz nem
+        kötött régi válaszok). A napi működéshez a record_marks elég, ez csak
+        egyeztetésre (reconcile_scores) kell.
+        """
+        superseded = QuizAttempt.superseded().filter(user_id=self.user_id)
+        total_score = self.attempts.exclude(attempt__in=superseded).aggregate(
             total=models.Sum('marks_obtained')
         )['total'] or 0
         self.total_score = total_score
         self.save(update_fields=['total_score'])
 
+class LeaderboardEntry(models.Model):
+    """
+    A globális ranglista materializált sora. A QuizProfile pontszámának minden
+    változásakor a quiz.leaderboard frissíti; a sűrű (dense) helyezést olvasáskor
+    számolja (leaderboard.top_entries), így a ranglista oldal egyetlen indexelt
+    tartomány-olvasás, egy pontszám-változás pedig egyetlen sor írása.
+    """
+    quiz_profile = models.OneToOneField(QuizProfile, related_name='leaderboard_entry', on_delete=models.CASCADE)
+    username = models.CharField(max_length=150)
+    total_score = models.DecimalField(default=0, decimal_places=2, max_digits=10)
+
+    class Meta:
+        ordering = ['-total_score', 'username']
+        indexes = [
+            models.Index(fields=['-total_score', 'username']),
+        ]
+
+    def __str__(self):
+        return f"{self.username} ({self.total_score})"
+
+
 class MatchingPair(models.Model):
     question = models.ForeignKey(
         Question,
@@ -231,11 +467,24 @@ class MatchingPair(models.Model):
 class AttemptedQuestion(TimeStampedModel):
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     quiz_profile = models.ForeignKey(QuizProfile, on_delete=models.CASCADE, related_name='attempts')
+    attempt = models.ForeignKey(
+        QuizAttempt,
+        related_name='attempted_questions',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True
+    )
     selected_choices = models.ManyToManyField(Choice, blank=True)
     is_correct = models.BooleanField(_('Was this attempt correct?'), default=False, null=False)
     marks_obtained = models.DecimalField(_('Marks Obtained'), default=0, decimal_places=2, max_digits=6)
 
     text_answer = models.TextField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # a user adott kérdésre adott válaszai (start_new, profilösszesítés)
+            models.Index(fields=['quiz_profile', 'question']),
+        ]
     
     def __str__(self):
         return f"{self.quiz_profile.user.username} - {self.question.html[:50]}"
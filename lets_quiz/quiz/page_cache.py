@@ -0,0 +1,106 @@
+"""
+Teljes oldalak és oldalrészletek cache-elése generációs (verzió) kulcsokkal.
+
+A nem belépett látogatóknak a home és a ranglista oldal mindenkinek ugyanaz, ezért
+ezeket teljes válaszként cache-eljük (cache_anonymous_page). A belépett userek
+kvízlistáját a sablon {% cache %} blokkja tárolja userenként (quiz_list_version).
+
+Érvénytelenítéskor nem törlünk kulcsokat: a kulcsok része egy generációs szám,
+amit a változás megnövel, így a régi bejegyzések egyszerűen elavulnak.
+- QUIZZES: kvíz mentése / törlése, a hozzáférési index (quiz.access) újraszámolása
+- USER: egy user hozzáférési sorainak újraszámolása (pl. csoporttagság változása)
+- LEADERBOARD: a globális ranglista változása (pontszám, átnevezés, újraépítés)
+A generáció a tranzakció véglegesítése után nő, hogy egy párhuzamos kérés ne
+tehesse el a még régi adatot az új generáció alá.
+
+A generációk (és a quiz.capabilities, quiz.results bejegyzései) csak akkor jutnak
+el minden workerhez, ha a cache backend közös (settings.CACHES); folyamatonkénti
+LocMemCache-nél a check_shared_cache rendszerellenőrzés figyelmeztet.
+"""
+import functools
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db import transaction
+
+QUIZZES = 'quizzes'
+LEADERBOARD = 'leaderboard'
+USER = 'user:{}'
+
+GENERATION_KEY = 'page_cache_gen:{}'
+PAGE_KEY = 'page_cache:{scope}:{generation}:{path}'
+# a generációk nem járnak le, az oldalak igen (biztonsági háló a többfolyamatos futáshoz)
+PAGE_TIMEOUT = getattr(settings, 'QUIZ_PAGE_CACHE_TIMEOUT', 60 * 5)
+FRAGMENT_TIMEOUT = getattr(settings, 'QUIZ_FRAGMENT_CACHE_TIMEOUT', 60 * 5)
+
+
+def generation(scope):
+    key = GENERATION_KEY.format(scope)
+    value = cache.get(key)
+    if value is None:
+        # időbélyeggel indul, így egy kiesett számláló sem ad vissza régi generációt
+        cache.add(key, int(time.time() * 1000), None)
+        value = cache.get(key)
+    return value
+
+
+def _bump_now(scope):
+    key = GENERATION_KEY.format(scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+
+
+def bump(*scopes):
+    """A megadott generációk növelése a tranzakció véglegesítése után."""
+    for scope in scopes:
+        transaction.on_commit(functools.partial(_bump_now, scope))
+
+
+def bump_user(user_id):
+    bump(USER.format(user_id))
+
+
+def quiz_list_version(user):
+    """A user kvízlista-részletének verziója a sablon {% cache %} blokkjához."""
+    scopes = [QUIZZES, USER.format(user.pk)]
+    versions = cache.get_many([GENERATION_KEY.format(scope) for scope in scopes])
+    return '{}.{}'.format(*[versions.get(GENERATION_KEY.format(scope)) or generation(scope) for scope in scopes])
+
+
+def cache_anonymous_page(scope):
+    """
+    Nézet-dekorátor: nem belépett user GET kérésére a kész válasz a scope generációja
+    alatt cache-elve. Csak a sütit nem állító 200-as válaszokat tesszük el; a kulcs
+    az útvonal, a query string nem (ne lehessen vele teleszemetelni a cache-t).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            key = PAGE_KEY.format(scope=scope, generation=generation(scope), path=request.path)
+            response = cache.get(key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.cookies and not response.streaming:
+                    cache.set(key, response, PAGE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
+
+
+@checks.register()
+def check_shared_cache(app_configs, **kwargs):
+    """Több workernél a folyamatonkénti cache-ben egy bump a többi workerhez nem jut el."""
+    if settings.DEBUG or not settings.CACHES['default']['BACKEND'].endswith('LocMemCache'):
+        return []
+    return [checks.Warning(
+        'A default cache backend folyamatonkénti (LocMemCache): egy worker érvénytelenítése '
+        '(page_cache, capabilities, results) a többi workerhez nem jut el.',
+        hint='Állíts be közös cache-t (QUIZ_CACHE_BACKEND=file, memcached vagy db), vagy futtass egy workert.',
+        id='quiz.W001',
+    )]
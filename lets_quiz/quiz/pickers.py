@@ -0,0 +1,103 @@
+"""
+Felhasználó- és csoportkereső a hozzáférés-választókhoz (kvíz beállításai, új kvíz).
+
+A választók nem töltik be az összes usert / csoportot: a quiz_picker.js a
+views.access_search végpontról kér oldalanként néhány találatot. A keresés kis- és
+nagybetűtől független előtag-keresés, tartomány-feltételként (LOWER(mező) >= q AND
+LOWER(mező) < q + U+FFFF) megfogalmazva, így a 0024-es migráció kifejezés-indexei
+kiszolgálják. A lapozás keyset-alapú: a következő oldal a (kulcs, id) kurzor utáni
+elemektől indul, OFFSET nélkül, így bármelyik oldal ugyanannyiba kerül.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from .capabilities import TEACHER_GROUP
+
+PAGE_SIZE = getattr(settings, 'QUIZ_PICKER_PAGE_SIZE', 20)
+
+USERS = 'user'
+GROUPS = 'group'
+
+# az előtag utáni legnagyobb karakter (a BMP-ben), a tartomány felső határához
+_PREFIX_END = '\uffff'
+
+
+class PickerPage(namedtuple('PickerPage', 'results next')):
+    """results: [(id, felirat)], next: a következő oldal kurzora vagy None"""
+    __slots__ = ()
+
+
+def _fold(prefix):
+    """Kisbetűsítés úgy, ahogy az adatbázis LOWER() függvénye teszi (SQLite-on csak ASCII)."""
+    prefix = prefix.strip()
+    if connection.vendor == 'sqlite':
+        return ''.join(char.lower() if ord(char) < 128 else char for char in prefix)
+    return prefix.lower()
+
+
+def _prefix(field, prefix):
+    return Q(**{field + '__gte': prefix, field + '__lt': prefix + _PREFIX_END})
+
+
+def encode_cursor(key, pk):
+    return '{}:{}'.format(pk, key)
+
+
+def decode_cursor(cursor):
+    """'id:kulcs' -> (kulcs, id); hibás kurzornál None (az első oldal jön)."""
+    pk, sep, key = (cursor or '').partition(':')
+    if not sep or not pk.isdigit():
+        return None
+    return key, int(pk)
+
+
+def users_queryset(prefix, students_only=False):
+    """Userek, akiknek a felhasználóneve, keresztneve vagy vezetékneve így kezdődik."""
+    prefix = _fold(prefix)
+    queryset = get_user_model().objects.annotate(
+        search_key=Lower('username'), first_key=Lower('first_name'), last_key=Lower('last_name'),
+    )
+    if prefix:
+        queryset = queryset.filter(
+            _prefix('search_key', prefix) | _prefix('first_key', prefix) | _prefix('last_key', prefix)
+        )
+    if students_only:
+        queryset = queryset.exclude(groups__name=TEACHER_GROUP)
+    return queryset.order_by('search_key', 'pk')
+
+
+def groups_queryset(prefix):
+    prefix = _fold(prefix)
+    queryset = Group.objects.annotate(search_key=Lower('name'))
+    if prefix:
+        queryset = queryset.filter(_prefix('search_key', prefix))
+    return queryset.order_by('search_key', 'pk')
+
+
+def _user_label(user):
+    full_name = user.get_full_name()
+    return '{} ({})'.format(user.username, full_name) if full_name else user.username
+
+
+def search(kind, prefix, cursor=None, students_only=False, limit=PAGE_SIZE):
+    """Egy oldal találat: PickerPage."""
+    if kind == GROUPS:
+        queryset, label = groups_queryset(prefix).only('pk', 'name'), lambda group: group.name
+    else:
+        queryset = users_queryset(prefix, students_only).only('pk', 'username', 'first_name', 'last_name')
+        label = _user_label
+    after = decode_cursor(cursor)
+    if after is not None:
+        key, pk = after
+        queryset = queryset.filter(Q(search_key__gt=key) | Q(search_key=key, pk__gt=pk))
+
+    # eggyel többet kérünk, így külön COUNT nélkül tudjuk, van-e következő oldal
+    rows = list(queryset[:limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1].search_key, rows[limit - 1].pk) if len(rows) > limit else None
+    return PickerPage(results=[(row.pk, label(row)) for row in rows[:limit]], next=next_cursor)
@@ -0,0 +1,74 @@
+"""
+A play JSON API (views.answer_api) válaszának részei.
+
+Egy beküldés válasza egyszerre tartalmazza az értékelés visszajelzését és a
+következő kérdést, így kérdésenként egyetlen kérés megy a szerverre (a POST ->
+redirect -> GET kör és a submission_result oldal helyett). Mindkettő strukturált
+adatként és a play oldal által beilleszthető HTML-ként is megjön.
+
+A kérdés adataiban nincs megoldókulcs: a válaszlehetőségeknél nincs is_correct,
+a párosítás jobb oldali elemei keverve és a pár id-ja helyett aláírt tokennel
+(grading.pair_token) jönnek.
+"""
+import random
+
+from django.template.loader import render_to_string
+
+from . import results
+from .grading import MATCHING, TEXT, pair_token
+
+QUESTION_TEMPLATE = 'quiz/play_question.html'
+
+
+def question_payload(question, rng=random):
+    """A kérdés JSON-formája megoldókulcs nélkül."""
+    payload = {
+        'id': question.id,
+        'kind': question.kind,
+        'html': question.html,
+        'maximum_marks': str(question.maximum_marks),
+        'choices': [{'id': choice.id, 'html': choice.html} for choice in question.choices],
+        'pairs': None,
+    }
+    if question.kind == MATCHING:
+        rights = [{'id': pair_token(question.id, pair.id), 'text': pair.right_text} for pair in question.pairs]
+        rng.shuffle(rights)
+        payload['pairs'] = {
+            'left': [{'id': pair.id, 'text': pair.left_text} for pair in question.pairs],
+            'right': rights,
+        }
+    return payload
+
+
+def render_question(question, request=None):
+    return render_to_string(QUESTION_TEMPLATE, {'question': question}, request=request)
+
+
+def feedback_payload(item):
+    """Egy results.ResultItem (build_feedback) JSON-formája, a helyes válaszokkal együtt."""
+    payload = {
+        'is_correct': item.is_correct,
+        'marks_obtained': str(item.marks_obtained),
+    }
+    if item.kind == TEXT:
+        payload['text_answer'] = item.text_answer
+        payload['correct_text_answer'] = item.correct_text_answer
+    elif item.kind == MATCHING:
+        payload['matches'] = [dict(match._asdict()) for match in item.matches]
+    else:
+        payload['selected_choices'] = [choice.html for choice in item.selected_choices]
+        payload['correct_choices'] = [choice.html for choice in item.choices if choice.is_correct]
+    return payload
+
+
+def answer_response(end_url, remaining_time, feedback_item=None, next_question=None, request=None):
+    """Az answer_api válaszának teljes tartalma."""
+    return {
+        'finished': next_question is None,
+        'end_url': end_url,
+        'remaining_time': remaining_time,
+        'feedback': feedback_payload(feedback_item) if feedback_item is not None else None,
+        'feedback_html': results.render_feedback(feedback_item) if feedback_item is not None else '',
+        'question': question_payload(next_question) if next_question is not None else None,
+        'question_html': render_question(next_question, request) if next_question is not None else '',
+    }
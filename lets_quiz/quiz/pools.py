@@ -0,0 +1,39 @@
+"""
+Kérdéshúzás a futásokhoz: "K kérdés N-ből, véletlen sorrendben".
+
+A futás kezdésekor véletlen seed-et sorsolunk (QuizAttempt.seed), és a futás
+kérdéssorrendjét ebből determinisztikusan számoljuk a kvíz (pillanatképben
+cache-elt) kérdés-id listájából. A random.Random(seed).sample O(K) lépés: nem kell
+kérdéssorokat betölteni, és ORDER BY RANDOM() sincs. Ugyanabból a seed-ből és
+kérdéslistából mindig ugyanaz a sorrend jön ki (hibakereséshez visszajátszható).
+A kihúzott K id a futás question_sequence mezőjébe kerül, így a kérdésbank
+későbbi szerkesztése nem rendezi át a már futó kvízt.
+"""
+import random
+
+SEED_RANGE = 2 ** 31
+
+
+def new_seed():
+    return random.SystemRandom().randrange(SEED_RANGE)
+
+
+def draw(question_ids, seed, pool_size=0, shuffle=False):
+    """
+    A futás kérdéssorrendje. pool_size > 0: ennyi kérdés véletlen sorrendben (ha van
+    ennyi); különben mind, shuffle esetén keverve, egyébként a kvíz sorrendjében.
+    """
+    question_ids = list(question_ids)
+    if pool_size and pool_size < len(question_ids):
+        return random.Random(seed).sample(question_ids, pool_size)
+    if pool_size or shuffle:
+        return random.Random(seed).sample(question_ids, len(question_ids))
+    return question_ids
+
+
+def pick_one(queryset, rng=random):
+    """Egy véletlen sor a querysetből COUNT + pk szerinti OFFSET-tel, a sorok betöltése nélkül."""
+    count = queryset.count()
+    if not count:
+        return None
+    return queryset.order_by('pk')[rng.randrange(count)]
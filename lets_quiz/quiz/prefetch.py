@@ -0,0 +1,200 @@
+"""
+Azonnali visszajelzés nélküli kvízek kitöltése "egyben": a kliens egy kéréssel
+letölti a teljes kvízt, a válaszokat pedig kötegekben szinkronizálja.
+
+A letöltés (build_payload) a futás adataiból (sorrend, határidő) és a kvíz
+tartalmából áll. A tartalom minden diáknak ugyanaz, ezért (quiz_id,
+content_version) szerint előre szerializálva cache-eljük; a válasz ETag-je a
+verzióból és a futás letöltésben szereplő állapotából (kurzor, határidő, lezárás)
+áll, így a változatlan letöltést 304 szolgálja ki, a futás közben elmozdult
+kurzort vagy kitolt határidőt viszont mindig frissen kapja a kliens.
+Megoldókulcs nincs benne: a válaszlehetőségeknél nincs is_correct, a párosítás
+jobb oldali elemei keverve és a pár id-ja helyett aláírt, átlátszatlan tokennel
+jönnek (a helyes párosítás a pár id-k egyezése lenne).
+
+A szinkron (sync_answers) idempotens: a még megválaszolatlan kérdésekre a
+válaszokat futáson belül upsert-eljük és a quiz.grading deltás könyvelésével
+értékeljük; a már megválaszolt (klasszikus oldalon vagy korábbi kötegben beküldött)
+kérdéseket nem értékeljük újra, ezek az already_answered listába kerülnek. Így
+ugyanannak a kötegnek az ismétlése (pl. elveszett válasz utáni újraküldés) nem
+változtat a pontokon, és a sync-kel nem lehet utólag javítani egy beküldött
+választ. Párhuzamos kötegek a futás sorának zárolásával sorosodnak.
+"""
+import json
+import random
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from . import grading, play_api
+from .database import retry_on_lock
+from .models import AttemptedQuestion, QuizAttempt
+from .snapshot import get_quiz_snapshot
+
+CACHE_KEY = 'quiz_prefetch:{quiz_id}:{version}'
+CACHE_TIMEOUT = getattr(settings, 'QUIZ_PREFETCH_CACHE_TIMEOUT', 60 * 60 * 24)
+# a határidő után ennyi másodpercig még elfogadjuk a (hálózati hiba miatt késő) kötegeket
+SYNC_GRACE_SECONDS = getattr(settings, 'QUIZ_SYNC_GRACE_SECONDS', 30)
+# egy kötegben legfeljebb ennyi válasz jöhet
+MAX_BATCH_SIZE = getattr(settings, 'QUIZ_SYNC_MAX_BATCH_SIZE', 500)
+
+class SyncResult(namedtuple('SyncResult', 'accepted rejected already_answered finished expired')):
+    """
+    accepted / rejected / already_answered: kérdés id-k; already_answered: korábban már
+    beküldött válaszok, újraértékelés nélkül; expired: a határidő miatt nem fogadtuk el a köteget.
+    """
+    __slots__ = ()
+
+
+def pair_token(question, pair):
+    return grading.pair_token(question.id, pair.id)
+
+
+def etag(quiz, attempt):
+    """A letöltés minden változó részét lefedi: tartalomverzió, futás, kurzor, határidő, lezárás."""
+    deadline = int(attempt.deadline.timestamp()) if attempt.deadline else 0
+    return '"{}-{}-{}-{}-{}-{}"'.format(quiz.pk, quiz.content_version, attempt.pk, attempt.current_index,
+                                         deadline, int(attempt.is_finished))
+
+
+def _content_json(quiz):
+    """A kvíz tartalma szerializálva, verziónként cache-elve."""
+    snapshot = get_quiz_snapshot(quiz)
+    key = CACHE_KEY.format(quiz_id=quiz.pk, version=snapshot.version)
+    content = cache.get(key)
+    if content is None:
+        # verziónként rögzített keverés, hogy a cache-elt tartalom stabil legyen
+        rng = random.Random('{}:{}'.format(quiz.pk, snapshot.version))
+        content = json.dumps([
+            play_api.question_payload(snapshot.get_question(question_id), rng=rng)
+            for question_id in snapshot.question_ids
+        ], ensure_ascii=False, separators=(',', ':'))
+        cache.set(key, content, CACHE_TIMEOUT)
+    return content
+
+
+def _attempt_content_json(quiz, attempt):
+    """Húzásos kvíznél (quiz.pools) csak a futás kérdései mennek le, nem a teljes bank."""
+    snapshot = get_quiz_snapshot(quiz)
+    payloads = []
+    for question_id in attempt.get_question_ids():
+        question = snapshot.get_question(question_id)
+        if question is not None:
+            rng = random.Random('{}:{}:{}'.format(quiz.pk, snapshot.version, question_id))
+            payloads.append(play_api.question_payload(question, rng=rng))
+    return json.dumps(payloads, ensure_ascii=False, separators=(',', ':'))
+
+
+def build_payload(quiz, attempt):
+    """A letöltés JSON-szövege: {"attempt": {...}, "questions": [...]}."""
+    attempt_part = {
+        'id': attempt.pk,
+        'version': quiz.content_version,
+        # a futás kérdéssorrendje; a tartalmat a questions-ből id szerint kell kikeresni
+        'order': attempt.get_question_ids(),
+        'start_index': attempt.current_index,
+        'deadline': attempt.deadline.isoformat() if attempt.deadline else None,
+        'finished': attempt.is_finished,
+    }
+    content = _attempt_content_json(quiz, attempt) if quiz.pool_size else _content_json(quiz)
+    return '{{"attempt":{},"questions":{}}}'.format(json.dumps(attempt_part, separators=(',', ':')), content)
+
+
+def _submission(question, answer):
+    """Egy kliensoldali válasz (dict) -> grading.Submission; a párosítás tokenjeit visszafejtjük."""
+    tokens = dict((pair_token(question, pair), pair.id) for pair in question.pairs)
+    mapping = {}
+    for left_id, token in (answer.get('mapping') or {}).items():
+        if token in tokens:
+            mapping[int(left_id)] = tokens[token]
+    text = answer.get('text')
+    return grading.Submission(
+        choice_ids=answer.get('choices') or [],
+        text=text if isinstance(text, str) else None,
+        mapping=mapping,
+    )
+
+
+def _has_answer(submission):
+    """Van-e tárolt válasz (a szöveges válasz üresen is '' -ként tárolódik, a párosítás páronként)."""
+    return bool(submission.choice_ids or submission.mapping) or submission.text is not None
+
+
+def sync_answers(quiz, quiz_profile, attempt, answers, finish=False, now=None):
+    """
+    Egy válaszköteg beírása és értékelése.
+    answers: [{"question": id, "choices": [id, ...], "text": "...", "mapping": {bal pár id: token}}]
+    Visszatérési érték: SyncResult
+    """
+    now = now or timezone.now()
+    if len(answers) > MAX_BATCH_SIZE:
+        raise ValueError('Túl sok válasz egy kötegben ({} > {}).'.format(len(answers), MAX_BATCH_SIZE))
+
+    snapshot = get_quiz_snapshot(quiz)
+    positions = dict((question_id, index) for index, question_id in enumerate(attempt.get_question_ids()))
+    submissions = {}
+    rejected = []
+    for answer in answers:
+        question_id = answer.get('question') if isinstance(answer, dict) else None
+        question = None
+        if isinstance(question_id, int) and question_id in positions:
+            question = snapshot.get_question(question_id)
+        if question is None:
+            rejected.append(question_id)
+            continue
+        try:
+            # a kötegen belül az utolsó válasz számít
+            submissions[question_id] = _submission(question, answer)
+        except (AttributeError, TypeError, ValueError):
+            rejected.append(question_id)
+
+    def write():
+        with transaction.atomic():
+            locked = QuizAttempt.objects.select_for_update().get(pk=attempt.pk)
+            if locked.is_finished:
+                return SyncResult([], sorted(submissions) + rejected, [], True, False)
+            grace_deadline = locked.deadline and locked.deadline + timedelta(seconds=SYNC_GRACE_SECONDS)
+            if grace_deadline and now > grace_deadline:
+                locked.finish()
+                return SyncResult([], sorted(submissions) + rejected, [], True, True)
+
+            existing = {}
+            for aq in AttemptedQuestion.objects.filter(attempt=locked, question_id__in=list(submissions)):
+                existing.setdefault(aq.question_id, aq)
+            # a tárolt válasszal rendelkező kérdéseket nem írjuk felül és nem értékeljük újra
+            stored = grading.load_submissions(list(existing.values())) if existing else {}
+            already_answered = sorted(
+                question_id for question_id, aq in existing.items() if _has_answer(stored[aq.pk])
+            )
+            pending = dict((question_id, submission) for question_id, submission in submissions.items()
+                           if question_id not in already_answered)
+
+            if pending:
+                missing = [question_id for question_id in pending if question_id not in existing]
+                if missing:
+                    AttemptedQuestion.objects.bulk_create([
+                        AttemptedQuestion(question_id=question_id, quiz_profile=quiz_profile, attempt=locked)
+                        for question_id in missing
+                    ])
+                    # a bulk_create nem minden backenden adja vissza az id-kat
+                    for aq in AttemptedQuestion.objects.filter(attempt=locked, question_id__in=missing):
+                        existing.setdefault(aq.question_id, aq)
+
+                attempted_questions = [existing[question_id] for question_id in pending]
+                grading.grade_many(attempted_questions, dict(
+                    (existing[question_id].pk, submission) for question_id, submission in pending.items()
+                ))
+
+                # a klasszikus play oldal ne adja ki újra a már megválaszolt kérdéseket
+                next_index = max(positions[question_id] for question_id in pending) + 1
+                QuizAttempt.objects.filter(pk=locked.pk, current_index__lt=next_index).update(current_index=next_index)
+
+            if finish:
+                locked.finish()
+            return SyncResult(sorted(pending), rejected, already_answered, bool(finish), False)
+
+    return retry_on_lock(write)
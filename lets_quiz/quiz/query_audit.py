@@ -0,0 +1,172 @@
+"""
+A gyakori (forró) lekérdezések végrehajtási tervének ellenőrzése.
+
+A HOT_QUERIES regiszter a nézetek és a háttérfeladatok legtöbbet futó
+lekérdezéseit tartalmazza, ugyanúgy felépítve, ahogy a kód futtatja őket. Az
+audit_query_plans parancs mindegyikre EXPLAIN-t futtat az aktuális adatbázison,
+és jelzi a teljes táblaolvasást (index nélküli scan) és az ideiglenes rendezést.
+Új forró lekérdezésnél a regiszterbe is fel kell venni, a hozzá tartozó indexet
+pedig migrációval együtt szállítani.
+
+A paraméterek fix minta-id-k; a terv az indexektől függ, nem attól, hogy létezik-e
+a sor. PostgreSQL-en a szekvenciális olvasást kikapcsoljuk a vizsgálat idejére,
+így kis (teszt) táblákon is csak ott marad Seq Scan, ahol nincs használható index.
+"""
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from . import leaderboard, pickers
+from .access import accessible_quizzes
+from .models import (AttemptedQuestion, LeaderboardEntry, Quiz, QuizAccess, QuizAttempt, QuizProfile,
+                     QuizQuestion)
+
+# a jelzések fajtái
+FULL_SCAN = 'full scan'
+TEMP_SORT = 'temp sort'
+
+SAMPLE_ID = 1
+
+
+class HotQuery(namedtuple('HotQuery', 'name build allow')):
+    """
+    build: paraméter nélküli függvény, ami QuerySet-et vagy (sql, params) párt ad.
+    allow: a lekérdezésnél vállalt jelzések (pl. a ranglista ablakfüggvénye rendez).
+    """
+    __slots__ = ()
+
+
+class PlanReport(namedtuple('PlanReport', 'name plan findings')):
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return not self.findings
+
+
+def _sample_user():
+    return get_user_model()(pk=SAMPLE_ID, is_superuser=False)
+
+
+HOT_QUERIES = [
+    # play: a futás megkeresése / folytatása
+    HotQuery('attempt: latest of user on quiz',
+             lambda: QuizAttempt.objects.filter(quiz_id=SAMPLE_ID, user_id=SAMPLE_ID).order_by('-pk')[:1], ()),
+    # play POST: a beküldött kérdés sora a futásban
+    HotQuery('answer: by attempt and question',
+             lambda: AttemptedQuestion.objects.filter(attempt_id=SAMPLE_ID, question_id=SAMPLE_ID), ()),
+    HotQuery('answer: exists for profile and question',
+             lambda: AttemptedQuestion.objects.filter(quiz_profile_id=SAMPLE_ID, question_id=SAMPLE_ID)[:1], ()),
+    # eredményoldal, újraértékelés
+    # a profil összpontszámának újraszámolása (update_score, reconcile_scores)
+    HotQuery('answer: profile total of latest attempts',
+             lambda: AttemptedQuestion.objects.filter(quiz_profile_id=SAMPLE_ID)
+             .exclude(attempt__in=QuizAttempt.superseded().filter(user_id=SAMPLE_ID)).values('quiz_profile_id')
+             .annotate(Sum('marks_obtained')).order_by(), ()),
+    HotQuery('answer: all of attempt',
+             lambda: AttemptedQuestion.objects.filter(attempt_id=SAMPLE_ID).order_by('pk'), ()),
+    # kérdéssorrend, új kérdés sorszáma
+    HotQuery('quiz questions: in order',
+             lambda: QuizQuestion.objects.filter(quiz_id=SAMPLE_ID).order_by('order').values_list('question_id'),
+             ()),
+    HotQuery('quiz questions: max order',
+             lambda: QuizQuestion.objects.filter(quiz_id=SAMPLE_ID).values('quiz_id').annotate(Max('order'))
+             .values_list('order__max').order_by(), ()),
+    # főoldal / kvízlista: a user által elérhető kvízek
+    HotQuery('quiz: accessible to user', lambda: accessible_quizzes(_sample_user()), ()),
+    HotQuery('quiz: access check',
+             lambda: QuizAccess.objects.filter(user_id=SAMPLE_ID, quiz_id=SAMPLE_ID)[:1], ()),
+    HotQuery('quiz: teacher list by date', lambda: Quiz.objects.order_by('-created_at'), ()),
+    # ranglisták
+    HotQuery('profile: ordered by score',
+             lambda: QuizProfile.objects.order_by('-total_score').values_list('pk', 'user__username', 'total_score'),
+             ()),
+    HotQuery('leaderboard: page',
+             lambda: LeaderboardEntry.objects.order_by('-total_score', 'username')[:leaderboard.PAGE_SIZE], ()),
+    # a DENSE_RANK ablakfüggvény és a csoportosítás eredendően rendez
+    HotQuery('quiz ranking', lambda: leaderboard.ranking_sql(SAMPLE_ID), (TEMP_SORT,)),
+    HotQuery('quiz ranking: group', lambda: leaderboard.ranking_sql(SAMPLE_ID, SAMPLE_ID), (TEMP_SORT,)),
+    # hozzáférés-választók: előtag-keresés a LOWER() kifejezés-indexeken; a névmezők
+    # szerinti VAGY-keresés (multi-index OR) találatait rendezni kell
+    HotQuery('picker: users by prefix', lambda: pickers.users_queryset('a')[:pickers.PAGE_SIZE + 1], (TEMP_SORT,)),
+    HotQuery('picker: groups by prefix', lambda: pickers.groups_queryset('a')[:pickers.PAGE_SIZE + 1], ()),
+    # lejárt futások lezárása (expire_attempts); a kötegen belüli pk szerinti rendezés kis halmazon fut
+    HotQuery('attempt: expired sweep',
+             lambda: QuizAttempt.objects.filter(is_finished=False, paused_at__isnull=True, deadline__lte=timezone.now())
+             .filter(pk__gt=0).order_by('pk').values_list('pk', flat=True)[:500], (TEMP_SORT,)),
+]
+
+
+def _as_sql(query):
+    if isinstance(query, tuple):
+        return query
+    return query.query.sql_with_params()
+
+
+def explain(query):
+    """A lekérdezés végrehajtási terve szövegsorok listájaként."""
+    sql, params = _as_sql(query)
+    vendor = connection.vendor
+    with transaction.atomic(), connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+        if vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('EXPLAIN ' + sql, params)
+            return [row[0] for row in cursor.fetchall()]
+        if vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql, params)
+            columns = [col[0] for col in cursor.description]
+            return [' '.join('{}={}'.format(c, v) for c, v in zip(columns, row) if v is not None)
+                    for row in cursor.fetchall()]
+    raise NotImplementedError('Nem támogatott adatbázis: {}'.format(vendor))
+
+
+def _sqlite_scan_target(line):
+    # "SCAN TABLE x ..." (régebbi SQLite) vagy "SCAN x ..."
+    tokens = line.split()
+    if len(tokens) > 2 and tokens[1] == 'TABLE':
+        return tokens[2]
+    return tokens[1] if len(tokens) > 1 else ''
+
+
+def _findings(plan):
+    vendor = connection.vendor
+    findings = []
+    # SQLite-on az allekérdezések (co-routine) eredményének olvasása nem táblaolvasás
+    derived = set(line.split()[1] for line in plan if line.startswith(('CO-ROUTINE ', 'MATERIALIZE ')))
+    for line in plan:
+        if vendor == 'sqlite':
+            # index nélküli SCAN: teljes táblaolvasás; az ideiglenes b-fa rendezést / csoportosítást jelent
+            if line.startswith('SCAN') and 'INDEX' not in line:
+                target = _sqlite_scan_target(line)
+                if target not in derived and not target.startswith(('(subquery', 'SUBQUERY')):
+                    findings.append((FULL_SCAN, line))
+            if 'USE TEMP B-TREE' in line:
+                findings.append((TEMP_SORT, line))
+        elif vendor == 'postgresql':
+            node = line.strip().lstrip('-> ').strip()
+            if node.startswith('Seq Scan'):
+                findings.append((FULL_SCAN, node))
+            if node.startswith(('Sort ', 'Incremental Sort')):
+                findings.append((TEMP_SORT, node))
+        elif vendor == 'mysql':
+            if 'type=ALL' in line:
+                findings.append((FULL_SCAN, line))
+            if 'Using filesort' in line or 'Using temporary' in line:
+                findings.append((TEMP_SORT, line))
+    return findings
+
+
+def audit(queries=None):
+    """A regiszter (vagy a megadott HotQuery-k) tervei; a vállalt jelzéseket kiszűrjük."""
+    reports = []
+    for hot_query in HOT_QUERIES if queries is None else queries:
+        plan = explain(hot_query.build())
+        findings = [(kind, line) for kind, line in _findings(plan) if kind not in hot_query.allow]
+        reports.append(PlanReport(hot_query.name, plan, findings))
+    return reports
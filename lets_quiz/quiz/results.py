@@ -0,0 +1,169 @@
+"""
+A kvíz eredményoldalának (quiz_results) előre kiszámolt nézet-modellje.
+
+A kérdések tartalmát (szöveg, válaszlehetőségek, párok) a kvíz cache-elt
+pillanatképéből vesszük (quiz.snapshot), a user válaszait pedig fix 3
+lekérdezéssel töltjük be, így a sablon már csak kész adatokon iterál, és a
+lekérdezések száma nem függ a kérdések számától.
+
+Lezárt futás eredménye nem változik, ezért annak kirenderelt összesítőjét
+cache-eljük; az újraértékelés (quiz.grading) törli a bejegyzést.
+"""
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .grading import MATCHING, TEXT
+from .models import AttemptedMatch, AttemptedQuestion, to_marks
+from .snapshot import get_quiz_snapshot
+
+CACHE_KEY = 'quiz_results:{attempt_id}'
+CACHE_TIMEOUT = getattr(settings, 'QUIZ_RESULTS_CACHE_TIMEOUT', 60 * 60 * 24)
+
+SUMMARY_TEMPLATE = 'quiz/quiz_results_summary.html'
+
+# párosításnál a válasz állapota
+MATCH_CORRECT = 'correct'
+MATCH_WRONG = 'wrong'
+MATCH_MISSING = 'missing'
+
+
+class ResultChoice(namedtuple('ResultChoice', 'html is_correct selected')):
+    __slots__ = ()
+
+
+class ResultMatch(namedtuple('ResultMatch', 'left_text right_text chosen_right_text status')):
+    __slots__ = ()
+
+
+class ResultItem(namedtuple('ResultItem', 'number html kind is_correct marks_obtained text_answer '
+                                          'correct_text_answer choices pairs matches')):
+    __slots__ = ()
+
+    @property
+    def selected_choices(self):
+        return [choice for choice in self.choices if choice.selected]
+
+    @property
+    def is_matching(self):
+        return self.kind == MATCHING
+
+    @property
+    def is_text(self):
+        return self.kind == TEXT
+
+
+def build_results(quiz, attempt):
+    """Egy futás kérdésenkénti eredményei (ResultItem lista) és az összpontszám."""
+    if attempt is None:
+        return [], to_marks(0)
+    snapshot = get_quiz_snapshot(quiz)
+    attempts = list(AttemptedQuestion.objects.filter(attempt=attempt).order_by('pk').values_list('pk', 'question_id', 'is_correct', 'marks_obtained', 'text_answer'))
+    aq_ids = [row[0] for row in attempts]
+
+    selected = defaultdict(set)
+    through = AttemptedQuestion.selected_choices.through
+    for aq_id, choice_id in through.objects.filter(attemptedquestion_id__in=aq_ids).values_list(
+            'attemptedquestion_id', 'choice_id'):
+        selected[aq_id].add(choice_id)
+
+    chosen = defaultdict(dict)
+    for aq_id, left_id, right_id in AttemptedMatch.objects.filter(attempted_question_id__in=aq_ids).values_list(
+            'attempted_question_id', 'left_pair_id', 'chosen_right_pair_id'):
+        chosen[aq_id][left_id] = right_id
+
+    items = []
+    total_score = to_marks(0)
+    for pk, question_id, is_correct, marks_obtained, text_answer in attempts:
+        question = snapshot.get_question(question_id)
+        if question is None:
+            continue
+        items.append(_result_item(len(items) + 1, question, is_correct, marks_obtained, text_answer,
+                                  selected[pk], chosen[pk]))
+        total_score += to_marks(marks_obtained)
+    return items, total_score
+
+
+def build_feedback(number, question, submission, result):
+    """
+    Egy frissen értékelt válasz ResultItem-je (a play azonnali visszajelzéséhez) a
+    beküldött Submission-ből és a GradeResult-ból, lekérdezés nélkül.
+    """
+    choice_ids = set(c.id for c in question.choices)
+    pair_ids = set(pair.id for pair in question.pairs)
+    chosen = {}
+    if question.kind == MATCHING:
+        # ugyanúgy, ahogy a grading eltárolja: minden bal elemhez egy sor, érvénytelen választás nélkül
+        for pair in question.pairs:
+            right_id = submission.mapping.get(pair.id)
+            chosen[pair.id] = right_id if right_id in pair_ids else None
+    text_answer = (submission.text or '').strip() if question.kind == TEXT else None
+    return _result_item(number, question, result.is_correct, result.marks_obtained, text_answer,
+                        set(submission.choice_ids) & choice_ids, chosen)
+
+
+def _result_item(number, question, is_correct, marks_obtained, text_answer, selected, chosen):
+    """selected: kiválasztott Choice id-k, chosen: {bal pár id: választott jobb pár id}"""
+    right_texts = {pair.id: pair.right_text for pair in question.pairs}
+    matches = []
+    if question.kind == MATCHING:
+        for pair in question.pairs:
+            # csak azokat a párokat mutatjuk, amikre érkezett válasz-sor
+            if pair.id not in chosen:
+                continue
+            right_id = chosen[pair.id]
+            if right_id is None:
+                status = MATCH_MISSING
+            elif right_id == pair.id:
+                status = MATCH_CORRECT
+            else:
+                status = MATCH_WRONG
+            matches.append(ResultMatch(pair.left_text, pair.right_text, right_texts.get(right_id), status))
+
+    return ResultItem(
+        number=number,
+        html=question.html,
+        kind=question.kind,
+        is_correct=is_correct,
+        marks_obtained=marks_obtained,
+        text_answer=text_answer,
+        correct_text_answer=question.correct_text_answer,
+        choices=[ResultChoice(c.html, c.is_correct, c.id in selected) for c in question.choices],
+        pairs=question.pairs,
+        matches=matches,
+    )
+
+
+def render_summary(quiz, attempt):
+    """
+    Egy futás kérdésenkénti összesítőjének HTML-je és az összpontszám. Lezárt
+    futásnál a cache-ből szolgáljuk ki.
+    """
+    cacheable = attempt is not None and attempt.is_finished
+    key = CACHE_KEY.format(attempt_id=attempt.pk) if cacheable else None
+    if cacheable:
+        cached = cache.get(key)
+        # a tartalmi verzió változásakor (kérdés szerkesztése) újraépítjük
+        if cached is not None and cached[0] == quiz.content_version:
+            return mark_safe(cached[1]), cached[2]
+
+    items, total_score = build_results(quiz, attempt)
+    html = render_to_string(SUMMARY_TEMPLATE, {'quiz': quiz, 'items': items})
+    if cacheable:
+        cache.set(key, (quiz.content_version, html, total_score), CACHE_TIMEOUT)
+    return html, total_score
+
+
+def render_feedback(item):
+    """Egyetlen ResultItem HTML-je, ugyanazzal a sablonnal, mint az eredményoldal."""
+    return render_to_string(SUMMARY_TEMPLATE, {'items': [item]})
+
+
+def invalidate(attempt_ids):
+    """Az újraértékelt futások cache-elt összesítőjének törlése."""
+    attempt_ids = [pk for pk in set(attempt_ids) if pk]
+    if attempt_ids:
+        cache.delete_many([CACHE_KEY.format(attempt_id=pk) for pk in attempt_ids])
@@ -0,0 +1,218 @@
+"""
+Teljes szöveges keresés a kérdésbankban (kérdés szövege + válaszlehetőségek + párok).
+
+Kérdésenként egy dokumentumot tartunk egy külön indexben:
+- SQLite: FTS5 virtuális tábla (quiz_question_fts, rowid = kérdés id), bm25 rangsor
+- PostgreSQL: tsvector tábla GIN indexszel (quiz_question_search), ts_rank rangsor
+Ahol egyik sem érhető el (más adatbázis, FTS5 nélkül fordított SQLite), a keresés
+a kérdés szövegére futó LIKE-ra esik vissza, join és duplikált sorok nélkül.
+
+Az indexet a jelzések (quiz.signals) tartják szinkronban a kérdés / válasz /
+pár mentésekor és törlésekor; a tömeges beszúrás (quiz.importer) jelzés nélkül
+megy, ezért az index_questions-t közvetlenül hívja. A teljes újraépítés a
+rebuild_search_index parancs.
+"""
+import html
+import re
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.db.models import Case, IntegerField, When
+from django.utils.html import strip_tags
+
+FTS5 = 'fts5'
+TSVECTOR = 'tsvector'
+
+SQLITE_TABLE = 'quiz_question_fts'
+POSTGRES_TABLE = 'quiz_question_search'
+# PostgreSQL szövegkeresési konfiguráció (pl. 'hungarian' a szótőképzéshez)
+SEARCH_CONFIG = getattr(settings, 'QUIZ_SEARCH_CONFIG', 'simple')
+MAX_RESULTS = getattr(settings, 'QUIZ_SEARCH_MAX_RESULTS', 50)
+# az admin változáslistája lapoz, ott több találat is kellhet
+ADMIN_MAX_RESULTS = getattr(settings, 'QUIZ_SEARCH_ADMIN_MAX_RESULTS', 1000)
+BATCH_SIZE = 500
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# adatbázisonként (NAME) megjegyezzük, van-e index tábla
+_backends = {}
+
+# a deferred() blokkban az index_questions csak gyűjti az id-kat
+_deferred = threading.local()
+
+
+def _table_exists(cursor_connection, table):
+    with cursor_connection.cursor() as cursor:
+        return table in cursor_connection.introspection.table_names(cursor)
+
+
+def backend(using=connection):
+    """Az elérhető index fajtája (FTS5 / TSVECTOR) vagy None."""
+    key = (using.vendor, using.settings_dict['NAME'])
+    if key not in _backends:
+        kind = None
+        if using.vendor == 'sqlite' and _table_exists(using, SQLITE_TABLE):
+            kind = FTS5
+        elif using.vendor == 'postgresql' and _table_exists(using, POSTGRES_TABLE):
+            kind = TSVECTOR
+        _backends[key] = kind
+    return _backends[key]
+
+
+def create_index(schema_editor):
+    """Az index tábla létrehozása (a migráció hívja). Visszatérési érték: a fajtája vagy None."""
+    using = schema_editor.connection
+    _backends.pop((using.vendor, using.settings_dict['NAME']), None)
+    if using.vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                'CREATE VIRTUAL TABLE {} USING fts5(body, tokenize = "unicode61")'.format(SQLITE_TABLE)
+            )
+        except OperationalError:
+            # FTS5 nélkül fordított SQLite: marad a LIKE-os keresés
+            return None
+        return FTS5
+    if using.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE TABLE {table} (question_id integer PRIMARY KEY REFERENCES quiz_question (id) '
+            'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, document tsvector NOT NULL)'.format(table=POSTGRES_TABLE)
+        )
+        schema_editor.execute('CREATE INDEX {table}_document_idx ON {table} USING GIN (document)'.format(
+            table=POSTGRES_TABLE
+        ))
+        return TSVECTOR
+    return None
+
+
+def drop_index(schema_editor):
+    using = schema_editor.connection
+    _backends.pop((using.vendor, using.settings_dict['NAME']), None)
+    if using.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS {}'.format(SQLITE_TABLE))
+    elif using.vendor == 'postgresql':
+        schema_editor.execute('DROP TABLE IF EXISTS {}'.format(POSTGRES_TABLE))
+
+
+def plain_text(text):
+    """A kérdés / válasz HTML-je sima szövegként (indexeléshez, találatok feliratához)."""
+    return html.unescape(strip_tags(text or ''))
+
+
+def _documents(question_ids, models):
+    """{question_id: kereshető szöveg} a megadott (létező) kérdésekre, három lekérdezéssel."""
+    Question, Choice, MatchingPair = models
+    parts = defaultdict(list)
+    for pk, text in Question.objects.filter(pk__in=question_ids).values_list('pk', 'html'):
+        parts[pk].append(plain_text(text))
+    for question_id, text in Choice.objects.filter(question_id__in=question_ids).values_list('question_id', 'html'):
+        if question_id in parts:
+            parts[question_id].append(plain_text(text))
+    for question_id, left, right in MatchingPair.objects.filter(question_id__in=question_ids).values_list(
+            'question_id', 'left_text', 'right_text'):
+        if question_id in parts:
+            parts[question_id].extend((left, right))
+    return dict((pk, '\n'.join(texts)) for pk, texts in parts.items())
+
+
+def _live_models():
+    from .models import Choice, MatchingPair, Question
+    return Question, Choice, MatchingPair
+
+
+@contextmanager
+def deferred():
+    """
+    A blokkon belüli index_questions hívások (pl. a soronkénti save() jelzései)
+    id-it összegyűjti, és a blokk végén egyetlen kötegelt indexeléssel írja ki.
+    """
+    if getattr(_deferred, 'ids', None) is not None:
+        # beágyazott blokk: a külső írja ki
+        yield
+        return
+    _deferred.ids = set()
+    try:
+        yield
+        question_ids = _deferred.ids
+    finally:
+        _deferred.ids = None
+    index_questions(question_ids)
+
+
+def index_questions(question_ids, models=None, using=connection):
+    """
+    A megadott kérdések dokumentumainak (újra)írása; a már nem létező kérdések
+    kikerülnek az indexből. Kötegenként egy DELETE és egy többsoros INSERT.
+    """
+    pending = getattr(_deferred, 'ids', None)
+    if pending is not None and models is None and using is connection:
+        pending.update(question_ids)
+        return
+    kind = backend(using)
+    if kind is None:
+        return
+    models = models or _live_models()
+    question_ids = sorted(set(question_ids))
+    for start in range(0, len(question_ids), BATCH_SIZE):
+        chunk = question_ids[start:start + BATCH_SIZE]
+        documents = _documents(chunk, models)
+        placeholders = ', '.join(['%s'] * len(chunk))
+        with using.cursor() as cursor:
+            if kind == FTS5:
+                cursor.execute('DELETE FROM {} WHERE rowid IN ({})'.format(SQLITE_TABLE, placeholders), chunk)
+                cursor.executemany('INSERT INTO {} (rowid, body) VALUES (%s, %s)'.format(SQLITE_TABLE),
+                                   list(documents.items()))
+            else:
+                cursor.execute('DELETE FROM {} WHERE question_id IN ({})'.format(POSTGRES_TABLE, placeholders), chunk)
+                cursor.executemany(
+                    'INSERT INTO {} (question_id, document) VALUES (%s, to_tsvector(%s, %s))'.format(POSTGRES_TABLE),
+                    [(pk, SEARCH_CONFIG, text) for pk, text in documents.items()],
+                )
+
+
+def rebuild(models=None, using=connection):
+    """A teljes index újraépítése. Visszatérési érték: az indexelt kérdések száma."""
+    kind = backend(using)
+    if kind is None:
+        return 0
+    models = models or _live_models()
+    with using.cursor() as cursor:
+        cursor.execute('DELETE FROM {}'.format(SQLITE_TABLE if kind == FTS5 else POSTGRES_TABLE))
+    question_ids = list(models[0].objects.order_by('pk').values_list('pk', flat=True))
+    index_questions(question_ids, models=models, using=using)
+    return len(question_ids)
+
+
+def search_ids(query, limit=MAX_RESULTS):
+    """A keresésre illeszkedő kérdések id-i relevancia szerint (a szavak előtagként, ÉS-sel)."""
+    tokens = TOKEN_RE.findall(query or '')
+    if not tokens:
+        return []
+    kind = backend()
+    if kind == FTS5:
+        match = ' '.join('"{}"*'.format(token) for token in tokens)
+        sql = 'SELECT rowid FROM {table} WHERE {table} MATCH %s ORDER BY rank LIMIT %s'.format(table=SQLITE_TABLE)
+        params = [match, limit]
+    elif kind == TSVECTOR:
+        tsquery = ' & '.join('{}:*'.format(token) for token in tokens)
+        sql = ('SELECT question_id FROM {} WHERE document @@ to_tsquery(%s, %s) '
+               'ORDER BY ts_rank(document, to_tsquery(%s, %s)) DESC LIMIT %s').format(POSTGRES_TABLE)
+        params = [SEARCH_CONFIG, tsquery, SEARCH_CONFIG, tsquery, limit]
+    else:
+        Question = _live_models()[0]
+        return list(Question.objects.filter(html__icontains=query.strip()).order_by('-pk')
+                    .values_list('pk', flat=True)[:limit])
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def ranked(queryset, question_ids):
+    """A queryset szűrése a találatokra, a keresés sorrendjében."""
+    if not question_ids:
+        return queryset.none()
+    order = Case(*[When(pk=pk, then=position) for position, pk in enumerate(question_ids)],
+                 output_field=IntegerField())
+    return queryset.filter(pk__in=question_ids).annotate(search_rank=order).order_by('search_rank')
@@ -0,0 +1,125 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import page_cache, search
+from .access import rebuild_quiz_access, rebuild_user_access
+from .leaderboard import move_entry
+from .models import Choice, LeaderboardEntry, MatchingPair, Question, Quiz, QuizProfile
+
+
+@receiver(post_save, sender=QuizProfile)
+def add_profile_to_leaderboard(sender, instance, created, raw=False, **kwargs):
+    # az új profil 0 ponttal rögtön megjelenik a ranglistán
+    if created and not raw:
+        move_entry(instance.pk, instance.user.username, instance.total_score)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def rename_leaderboard_entry(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # bejelentkezéskor csak a last_login változik, olyankor nincs teendő
+    if created or raw or (update_fields is not None and 'username' not in update_fields):
+        return
+    # teljes mentésnél (pl. superuser-jog változása) a kvízlistája is elavulhat
+    page_cache.bump_user(instance.pk)
+    if LeaderboardEntry.objects.filter(quiz_profile__user=instance).exclude(
+            username=instance.username).update(username=instance.username):
+        page_cache.bump(page_cache.LEADERBOARD)
+
+
+# --- Oldal-cache (quiz.page_cache) érvénytelenítése ---
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def quiz_changed(sender, instance, raw=False, **kwargs):
+    # cím, leírás, publikálás: a kvízlisták elavulnak
+    if not raw:
+        page_cache.bump(page_cache.QUIZZES)
+
+
+# --- Kvíz-hozzáférési index (quiz.access) karbantartása ---
+
+def _reverse_access_changed(instance, action, pk_set, rebuild, related_ids):
+    """
+    Fordított irányú m2m_changed kezelése: a pk_set-ben kapott
+    kapcsolódó objektumokat számoljuk újra. clear-nél nincs pk_set, ezért az
+    érintetteket a törlés előtt elmentjük.
+    """
+    if action == 'pre_clear':
+        instance._access_pending = list(related_ids(instance))
+    elif action in ('post_add', 'post_remove'):
+        for pk in pk_set or ():
+            rebuild(pk)
+    elif action == 'post_clear':
+        for pk in getattr(instance, '_access_pending', ()):
+            rebuild(pk)
+
+
+@receiver(m2m_changed, sender=Quiz.allowed_users.through)
+def allowed_users_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            rebuild_quiz_access(instance.pk)
+    else:
+        # user.quizzes_allowed.add(...) – az érintett kvízeket számoljuk újra,
+        # mert a korlátozottságuk is megváltozhat
+        _reverse_access_changed(
+            instance, action, pk_set, rebuild_quiz_access,
+            related_ids=lambda user: user.quizzes_allowed.values_list('pk', flat=True),
+        )
+
+
+@receiver(m2m_changed, sender=Quiz.allowed_groups.through)
+def allowed_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            rebuild_quiz_access(instance.pk)
+        return
+    # group.quizzes_allowed.add(...) – az érintett kvízeket számoljuk újra
+    _reverse_access_changed(
+        instance, action, pk_set, rebuild_quiz_access,
+        related_ids=lambda group: group.quizzes_allowed.values_list('pk', flat=True),
+    )
+
+
+@receiver(m2m_changed, sender=get_user_model().groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            rebuild_user_access(instance.pk)
+        return
+    # group.user_set.add(...) – az érintett userek sorait számoljuk újra
+    _reverse_access_changed(
+        instance, action, pk_set, rebuild_user_access,
+        related_ids=lambda group: group.user_set.values_list('pk', flat=True),
+    )
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    # a csoport törlése nem küld m2m_changed jelzést, a kvízeit a törlés után számoljuk újra
+    quiz_ids = list(instance.quizzes_allowed.values_list('pk', flat=True))
+    if quiz_ids:
+        transaction.on_commit(lambda: [rebuild_quiz_access(pk) for pk in quiz_ids])
+
+
+# --- Teljes szöveges keresés (quiz.search) ---
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_text_changed(sender, instance, raw=False, **kwargs):
+    # törlés után az index_questions a már nem létező kérdés dokumentumát kiveszi
+    if not raw:
+        search.index_questions([instance.pk])
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+@receiver(post_save, sender=MatchingPair)
+@receiver(post_delete, sender=MatchingPair)
+def answer_text_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_questions([instance.question_id])
@@ -0,0 +1,170 @@
+"""
+Publikált kvízek tartalmának (kérdések, válaszlehetőségek, párok) megváltoztathatatlan
+pillanatképe a play oldal rendereléséhez.
+
+A pillanatkép kulcsa (quiz_id, content_version). A verziót minden tartalmi módosítás
+(kérdés hozzáadása, szerkesztése, törlése) megnöveli, így a régi bejegyzés egyszerűen
+elavul, törölni nem kell. Két szinten tároljuk: folyamaton belüli LRU-ban és a Django
+cache-ben, így egy kérdés kiszolgálása nem igényel tartalmi lekérdezést.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .grading import MATCHING, MULTIPLE, SINGLE, TEXT, pair_token
+from .models import Choice, MatchingPair, Question, Quiz
+
+CACHE_KEY = 'quiz_snapshot:{quiz_id}:{version}'
+CACHE_TIMEOUT = getattr(settings, 'QUIZ_SNAPSHOT_CACHE_TIMEOUT', 60 * 60 * 24)
+LRU_SIZE = getattr(settings, 'QUIZ_SNAPSHOT_LRU_SIZE', 64)
+
+
+class ChoiceSnapshot(namedtuple('ChoiceSnapshot', 'id html is_correct')):
+    __slots__ = ()
+
+    @property
+    def pk(self):
+        return self.id
+
+
+class PairSnapshot(namedtuple('PairSnapshot', 'id left_text right_text')):
+    __slots__ = ()
+
+    @property
+    def pk(self):
+        return self.id
+
+
+class QuestionSnapshot(namedtuple('QuestionSnapshot',
+                                  'id html kind maximum_marks correct_text_answer choices pairs')):
+    __slots__ = ()
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def is_multiple_choice(self):
+        return self.kind == MULTIPLE
+
+    @property
+    def right_items(self):
+        """A párosítás jobb oldali elemei (token, szöveg) párokként, a tokenek szerint rendezve."""
+        return sorted((pair_token(self.id, pair.id), pair.right_text) for pair in self.pairs)
+
+
+class QuizSnapshot(namedtuple('QuizSnapshot', 'quiz_id version question_ids questions')):
+    """question_ids: a kvíz kérdéseinek sorrendje, questions: {question_id: QuestionSnapshot}"""
+    __slots__ = ()
+
+    def get_question(self, question_id):
+        return self.questions.get(question_id)
+
+
+class _LRU(object):
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_snapshots = _LRU(LRU_SIZE)
+
+
+def bump_content_version(quiz):
+    """A kvíz tartalmi verziójának növelése: a meglévő pillanatképek elavulnak."""
+    quiz_id = getattr(quiz, 'pk', quiz)
+    Quiz.objects.filter(pk=quiz_id).update(content_version=F('content_version') + 1)
+    if isinstance(quiz, Quiz):
+        quiz.refresh_from_db(fields=['content_version'])
+
+
+def bump_content_version_for_question(question):
+    """Minden olyan kvíz verzióját növeli, amiben a kérdés szerepel."""
+    question_id = getattr(question, 'pk', question)
+    Quiz.objects.filter(quiz_questions__question_id=question_id).update(
+        content_version=F('content_version') + 1
+    )
+
+
+def get_quiz_snapshot(quiz):
+    """A kvíz aktuális verziójához tartozó pillanatkép (szükség esetén felépíti)."""
+    key = CACHE_KEY.format(quiz_id=quiz.pk, version=quiz.content_version)
+
+    snapshot = _local_snapshots.get(key)
+    if snapshot is not None:
+        return snapshot
+
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_quiz_snapshot(quiz)
+        cache.set(key, snapshot, CACHE_TIMEOUT)
+
+    _local_snapshots.set(key, snapshot)
+    return snapshot
+
+
+def build_quiz_snapshot(quiz):
+    """Pillanatkép építése az adatbázisból, kvízmérettől függetlenül fix 4 lekérdezéssel."""
+    question_ids = tuple(quiz.quiz_questions.values_list('question_id', flat=True))
+
+    choices = {}
+    for choice in Choice.objects.filter(question_id__in=question_ids).order_by('pk').values_list(
+            'question_id', 'pk', 'html', 'is_correct'):
+        choices.setdefault(choice[0], []).append(ChoiceSnapshot(*choice[1:]))
+
+    pairs = {}
+    for pair in MatchingPair.objects.filter(question_id__in=question_ids).order_by('pk').values_list(
+            'question_id', 'pk', 'left_text', 'right_text'):
+        pairs.setdefault(pair[0], []).append(PairSnapshot(*pair[1:]))
+
+    questions = {}
+    for pk, html, maximum_marks, is_multiple_choice, correct_text_answer in Question.objects.filter(
+            pk__in=question_ids).values_list('pk', 'html', 'maximum_marks', 'is_multiple_choice',
+                                             'correct_text_answer'):
+        # ugyanaz a típusfelismerés, mint az edit_question-ben és a grading-ben
+        if pk in pairs:
+            kind = MATCHING
+        elif correct_text_answer:
+            kind = TEXT
+        elif is_multiple_choice:
+            kind = MULTIPLE
+        else:
+            kind = SINGLE
+        questions[pk] = QuestionSnapshot(
+            id=pk,
+            html=html,
+            kind=kind,
+            maximum_marks=maximum_marks,
+            correct_text_answer=correct_text_answer,
+            choices=tuple(choices.get(pk, ())),
+            pairs=tuple(pairs.get(pk, ())),
+        )
+
+    return QuizSnapshot(
+        quiz_id=quiz.pk,
+        version=quiz.content_version,
+        question_ids=question_ids,
+        questions=questions,
+    )
@@ -1,3 +1,748 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.http import QueryDict
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from . import (benchmark, database, exporter, grading, importer, leaderboard, memberships, page_cache, pickers,
+               play_api, pools, query_audit, results, search, snapshot, views)
+from .models import (AttemptedQuestion, Choice, LeaderboardEntry, MatchingPair, Question, Quiz, QuizAccess, QuizAttempt,
+                     QuizProfile, QuizQuestion)
+
+
+class FreshCacheTestCase(TestCase):
+    """
+    A tesztek közt visszagörgetett adatbázisban ugyanazok a kvíz id-k és tartalomverziók
+    jönnek újra, ezért a pillanatkép- és oldal-cache-t minden teszt előtt ürítjük.
+    """
+
+    def setUp(self):
+        cache.clear()
+        snapshot._local_snapshots.clear()
+
+
+def _single_choice_question(quiz, marks=4):
+    """Egyválasztós kérdés a kvíz végén; visszatérés: (kérdés, helyes válasz, rossz válasz)."""
+    question = Question.objects.create(html='Kérdés', maximum_marks=marks)
+    right = Choice.objects.create(question=question, html='Jó', is_correct=True)
+    wrong = Choice.objects.create(question=question, html='Rossz')
+    QuizQuestion.objects.create(quiz=quiz, question=question, order=quiz.quiz_questions.count() + 1)
+    snapshot.bump_content_version(quiz)
+    return question, right, wrong
+
+
+def _answer(profile, attempt, question, choice):
+    """Egy kérdés megválaszolása a play nézet módján (grading.grade_many)."""
+    aq = profile.create_attempt(question, attempt)
+    grading.grade_many([aq], {aq.pk: grading.Submission(choice_ids=[choice.pk])})
+    return aq
+
+
+class GradingLedgerTests(FreshCacheTestCase):
+    """Pontdelta-könyvelés: az összpontszámok a válaszok pontjainak összegét követik."""
+
+    def setUp(self):
+        super(GradingLedgerTests, self).setUp()
+        self.quiz = Quiz.objects.create(title='Könyvelés')
+        self.question, self.right, self.wrong = _single_choice_question(self.quiz)
+        self.profile = QuizProfile.objects.create(user=User.objects.create_user('diak'))
+        self.attempt = QuizAttempt.start_new(self.quiz, self.profile)
+
+    def assertTotals(self, expected):
+        self.profile.refresh_from_db()
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.profile.total_score, expected)
+        self.assertEqual(self.attempt.total_score, expected)
+
+    def test_stale_copies_of_same_answer_count_once(self):
+        aq = self.profile.create_attempt(self.question, self.attempt)
+        # két párhuzamos beküldés: mindkettő a még pontozatlan sort látta
+        first, second = AttemptedQuestion.objects.get(pk=aq.pk), AttemptedQuestion.objects.get(pk=aq.pk)
+        for copy in (first, second):
+            grading.grade_many([copy], {aq.pk: grading.Submission(choice_ids=[self.right.pk])})
+        self.assertTotals(4)
+
+        stale = AttemptedQuestion.objects.get(pk=aq.pk)
+        grading.grade_many([stale], {aq.pk: grading.Submission(choice_ids=[self.wrong.pk])})
+        grading.grade_many([first], {aq.pk: grading.Submission(choice_ids=[self.wrong.pk])})
+        self.assertTotals(0)
+
+    def test_regrade_books_only_changes(self):
+        other, right, wrong = _single_choice_question(self.quiz, marks=2)
+        _answer(self.profile, self.attempt, self.question, self.right)
+        _answer(self.profile, self.attempt, other, wrong)
+        self.assertTotals(4)
+
+        batch = list(AttemptedQuestion.objects.order_by('pk'))
+        results = grading.grade_many(batch)
+        self.assertEqual([results[aq.pk].marks_obtained for aq in batch], [4, 0])
+        self.assertTotals(4)
+
+        # a megoldókulcs változik: a második válasz utólag jó lesz; az elavult batch sem számol kétszer
+        Choice.objects.filter(pk=wrong.pk).update(is_correct=True)
+        grading.grade_many(batch)
+        grading.grade_many(batch)
+        self.assertTotals(6)
+
+
+class ClassroomBenchmarkTests(TestCase):
+    """
+    A benchmark kis méretben, egy szálon: a teljes kitöltési kör hibátlanul lefut,
+    és egyik nézet sem lépi túl a kérésenkénti lekérdezés-keretét.
+    """
+
+    # kérésenkénti lekérdezés-keretek 2 kvízre, típusonként 2 kérdéssel
+    # (a TestCase tranzakciója miatt a savepointok is beleszámítanak)
+    QUERY_BUDGETS = {
+        'play GET': 30,
+        'play POST': 35,
+        'submission_result': 30,
+        'quiz_end': 30,
+        'quiz_results': 20,
+        'answer API': 45,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz_ids, cls.usernames = benchmark.seed_classroom(
+            students=3, groups=2, quizzes=2, questions_per_type=2
+        )
+
+    def test_play_loop_completes(self):
+        report = benchmark.run_classroom(self.quiz_ids, self.usernames, concurrency=1)
+
+        self.assertEqual(report.total_errors, 0)
+        questions = 2 * 4
+        runs = len(self.usernames) * len(self.quiz_ids)
+        self.assertEqual(len(report.views['play POST'].latencies_ms), runs * questions)
+        self.assertEqual(len(report.views['submission_result'].latencies_ms), runs * questions)
+        self.assertEqual(len(report.views['quiz_results'].latencies_ms), runs)
+
+    def test_answer_api_loop_completes(self):
+        report = benchmark.run_classroom(self.quiz_ids, self.usernames, concurrency=1, mode=benchmark.API)
+
+        self.assertEqual(report.total_errors, 0)
+        runs = len(self.usernames) * len(self.quiz_ids)
+        # kérdésenként egyetlen kérés, play GET csak kvízenként egyszer
+        self.assertEqual(len(report.views['answer API'].latencies_ms), runs * 2 * 4)
+        self.assertEqual(len(report.views['play GET'].latencies_ms), runs)
+        self.assertNotIn('submission_result', report.views)
+        self.assertEqual(benchmark.query_budget_violations(report, self.QUERY_BUDGETS), [])
+
+    def test_query_budgets(self):
+        report = benchmark.run_classroom(self.quiz_ids, self.usernames, concurrency=1)
+        self.assertEqual(benchmark.query_budget_violations(report, self.QUERY_BUDGETS), [])
+
+
+class PrefetchSyncTests(TestCase):
+    """Az egyben letöltött kvíz kötegelt szinkronja: a kör lefut, az újraküldés nem számol duplán."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz_ids, cls.usernames = benchmark.seed_classroom(
+            students=2, groups=1, quizzes=1, questions_per_type=2, immediate_feedback=False
+        )
+
+    def test_prefetch_loop_completes(self):
+        report = benchmark.run_classroom(self.quiz_ids, self.usernames, concurrency=1, mode=benchmark.PREFETCH)
+
+        self.assertEqual(report.total_errors, 0)
+        self.assertEqual(len(report.views['sync'].latencies_ms), len(self.usernames))
+        self.assertNotIn('play GET', report.views)
+
+    def test_resync_is_idempotent(self):
+        user = User.objects.get(username=self.usernames[0])
+        client = Client()
+        client.force_login(user)
+        url = '/{}/prefetch/'.format(self.quiz_ids[0])
+        response = client.get(url)
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        # a play oldal az előre letöltős klienst kapja; a kiszolgált kérdés elmozdítja a
+        # kurzort, így a régi ETag-re már nem jár 304
+        play = client.get('/{}/play/'.format(self.quiz_ids[0]))
+        self.assertContains(play, 'data-sync-url="/{}/sync/"'.format(self.quiz_ids[0]))
+        self.assertContains(play, 'js/quiz_prefetch.js')
+        response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        payload = json.loads(response.content.decode('utf-8'))
+
+        question = payload['questions'][0]
+        body = json.dumps({'attempt': payload['attempt']['id'], 'answers': [
+            {'question': question['id'], 'choices': [choice['id'] for choice in question['choices']][:1]},
+        ]})
+        sync_url = '/{}/sync/'.format(self.quiz_ids[0])
+        client.post(sync_url, body, content_type='application/json')
+        score = QuizProfile.objects.get(user=user).total_score
+        result = json.loads(client.post(sync_url, body, content_type='application/json').content.decode('utf-8'))
+
+        # az újraküldött (már megválaszolt) kérdést nem értékeljük újra
+        self.assertEqual((result['accepted'], result['already_answered']), ([], [question['id']]))
+        self.assertEqual(QuizProfile.objects.get(user=user).total_score, score)
+
+    def test_sync_refuses_immediate_feedback_and_answered_questions(self):
+        user = User.objects.get(username=self.usernames[1])
+        client = Client()
+        client.force_login(user)
+        quiz = Quiz.objects.get(pk=self.quiz_ids[0])
+        payload = json.loads(client.get('/{}/prefetch/'.format(quiz.pk)).content.decode('utf-8'))
+        question = payload['questions'][0]
+        correct = Choice.objects.get(question_id=question['id'], is_correct=True).pk
+        wrong = Choice.objects.filter(question_id=question['id'], is_correct=False).first().pk
+
+        # a klasszikus oldalon már beküldött (rossz) válasz nem javítható a sync-kel
+        attempt = QuizAttempt.objects.get(pk=payload['attempt']['id'])
+        aq = attempt.attempted_questions.create(question_id=question['id'], quiz_profile=user.quizprofile)
+        grading.grade_many([aq], {aq.pk: grading.Submission(choice_ids=[wrong])})
+        sync_url = '/{}/sync/'.format(quiz.pk)
+        body = json.dumps({'attempt': attempt.pk, 'answers': [{'question': question['id'], 'choices': [correct]}]})
+        result = json.loads(client.post(sync_url, body, content_type='application/json').content.decode('utf-8'))
+        self.assertEqual(result['already_answered'], [question['id']])
+        aq.refresh_from_db()
+        self.assertEqual((aq.is_correct, aq.marks_obtained), (False, 0))
+        self.assertEqual(list(aq.selected_choices.values_list('pk', flat=True)), [wrong])
+
+        Quiz.objects.filter(pk=quiz.pk).update(immediate_feedback=True)
+        self.assertEqual(client.post(sync_url, body, content_type='application/json').status_code, 409)
+
+
+class AnonymousPageCacheTests(TestCase):
+    """A nem belépett látogató oldalai cache-ből jönnek, amíg a generációjuk nem nő."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_leaderboard_served_from_cache_until_bumped(self):
+        self.client.get('/leaderboard/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/leaderboard/').status_code, 200)
+
+        page_cache._bump_now(page_cache.LEADERBOARD)
+        with self.assertNumQueries(1):
+            self.client.get('/leaderboard/')
+
+    def test_per_process_cache_warns_outside_debug(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp'}}
+        with override_settings(DEBUG=False, CACHES=locmem):
+            self.assertEqual([w.id for w in page_cache.check_shared_cache(None)], ['quiz.W001'])
+        with override_settings(DEBUG=False, CACHES=shared):
+            self.assertEqual(page_cache.check_shared_cache(None), [])
+
+    def test_user_home_quiz_list_fragment_cached_per_user(self):
+        Quiz.objects.create(title='Nyitott kvíz')
+        self.client.force_login(User.objects.create_user('diak'))
+
+        def quiz_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/user-home', HTTP_HOST='127.0.0.1')
+            self.assertContains(response, 'Nyitott kvíz')
+            return [q['sql'] for q in queries if '"quiz_quiz"' in q['sql']]
+
+        self.assertTrue(quiz_queries())
+        self.assertEqual(quiz_queries(), [])
+        page_cache._bump_now(page_cache.QUIZZES)
+        self.assertTrue(quiz_queries())
+
+
+class MembershipDiffTests(TestCase):
+    """A tömeges csoporttagság-mentés csak a különbséget írja, és a hozzáférési indexet is frissíti."""
+
+    def test_only_changed_users_are_written(self):
+        groups = [Group.objects.create(name='g{}'.format(i)) for i in range(2)]
+        users = [User.objects.create_user('u{}'.format(i)) for i in range(3)]
+        quiz = Quiz.objects.create(title='Csoportos kvíz')
+        quiz.allowed_groups.add(groups[1])
+        users[0].groups.add(groups[0])
+        users[1].groups.add(groups[0])
+
+        change = memberships.set_memberships({
+            users[0].pk: {groups[0].pk},
+            users[1].pk: {groups[1].pk},
+            users[2].pk: set(),
+        })
+
+        self.assertEqual(change.users, [users[1].pk])
+        self.assertEqual((change.added, change.removed), (1, 1))
+        self.assertEqual(list(users[1].groups.all()), [groups[1]])
+        self.assertEqual(list(QuizAccess.objects.values_list('user_id', flat=True)), [users[1].pk])
+
+        # változatlan állapot mentése: csak a tagságok olvasása (+ a savepoint ki/be)
+        unchanged = dict((user.pk, set(user.groups.values_list('pk', flat=True))) for user in users)
+        with self.assertNumQueries(3):
+            self.assertEqual(memberships.set_memberships(unchanged).users, [])
+
+
+class PickerSearchTests(TestCase):
+    """A hozzáférés-választók keresője: kis-nagybetű független előtag, hiánytalan keyset lapozás."""
+
+    def test_keyset_pages_cover_all_matches(self):
+        for i in range(7):
+            User.objects.create_user('Diak{}'.format(i))
+        User.objects.create_user('masik', first_name='Diana')
+        teacher = User.objects.create_user('tanar')
+        teacher.groups.add(Group.objects.create(name='Tanár'))
+
+        seen, cursor = [], None
+        while True:
+            page = pickers.search(pickers.USERS, 'di', cursor=cursor, students_only=True, limit=3)
+            seen.extend(label for pk, label in page.results)
+            cursor = page.next
+            if cursor is None:
+                break
+        self.assertEqual(seen, ['Diak{}'.format(i) for i in range(7)] + ['masik (Diana)'])
+
+        self.client.force_login(User.objects.get(username='Diak0'))
+        self.assertEqual(self.client.get('/access/search/', {'q': 'di'}).status_code, 403)
+        self.client.force_login(teacher)
+        data = json.loads(self.client.get('/access/search/', {'kind': 'group', 'q': 'TA'}).content.decode('utf-8'))
+        self.assertEqual([item['text'] for item in data['results']], ['Tanár'])
+
+
+class QuestionPoolTests(TestCase):
+    """K kérdés N-ből: a futás a seed-jéből számolt K kérdést kapja, és végig is játszható."""
+
+    def test_attempts_draw_pool_from_seed(self):
+        quiz_ids, usernames = benchmark.seed_classroom(students=2, groups=1, quizzes=1, questions_per_type=2)
+        quiz = Quiz.objects.get(pk=quiz_ids[0])
+        quiz.pool_size = 3
+        quiz.save()
+
+        report = benchmark.run_classroom(quiz_ids, usernames, concurrency=1, mode=benchmark.API)
+        self.assertEqual(report.total_errors, 0)
+        self.assertEqual(len(report.views['answer API'].latencies_ms), len(usernames) * 3)
+
+        bank = list(quiz.quiz_questions.values_list('question_id', flat=True))
+        for attempt in QuizAttempt.objects.filter(quiz=quiz):
+            self.assertEqual(attempt.get_question_ids(), pools.draw(bank, attempt.seed, pool_size=3))
+            self.assertEqual(attempt.attempted_questions.count(), 3)
+
+
+class QuestionSearchTests(TestCase):
+    """Teljes szöveges kérdéskeresés: a válaszok szövegére is talál, és követi a módosításokat."""
+
+    def test_index_follows_questions_and_choices(self):
+        capital = Question.objects.create(html='<p>Mi Magyarország fővárosa?</p>')
+        Choice.objects.create(question=capital, html='Budapest', is_correct=True)
+        river = Question.objects.create(html='<p>Melyik folyó folyik át Budapesten?</p>')
+        Choice.objects.create(question=river, html='Duna', is_correct=True)
+
+        self.assertEqual(search.search_ids('fővár'), [capital.pk])
+        self.assertEqual(set(search.search_ids('budapest')), {capital.pk, river.pk})
+        self.assertEqual(search.search_ids('duna folyó'), [river.pk])
+
+        capital.choices.update(html='Debrecen')  # jelzés nélkül: csak újraindexelés után látszik
+        search.index_questions([capital.pk])
+        self.assertEqual(search.search_ids('budapest'), [river.pk])
+        river.delete()
+        self.assertEqual(search.search_ids('duna'), [])
+
+
+class QuestionImportTests(TestCase):
+    """Kérdésimport: a hibás sorok kimaradnak, a törölt kérdések id-je nem kerül újra kiosztásra."""
+
+    ROWS = [
+        {'type': 'single', 'html': 'Egy', 'maximum_marks': '4', 'option1': 'a', 'option2': 'b', 'correct_option': '2'},
+        {'type': 'text', 'html': 'Kettő', 'maximum_marks': '2', 'correct_text_answer': 'igen'},
+        {'type': 'ismeretlen', 'html': 'Három'},
+    ]
+
+    def test_import_never_reuses_deleted_ids(self):
+        quiz = Quiz.objects.create(title='Import')
+        result = importer.import_questions(quiz, enumerate(self.ROWS, start=1))
+        self.assertEqual((result.created, result.failed, result.errors[0][0]), (2, 1, 3))
+        self.assertEqual(list(Choice.objects.filter(is_correct=True).values_list('html', flat=True)), ['b'])
+
+        deleted_pk = quiz.quiz_questions.order_by('-order')[0].question_id
+        Question.objects.filter(pk=deleted_pk).delete()
+        importer.import_questions(quiz, enumerate(self.ROWS[:1], start=1))
+        self.assertGreater(Question.objects.order_by('-pk')[0].pk, deleted_pk)
+        self.assertEqual(len(search.search_ids('egy')), 2)
+
+    def test_batch_inserts_questions_in_bulk_with_matching_ids(self):
+        quiz = Quiz.objects.create(title='Tömeges')
+        rows = [{'type': 'single', 'html': 'K{}'.format(i), 'maximum_marks': '1',
+                 'option1': 'a{}'.format(i), 'option2': 'b{}'.format(i), 'correct_option': '1'} for i in range(7)]
+        with CaptureQueriesContext(connection) as queries:
+            result = importer.import_questions(quiz, enumerate(rows, start=1), batch_size=4)
+        self.assertEqual(result.created, 7)
+        inserts = [q['sql'] for q in queries if q['sql'].startswith('INSERT INTO "quiz_question" ')]
+        self.assertEqual(len(inserts), 2)  # kötegenként egy, nem kérdésenként
+        for question in Question.objects.filter(quizquestions__quiz=quiz).prefetch_related('choices'):
+            number = question.html[1:]
+            self.assertEqual(sorted(c.html for c in question.choices.all()), ['a' + number, 'b' + number])
+        self.assertEqual([qq.question.html for qq in quiz.quiz_questions.order_by('order')],
+                         ['K{}'.format(i) for i in range(7)])
+
+
+class LeaderboardRankTests(TestCase):
+    """A globális ranglista sűrű helyezése olvasáskor számolódik; egy pontváltozás csak a saját sort írja."""
+
+    def setUp(self):
+        cache.clear()
+        self.profiles = [QuizProfile.objects.create(user=User.objects.create_user('u{}'.format(i))) for i in range(5)]
+
+    def ranks(self, **kwargs):
+        return dict((entry.quiz_profile_id, entry.rank) for entry in leaderboard.top_entries(**kwargs))
+
+    def set_score(self, profile, score):
+        QuizProfile.objects.filter(pk=profile.pk).update(total_score=score)
+        leaderboard.sync_profiles([profile.pk])
+
+    def test_dense_ranks_on_read(self):
+        for profile, score in zip(self.profiles, [10, 10, 5, 0, 20]):
+            self.set_score(profile, score)
+        for profile, score in [(self.profiles[4], 10), (self.profiles[2], 30), (self.profiles[3], 5)]:
+            self.set_score(profile, score)
+        ranks = self.ranks()
+        self.assertEqual([ranks[p.pk] for p in self.profiles], [2, 2, 1, 3, 2])
+        # egy későbbi szelet a fölötte lévő szintekből folytatja a számozást
+        self.assertEqual(self.ranks(limit=2, offset=3), {self.profiles[4].pk: 2, self.profiles[3].pk: 3})
+
+        # a pontváltozás a profil beolvasása és a saját sor UPDATE-je, zár és léptetés nélkül
+        QuizProfile.objects.filter(pk=self.profiles[0].pk).update(total_score=40)
+        with CaptureQueriesContext(connection) as queries:
+            leaderboard.sync_profiles([self.profiles[0].pk])
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(LeaderboardEntry.objects.get(quiz_profile=self.profiles[0]).total_score, 40)
+
+    def test_cache_bumped_only_for_visible_changes(self):
+        for profile, score in zip(self.profiles, [50, 40, 30, 20, 10]):
+            self.set_score(profile, score)
+        with mock.patch.object(leaderboard, 'PAGE_SIZE', 2), mock.patch.object(page_cache, 'bump') as bump:
+            leaderboard.top_entries()  # az első oldal határa: 40
+            self.set_score(self.profiles[4], 15)  # a 4-5. hely között mozog
+            self.assertFalse(bump.called)
+            self.set_score(self.profiles[4], 45)  # felkerül az első oldalra
+            self.assertTrue(bump.called)
+
+    def test_total_count_is_not_capped_by_page(self):
+        self.client.force_login(self.profiles[0].user)
+        with mock.patch.object(leaderboard, 'PAGE_SIZE', 2):
+            response = self.client.get('/leaderboard/', HTTP_HOST='127.0.0.1')
+        self.assertEqual(len(response.context['leaderboard_entries']), 2)
+        self.assertEqual(response.context['total_count'], 5)
+
+
+class RestartHistoryTests(FreshCacheTestCase):
+    """Újrakezdés: az előző futás megmarad előzménynek, a pontszámba csak az új számít."""
+
+    def test_restart_keeps_history_and_shared_questions(self):
+        quiz, other = Quiz.objects.create(title='A'), Quiz.objects.create(title='B')
+        question, right, wrong = _single_choice_question(quiz)
+        QuizQuestion.objects.create(quiz=other, question=question, order=1)
+        profile = QuizProfile.objects.create(user=User.objects.create_user('diak'))
+
+        # a másik kvízben (és futás nélkül) adott válasz nem veszi ki a kérdést ebből a kvízből
+        _answer(profile, QuizAttempt.start_new(other, profile), question, right)
+        profile.create_attempt(question)
+        first = QuizAttempt.start_new(quiz, profile)
+        self.assertEqual(first.get_question_ids(), [question.pk])
+        _answer(profile, first, question, right)
+        profile.refresh_from_db()
+        self.assertEqual(profile.total_score, 8)
+
+        second = profile.restart_quiz(quiz)
+        self.assertEqual(second.get_question_ids(), [question.pk])
+        self.assertEqual(profile.total_score, 4)
+        _answer(profile, second, question, wrong)
+        first.refresh_from_db()
+        self.assertTrue(first.is_finished)
+        self.assertEqual(first.total_score, 4)
+        self.assertEqual(list(QuizAttempt.superseded().filter(quiz=quiz)), [first])
+        profile.update_score()
+        self.assertEqual(profile.total_score, 4)
+
+
+class PlayApiTests(FreshCacheTestCase):
+    """A válasz-API: a párosítás kulcsa nem olvasható ki, az ismételt beküldés nem lép tovább."""
+
+    def setUp(self):
+        super(PlayApiTests, self).setUp()
+        self.quiz = Quiz.objects.create(title='Párosítás')
+        self.question = Question.objects.create(html='Párosítsd!')
+        self.pairs = [MatchingPair.objects.create(question=self.question, left_text=left, right_text=right)
+                      for left, right in [('Duna', 'folyó'), ('Mátra', 'hegység'), ('Balaton', 'tó')]]
+        QuizQuestion.objects.create(quiz=self.quiz, question=self.question, order=1)
+        _single_choice_question(self.quiz)
+        self.client.force_login(User.objects.create_user('diak'))
+
+    def answer(self, data):
+        response = self.client.post('/{}/answer/'.format(self.quiz.pk), data, HTTP_HOST='127.0.0.1')
+        return json.loads(response.content.decode('utf-8'))
+
+    def test_matching_payload_hides_key_and_grades_tokens(self):
+        self.client.get('/{}/play/'.format(self.quiz.pk), HTTP_HOST='127.0.0.1')
+        question = snapshot.get_quiz_snapshot(self.quiz).get_question(self.question.pk)
+        payload = play_api.question_payload(question)
+        pair_ids = set(str(pair.pk) for pair in self.pairs)
+        self.assertFalse(pair_ids & set(str(item['id']) for item in payload['pairs']['right']))
+
+        tokens = dict((text, token) for token, text in question.right_items)
+        mapping = {'mapping_{}'.format(pair.pk): tokens[pair.right_text] for pair in self.pairs}
+        # a nyers pár id-val beküldött párosítás nem ér pontot
+        cheat = grading.Submission.from_post(QueryDict(
+            urlencode(dict(question_pk=self.question.pk, **{key: key[8:] for key in mapping}))
+        ))
+        self.assertEqual(cheat.mapping, {})
+
+        data = self.answer(dict(question_pk=self.question.pk, **mapping))
+        self.assertEqual(AttemptedQuestion.objects.get(question=self.question).marks_obtained, 4)
+        next_question = data['question']['id']
+        self.assertNotEqual(next_question, self.question.pk)
+
+        # ugyanaz a beküldés még egyszer: a soron lévő kérdés jön vissza, nem lép tovább
+        again = self.answer(dict(question_pk=self.question.pk, **mapping))
+        self.assertEqual(again['question']['id'], next_question)
+        self.assertEqual(AttemptedQuestion.objects.count(), 2)
+
+
+class ServeQuestionTests(FreshCacheTestCase):
+    """Ugyanazt az indexet kétszer kiszolgálva (dupla kattintás, két fül) nem lesz két kérdéskísérlet."""
+
+    def test_same_index_served_twice_reuses_attempted_question(self):
+        quiz = Quiz.objects.create(title='Dupla kattintás')
+        first, right, wrong = _single_choice_question(quiz)
+        second, _, _ = _single_choice_question(quiz)
+        quiz.refresh_from_db()
+        user = User.objects.create_user('diak')
+        profile = QuizProfile.objects.create(user=user)
+        attempt = QuizAttempt.start_new(quiz, profile)
+        # a második kérés még a léptetés előtti állapotot olvasta be
+        stale = QuizAttempt.objects.get(pk=attempt.pk)
+
+        question, served = views._serve_next_question(quiz, profile, attempt)
+        again, served_again = views._serve_next_question(quiz, profile, stale)
+        self.assertEqual((question.pk, again.pk), (first.pk, first.pk))
+        self.assertEqual(served_again.pk, served.pk)
+        self.assertEqual(AttemptedQuestion.objects.filter(attempt=attempt).count(), 1)
+        self.assertEqual(stale.current_index, 1)
+
+        # a korábbi, duplikált sorok sem okoznak 500-at a beküldésnél
+        profile.create_attempt(first, attempt)
+        self.client.force_login(user)
+        response = self.client.post('/{}/play/'.format(quiz.pk), {'question_pk': first.pk, 'choice_pk': right.pk},
+                                    HTTP_HOST='127.0.0.1')
+        self.assertEqual(response.status_code, 302)
+        data = json.loads(self.client.post('/{}/answer/'.format(quiz.pk), {'question_pk': first.pk},
+                                           HTTP_HOST='127.0.0.1').content.decode('utf-8'))
+        self.assertEqual(data['question']['id'], second.pk)
+
+
+class GraderTests(SimpleTestCase):
+    """Kérdéstípusonkénti pontozás (quiz.grading) lekérdezés nélkül, kézzel épített megoldókulcsokkal."""
+
+    def key(self, choices=(), correct=(), text=None, pairs=(), multiple=False):
+        key = grading.AnswerKey(1, 4, multiple, text)
+        key.choice_ids, key.correct_choice_ids, key.pair_ids = set(choices), set(correct), list(pairs)
+        return key
+
+    def grade(self, key, **submission):
+        result = grading.GRADERS[key.kind].grade(key, grading.Submission(**submission))
+        return result.is_correct, result.marks_obtained
+
+    def test_choice_graders(self):
+        single = self.key(choices=[1, 2, 3], correct=[2])
+        self.assertEqual(self.grade(single, choice_ids=[2]), (True, 4))
+        self.assertEqual(self.grade(single, choice_ids=[2, 3]), (False, 0))
+        # más kérdés válaszlehetősége nem számít bele
+        self.assertEqual(self.grade(single, choice_ids=[2, 99]), (True, 4))
+
+        multiple = self.key(choices=[1, 2, 3], correct=[1, 2], multiple=True)
+        self.assertEqual(multiple.kind, grading.MULTIPLE)
+        self.assertEqual(self.grade(multiple, choice_ids=[1, 2]), (True, 4))
+        self.assertEqual(self.grade(multiple, choice_ids=[1]), (False, 2))
+
+    def test_text_and_matching_graders(self):
+        text = self.key(text='Igen')
+        self.assertEqual(self.grade(text, text='  igen '), (True, 4))
+        self.assertEqual(self.grade(text, text='nem'), (False, 0))
+
+        # a párok elsőbbséget élveznek a típusfelismerésnél
+        matching = self.key(pairs=[10, 11, 12, 13], text='x')
+        self.assertEqual(matching.kind, grading.MATCHING)
+        self.assertEqual(self.grade(matching, mapping={10: 10, 11: 11, 12: 12, 13: 13}), (True, 4))
+        self.assertEqual(self.grade(matching, mapping={10: 10, 11: 12, 12: 11}), (False, 1))
+        self.assertEqual(self.grade(matching), (False, 0))
+
+
+class SnapshotInvalidationTests(FreshCacheTestCase):
+    """A pillanatkép a tartalomverzióig él: verzióemelés nélkül a régi, utána az új tartalom jön."""
+
+    def test_content_version_bump_rebuilds_snapshot(self):
+        quiz = Quiz.objects.create(title='Pillanatkép')
+        question, right, wrong = _single_choice_question(quiz)
+        quiz.refresh_from_db()
+        self.assertEqual(snapshot.get_quiz_snapshot(quiz).get_question(question.pk).html, 'Kérdés')
+
+        Question.objects.filter(pk=question.pk).update(html='Új szöveg')
+        self.assertEqual(snapshot.get_quiz_snapshot(quiz).get_question(question.pk).html, 'Kérdés')
+
+        snapshot.bump_content_version_for_question(question)
+        quiz.refresh_from_db()
+        with self.assertNumQueries(4):
+            rebuilt = snapshot.get_quiz_snapshot(quiz)
+        self.assertEqual(rebuilt.get_question(question.pk).html, 'Új szöveg')
+
+        other, _, _ = _single_choice_question(quiz)
+        self.assertEqual(snapshot.get_quiz_snapshot(quiz).question_ids, (question.pk, other.pk))
+
+
+class QuizRankingTests(FreshCacheTestCase):
+    """Kvízenkénti ranglista: userenként a legjobb lezárt futás, sűrű helyezés, csoportszűrés, lapozás."""
+
+    def test_best_finished_attempt_ranked_densely(self):
+        quiz = Quiz.objects.create(title='Verseny')
+        users = dict((name, User.objects.create_user(name)) for name in ('anna', 'bela', 'cili', 'dani'))
+        for name, score, finished in [('anna', 8, True), ('anna', 4, True), ('bela', 8, True), ('cili', 4, True),
+                                      ('dani', 12, False)]:
+            QuizAttempt.objects.create(quiz=quiz, user=users[name], total_score=score, is_finished=finished)
+        group = Group.objects.create(name='9.B')
+        group.user_set.add(users['bela'], users['cili'])
+
+        ranking = leaderboard.quiz_ranking(quiz.pk)
+        self.assertEqual([(row.username, row.best_score, row.rank) for row in ranking.rows],
+                         [('anna', 8, 1), ('bela', 8, 1), ('cili', 4, 2)])
+        self.assertEqual(ranking.total_count, 3)
+
+        in_group = leaderboard.quiz_ranking(quiz.pk, group_id=group.pk)
+        self.assertEqual([(row.username, row.rank) for row in in_group.rows], [('bela', 1), ('cili', 2)])
+
+        second_page = leaderboard.quiz_ranking(quiz.pk, page=2, page_size=2)
+        self.assertEqual([row.username for row in second_page.rows], ['cili'])
+        self.assertEqual((second_page.num_pages, second_page.has_previous, second_page.has_next), (2, True, False))
+
+
+class ImportExportRoundTripTests(FreshCacheTestCase):
+    """Importált kérdésbank, kitöltés, majd export: a válaszok minden típusnál visszaolvashatók."""
+
+    ROWS = [
+        {'type': 'single', 'html': '<p>Főváros?</p>', 'maximum_marks': '4',
+         'option1': 'Budapest', 'option2': 'Bécs', 'correct_option': '1'},
+        {'type': 'multiple', 'html': 'Folyók?', 'maximum_marks': '4',
+         'option1': 'Duna', 'option2': 'Tisza', 'option3': 'Mátra', 'correct_options': '1|2'},
+        {'type': 'text', 'html': 'Igen vagy nem?', 'maximum_marks': '2', 'correct_text_answer': 'Igen'},
+        {'type': 'matching', 'html': 'Párosítsd!', 'maximum_marks': '4',
+         'pair1_left': 'Duna', 'pair1_right': 'folyó', 'pair2_left': 'Mátra', 'pair2_right': 'hegység'},
+    ]
+
+    def setUp(self):
+        super(ImportExportRoundTripTests, self).setUp()
+        self.quiz = Quiz.objects.create(title='Körút')
+        result = importer.import_questions(self.quiz, enumerate(self.ROWS, start=1))
+        self.assertEqual((result.created, result.failed), (4, 0))
+        self.profile = QuizProfile.objects.create(user=User.objects.create_user('diak'))
+        self.attempt = QuizAttempt.start_new(self.quiz, self.profile)
+
+        questions = [qq.question for qq in self.quiz.quiz_questions.select_related('question')]
+        single, multiple, text, matching = questions
+        choice = dict((c.html, c.pk) for c in Choice.objects.all())
+        pairs = list(matching.matching_pairs.order_by('pk'))
+        answers = [
+            (single, grading.Submission(choice_ids=[choice['Bécs']])),
+            (multiple, grading.Submission(choice_ids=[choice['Duna']])),
+            (text, grading.Submission(text=' igen ')),
+            (matching, grading.Submission(mapping={pairs[0].pk: pairs[0].pk, pairs[1].pk: None})),
+        ]
+        aqs = [self.profile.create_attempt(question, self.attempt) for question, _ in answers]
+        grading.grade_many(aqs, dict((aq.pk, submission) for aq, (_, submission) in zip(aqs, answers)))
+        self.attempt.finish()
+
+    def test_export_reads_back_every_answer(self):
+        rows = [json.loads(line) for line in ''.join(exporter.iter_ndjson(self.quiz.pk)).splitlines()]
+        self.assertEqual([row['question'] for row in rows], ['Főváros?', 'Folyók?', 'Igen vagy nem?', 'Párosítsd!'])
+        self.assertEqual([row['marks_obtained'] for row in rows], ['0.00', '2.00', '2.00', '2.00'])
+        self.assertEqual([row['selected_choices'] for row in rows[:2]], [['Bécs'], ['Duna']])
+        self.assertEqual(rows[2]['text_answer'], 'igen')
+        self.assertEqual(rows[3]['matches'], [{'left': 'Duna', 'right': 'folyó'}, {'left': 'Mátra', 'right': None}])
+        self.assertEqual(set(row['attempt_total_score'] for row in rows), {'6.00'})
+
+        csv_lines = ''.join(exporter.iter_csv(self.quiz.pk)).splitlines()
+        self.assertEqual(len(csv_lines), 5)
+        self.assertIn('Duna -> folyó | Mátra -> ', csv_lines[4])
+
+    def test_results_summary_renders_and_follows_content_version(self):
+        html, total = results.render_summary(self.quiz, self.attempt)
+        self.assertEqual(total, 6)
+        self.assertIn('Bécs (hibás választás)', html)
+        self.assertIn('Budapest (helyes válasz, amit nem jelöltél)', html)
+        self.assertIn('✅ Duna ⇔ folyó', html)
+        self.assertIn('Mátra ⇔ <em>nincs párosítás</em>', html)
+
+        with self.assertNumQueries(0):
+            results.render_summary(self.quiz, self.attempt)
+        Question.objects.filter(html='Folyók?').update(html='Magyar folyók?')
+        snapshot.bump_content_version(self.quiz)
+        self.assertIn('Magyar folyók?', results.render_summary(self.quiz, self.attempt)[0])
+
+
+class DeadlineExpiryTests(FreshCacheTestCase):
+    """Szerveroldali határidő: a lejárt, a régóta szüneteltetett és az elhagyott futások lezárulnak."""
+
+    def test_finish_expired_and_play_redirect(self):
+        quiz = Quiz.objects.create(title='Időre', time_limit_seconds=60)
+        _single_choice_question(quiz)
+        quiz.refresh_from_db()
+        user = User.objects.create_user('diak')
+        profile = QuizProfile.objects.create(user=user)
+        timed = QuizAttempt.start_new(quiz, profile)
+        now = timezone.now()
+        self.assertAlmostEqual((timed.deadline - now).total_seconds(), 60, delta=5)
+
+        untimed_quiz = Quiz.objects.create(title='Ráérős')
+        paused = QuizAttempt.objects.create(quiz=untimed_quiz, user=User.objects.create_user('szunet'),
+                                            paused_at=now - timedelta(hours=2))
+        abandoned = QuizAttempt.objects.create(quiz=untimed_quiz, user=User.objects.create_user('elhagyta'))
+        QuizAttempt.objects.filter(pk=abandoned.pk).update(started_at=now - timedelta(days=2))
+
+        self.assertEqual(QuizAttempt.finish_expired(now=now), 0)
+        self.assertEqual(QuizAttempt.finish_expired(now=now + timedelta(seconds=61), batch_size=1), 1)
+        self.assertEqual(QuizAttempt.finish_expired(now=now, paused_after=3600, abandoned_after=86400), 2)
+        self.assertEqual(QuizAttempt.objects.filter(is_finished=False).count(), 0)
+        paused.refresh_from_db()
+        self.assertIsNone(paused.paused_at)
+
+        # a play oldal lejárt (itt: lezárt) futásnál az eredményre küld
+        self.client.force_login(user)
+        response = self.client.get('/{}/play/'.format(quiz.pk), HTTP_HOST='127.0.0.1')
+        self.assertRedirects(response, '/{}/end/'.format(quiz.pk), fetch_redirect_response=False)
+
+
+class QueryPlanAuditTests(TestCase):
+    """A forró lekérdezések terve a migrált sémán nem tartalmaz teljes táblaolvasást / rendezést."""
+
+    def test_hot_queries_use_indexes(self):
+        flagged = [(report.name, report.findings) for report in query_audit.audit() if not report.ok]
+        self.assertEqual(flagged, [])
+
+
+class RetryOnLockTests(SimpleTestCase):
+    """A zárolási ütközést újrapróbáljuk, a többi adatbázis-hibát nem."""
+
+    def _failing(self, errors):
+        calls = []
+
+        def func():
+            calls.append(1)
+            if errors:
+                raise errors.pop(0)
+            return 'ok'
+        return func, calls
+
+    def test_retries_lock_errors(self):
+        func, calls = self._failing([OperationalError('database is locked')] * 2)
+        self.assertEqual(database.retry_on_lock(func, retries=3, delay=0), 'ok')
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_are_raised(self):
+        func, calls = self._failing([OperationalError('no such table: quiz_quiz')])
+        with self.assertRaises(OperationalError):
+            database.retry_on_lock(func, retries=3, delay=0)
+        self.assertEqual(len(calls), 1)
@@ -8,8 +8,12 @@ urlpatterns = [
     url(r'^$', views.home, name='home'),
     url(r'^user-home$', views.user_home, name='user_home'),
     url(r'^(?P<quiz_id>\d+)/play/$', views.play, name='play'),
+    url(r'^(?P<quiz_id>\d+)/answer/$', views.answer_api, name='answer_api'),
+    url(r'^(?P<quiz_id>\d+)/prefetch/$', views.prefetch_quiz, name='prefetch_quiz'),
+    url(r'^(?P<quiz_id>\d+)/sync/$', views.sync_answers, name='sync_answers'),
     url(r'^(?P<quiz_id>\d+)/restart/$', views.restart_quiz, name='restart_quiz'),
     url(r'^leaderboard/$', views.leaderboard, name='leaderboard'),
+    url(r'^(?P<quiz_id>\d+)/leaderboard/$', views.quiz_leaderboard, name='quiz_leaderboard'),
     url(r'^login/$', views.login_view, name='login'),
     url(r'^logout/$', views.logout_view, name='logout'),
     url(r'^register/$', views.register, name='register'),
@@ -24,11 +28,17 @@ urlpatterns = [
     url(r'^(?P<quiz_id>\d+)/add-text-question/$', views.add_text_question, name='add_text_question'),
     url(r'^(?P<quiz_id>\d+)/end/$', views.quiz_end, name='quiz_end'),
     url(r'^(?P<quiz_id>\d+)/results/$', views.quiz_results, name='quiz_results'),
+    url(r'^(?P<quiz_id>\d+)/export/$', views.export_results, name='export_results'),
     url(r'^quizzes/$', views.quiz_list, name='quiz_list'),
     url(r'^quizzes/user-groups/$', views.manage_user_groups, name='manage_user_groups'),
+    url(r'^access/search/$', views.access_search, name='access_search'),
+    url(r'^questions/search/$', views.question_search, name='question_search'),
+    url(r'^(?P<quiz_id>\d+)/add-existing-question/$', views.add_existing_question, name='add_existing_question'),
     url(r'^(?P<quiz_id>\d+)/add-matching-question/$', views.add_matching_question, name='add_matching_question'),
+    url(r'^(?P<quiz_id>\d+)/import-questions/$', views.import_questions, name='import_questions'),
     url(r'^(?P<quiz_id>\d+)/question/(?P<question_id>\d+)/edit/$',views.edit_question,name='edit_question'),
     url(r'^(?P<quiz_id>\d+)/question/(?P<question_id>\d+)/delete/$',views.delete_question,name='delete_question'),
+    url(r'^instrumentation/$', views.instrumentation_stats, name='instrumentation_stats'),
 
     
 ]
@@ -1,24 +1,39 @@
+import io
+import json
+
 from django.utils import timezone
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ObjectDoesNotExist
-from django.http import Http404
-from .models import QuizProfile, Quiz, AttemptedQuestion, QuizQuestion, Choice, MatchingPair, AttemptedMatch
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from .models import LeaderboardEntry, QuizProfile, Quiz, AttemptedQuestion, QuizQuestion, Choice, MatchingPair, AttemptedMatch, QuizAttempt
 from .models import Question
+from . import exporter, grading, importer, memberships, page_cache, pickers, play_api, prefetch, results, search
+from .instrumentation import collected_stats
+from .access import accessible_quizzes, can_access
+from .capabilities import get_capabilities
+from .leaderboard import page_size as leaderboard_page_size, quiz_ranking, sync_profiles as sync_leaderboard, top_entries as top_leaderboard_entries
+from .snapshot import get_quiz_snapshot, bump_content_version, bump_content_version_for_question
 from .forms import UserLoginForm, RegistrationForm, QuizCreateForm, SingleChoiceQuestionForm, MultipleChoiceQuestionForm, TextQuestionForm, MatchingQuestionForm
 from django.db.models import Max
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User, Group
+from django.urls import reverse
+from django.utils.text import Truncator
+from django.views.decorators.http import require_POST
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.conf import settings
+
+# ennyi user látszik egy oldalon a csoporttagság-szerkesztőben
+MEMBERSHIP_PAGE_SIZE = getattr(settings, 'QUIZ_MEMBERSHIP_PAGE_SIZE', 50)
 
 @login_required
 def create_quiz(request):
 
-    user = request.user
-    is_teacher = user.is_superuser or user.groups.filter(name='Tanár').exists()
-
-    if not is_teacher:
+    if not get_capabilities(request).can_manage_quizzes:
         messages.error(request, "Nincs jogosultságod kvízt létrehozni.")
         return redirect('quiz:home')
 
@@ -39,8 +54,7 @@ def create_quiz(request):
 @login_required
 def quiz_list(request):
     # csak tanár vagy superuser
-    is_teacher = request.user.is_superuser or request.user.groups.filter(name='Tanár').exists()
-    if not is_teacher:
+    if not get_capabilities(request).can_manage_quizzes:
         messages.error(request, "Nincs jogosultságod a kvízek kezeléséhez.")
         return redirect('quiz:home')
 
@@ -56,28 +70,53 @@ def quiz_list(request):
 @login_required
 def manage_user_groups(request):
     # csak tanár vagy superuser
-    is_teacher = request.user.is_superuser or request.user.groups.filter(name='Tanár').exists()
-    if not is_teacher:
+    if not get_capabilities(request).can_manage_quizzes:
         messages.error(request, "Nincs jogosultságod a felhasználók csoportjainak kezeléséhez.")
         return redirect('quiz:home')
 
-    users = User.objects.all().order_by('username')
-    groups = Group.objects.all().order_by('name')
+    groups = list(Group.objects.all().order_by('name'))
 
     if request.method == 'POST':
-        # azt várjuk, hogy minden userhez jön egy többes listamező:
-        # name="groups_<user_id>"
-        for user in users:
-            field_name = f"groups_{user.id}"
-            group_ids = request.POST.getlist(field_name)
-            # beállítjuk az adott user csoportjait a beküldött listára
-            user.groups.set(group_ids)
-        messages.success(request, "Csoporttagságok mentve.")
-        return redirect('quiz:manage_user_groups')
+        # csak az oldalon látott userek jönnek (name="user_ids"), mindegyikhez egy
+        # többes listamező: name="groups_<user_id>"; a többi userhez nem nyúlunk
+        valid_group_ids = set(group.id for group in groups)
+        user_ids = set(int(pk) for pk in request.POST.getlist('user_ids') if pk.isdigit())
+        user_ids &= set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+        desired = {}
+        for user_id in user_ids:
+            group_ids = request.POST.getlist(f"groups_{user_id}")
+            desired[user_id] = set(int(pk) for pk in group_ids if pk.isdigit()) & valid_group_ids
+        change = memberships.set_memberships(desired)
+        messages.success(request, "Csoporttagságok mentve ({} felhasználó módosult).".format(len(change.users)))
+        # ugyanarra a szűrt oldalra térünk vissza
+        return redirect(request.get_full_path())
+
+    search = request.GET.get('q', '').strip()
+    try:
+        group_filter = int(request.GET.get('group') or 0)
+    except ValueError:
+        group_filter = 0
+    users = User.objects.order_by('username')
+    if search:
+        users = users.filter(username__istartswith=search)
+    if group_filter:
+        users = users.filter(groups=group_filter)
+
+    paginator = Paginator(users.only('pk', 'username'), MEMBERSHIP_PAGE_SIZE)
+    try:
+        page = paginator.page(request.GET.get('page') or 1)
+    except (PageNotAnInteger, EmptyPage):
+        page = paginator.page(1)
+    # a látott userek tagságai egyetlen lekérdezéssel
+    current = memberships.current_memberships(user.pk for user in page)
+    for user in page:
+        user.group_ids = current.get(user.pk, {})
 
     return render(request, 'quiz/manage_user_groups.html', {
-        'users': users,
+        'users': page,
         'groups': groups,
+        'search': search,
+        'selected_group': group_filter,
     })
 
 
@@ -136,6 +175,7 @@ def add_single_question(request, quiz_id):
                 question=question,
                 order=max_order + 1
             )
+            bump_content_version(quiz)
             
             return redirect("quiz:quiz_settings", quiz_id=quiz.id)
     else:
@@ -181,6 +221,7 @@ def add_multiple_question(request, quiz_id):
                 question=question,
                 order=max_order + 1
             )
+            bump_content_version(quiz)
 
             return redirect("quiz:quiz_settings", quiz_id=quiz.id)
     else:
@@ -202,6 +243,7 @@ def add_text_question(request, quiz_id):
             # kérdést hozzákapcsoljuk a kvízhez
             max_order = QuizQuestion.objects.filter(quiz=quiz).aggregate(Max('order'))['order__max'] or 0
             QuizQuestion.objects.create(quiz=quiz, question=question, order=max_order + 1)
+            bump_content_version(quiz)
 
             messages.success(request, "Szöveges kérdés hozzáadva!")
             return redirect("quiz:quiz_settings", quiz_id=quiz.id)
@@ -235,6 +277,7 @@ def add_matching_question(request, quiz_id):
                 question=question,
                 order=max_order + 1
             )
+            bump_content_version(quiz)
 
             messages.success(request, "Párosító kérdés hozzáadva!")
             return redirect("quiz:quiz_settings", quiz_id=quiz.id)
@@ -244,199 +287,322 @@ def add_matching_question(request, quiz_id):
     return render(request, "quiz/add_matching_question.html", {"form": form, "quiz": quiz})
 
 
+@login_required
+def import_questions(request, quiz_id):
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    if not get_capabilities(request).can_manage_quizzes:
+        messages.error(request, "Nincs jogosultságod a kvízek kezeléséhez.")
+        return redirect('quiz:home')
+
+    result = None
+    if request.method == "POST" and request.FILES.get('file'):
+        upload = request.FILES['file']
+        # a feltöltött fájlt soronként olvassuk, nem töltjük be egyben
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        result = importer.import_questions(quiz, importer.iter_rows(stream, importer.guess_format(upload.name)))
+        if result.created:
+            messages.success(request, "{} kérdés importálva.".format(result.created))
+
+    return render(request, "quiz/import_questions.html", {"quiz": quiz, "result": result})
+
+
+@login_required
+def export_results(request, quiz_id):
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    if not get_capabilities(request).can_manage_quizzes:
+        messages.error(request, "Nincs jogosultságod a kvízek kezeléséhez.")
+        return redirect('quiz:home')
+
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in exporter.FORMATS:
+        raise Http404("Ismeretlen exportformátum")
+    generate, content_type = exporter.FORMATS[fmt]
+
+    # a sorok a válasz küldése közben készülnek, a teljes export nincs a memóriában
+    response = StreamingHttpResponse(generate(quiz.id), content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="quiz_{}_results.{}"'.format(quiz.id, fmt)
+    return response
+
+
+def _quiz_list_context(user):
+    """A home_quiz_list.html részlet adatai; a lista lusta queryset, csak üres részlet-cache-nél fut le."""
+    return {
+        'quizzes': get_accessible_quizzes_for_user(user),
+        'quiz_list_version': page_cache.quiz_list_version(user),
+        'quiz_list_timeout': page_cache.FRAGMENT_TIMEOUT,
+    }
+
+
+@page_cache.cache_anonymous_page(page_cache.QUIZZES)
 def home(request):
-    quizzes = get_accessible_quizzes_for_user(request.user)
-    return render(request, 'quiz/home.html', {'quizzes': quizzes})
+    context = {}
+    if request.user.is_authenticated:
+        context = _quiz_list_context(request.user)
+    return render(request, 'quiz/home.html', context)
 
 
 @login_required()
 def user_home(request):
-    quizzes = get_accessible_quizzes_for_user(request.user)
-    return render(request, 'quiz/user_home.html', {'quizzes': quizzes})
+    return render(request, 'quiz/user_home.html', _quiz_list_context(request.user))
 
 
+@page_cache.cache_anonymous_page(page_cache.LEADERBOARD)
 def leaderboard(request):
-
-    top_quiz_profiles = QuizProfile.objects.order_by('-total_score')[:500]
-    total_count = top_quiz_profiles.count()
+    # a materializált ranglistából, előre kiszámolt helyezéssel, egy lekérdezéssel
+    leaderboard_entries = top_leaderboard_entries()
+    total_count = len(leaderboard_entries)
+    if total_count >= leaderboard_page_size():
+        # a lista az első oldalra vágott, a teljes számhoz külön COUNT kell
+        total_count = LeaderboardEntry.objects.count()
     context = {
-        'top_quiz_profiles': top_quiz_profiles,
+        'leaderboard_entries': leaderboard_entries,
         'total_count': total_count,
     }
     return render(request, 'quiz/leaderboard.html', context=context)
 
 
+@login_required
+def quiz_leaderboard(request, quiz_id):
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    if not get_capabilities(request).can_manage_quizzes and not can_access(request.user, quiz):
+        messages.error(request, "Nincs jogosultságod ehhez a kvízhez.")
+        return redirect('quiz:home')
+
+    try:
+        group_id = int(request.GET.get('group') or 0)
+        page = max(1, int(request.GET.get('page') or 1))
+    except ValueError:
+        group_id, page = 0, 1
+
+    # ablakfüggvényes lekérdezés a lezárt futásokból, rövid ideig cache-elve
+    ranking = quiz_ranking(quiz.id, group_id=group_id, page=page)
+
+    context = {
+        'quiz': quiz,
+        'ranking': ranking,
+        'groups': Group.objects.order_by('name'),
+        'selected_group': group_id,
+    }
+    return render(request, 'quiz/quiz_leaderboard.html', context=context)
+
+
+def _serve_next_question(quiz, quiz_profile, quiz_attempt):
+    """
+    A futás következő kérdése és a hozzá létrehozott AttemptedQuestion, vagy (None, None),
+    ha nincs több. A kezdéskor rögzített sorrendből index alapján vesszük a kérdést, a
+    tartalmát pedig a kvíz cache-elt pillanatképéből.
+
+    A léptetés és a létrehozás egy tranzakcióban fut: ha egy párhuzamos kérés (dupla
+    kattintás, két fül) már kiszolgálta ugyanazt az indexet, a feltételes UPDATE annak
+    commitjáig vár, és utána az ő AttemptedQuestion-jét adjuk vissza újabb helyett.
+    """
+    snapshot = get_quiz_snapshot(quiz)
+    with transaction.atomic():
+        while True:
+            question_id = quiz_attempt.current_question_id()
+            if question_id is None:
+                return None, None
+            question = snapshot.get_question(question_id)
+            if quiz_attempt.advance():
+                # ha a kérdést közben törölték, egyszerűen továbblépünk
+                if question is not None:
+                    return question, quiz_profile.create_attempt(question, quiz_attempt)
+                continue
+            quiz_attempt.refresh_from_db(fields=['current_index'])
+            if question is not None:
+                try:
+                    return question, quiz_attempt.attempted_question_for(question_id)
+                except AttemptedQuestion.DoesNotExist:
+                    pass
+
+
 @login_required()
 def play(request, quiz_id):
     quiz = get_object_or_404(Quiz, id=quiz_id)
     
-    has_user_limit = quiz.allowed_users.exists()
-    has_group_limit = quiz.allowed_groups.exists()
-
-    if has_user_limit or has_group_limit:
-        user_allowed = quiz.allowed_users.filter(id=request.user.id).exists()
-        group_allowed = quiz.allowed_groups.filter(id__in=request.user.groups.values_list('id', flat=True)).exists()
-
-        if not (user_allowed or group_allowed or request.user.is_superuser):
-            from django.contrib import messages
-            messages.error(request, "Ehhez a kvízhez nincs hozzáférésed.")
-            return redirect('quiz:home')
+    # a denormalizált hozzáférési indexből (quiz.access), egy indexelt lekérdezéssel
+    if not can_access(request.user, quiz):
+        messages.error(request, "Ehhez a kvízhez nincs hozzáférésed.")
+        return redirect('quiz:home')
     # --- innen mehet a te eddigi kódod ---
 
-    request.session['current_quiz_id'] = quiz.id
+    # csak akkor írjuk a sessiont, ha tényleg másik kvízre váltott
+    if request.session.get('current_quiz_id') != quiz.id:
+        request.session['current_quiz_id'] = quiz.id
     quiz_profile, created = QuizProfile.objects.get_or_create(user=request.user)
 
-    paused = request.session.get('quiz_paused', False)
-    if paused:
-        remaining = request.session.get('paused_remaining', 0)
-    else:
-        # eredeti logika
-        if 'quiz_start_time' not in request.session:
-            request.session['quiz_start_time'] = timezone.now().timestamp()
-
-        start_time = request.session['quiz_start_time']
-        elapsed = timezone.now().timestamp() - start_time
-        remaining = max(0, quiz.time_limit_seconds - int(elapsed))
+    quiz_attempt = QuizAttempt.start_or_resume(quiz, quiz_profile)
+    if quiz_attempt.is_finished:
+        return redirect('quiz:quiz_end', quiz_id=quiz.id)
 
-    # ha bárhogy is számoltuk, de elfogyott:
-    if quiz.time_limit_seconds > 0 and remaining <= 0:
+    # a határidő a futáson van (szerveroldalon), a lejárt futást itt rögtön lezárjuk
+    if quiz_attempt.is_expired():
+        quiz_attempt.finish()
         return redirect('quiz:quiz_end', quiz_id=quiz.id)
 
     if request.method == 'POST':
         question_pk = request.POST.get('question_pk')
 
         try:
-            attempted_question = quiz_profile.attempts.select_related('question').get(question__pk=question_pk)
-        except AttemptedQuestion.DoesNotExist:
+            attempted_question = quiz_attempt.attempted_question_for(question_pk)
+        except (AttemptedQuestion.DoesNotExist, ValueError):
             raise Http404("Nincs ilyen kérdéskísérlet")
 
-        question = attempted_question.question
-
-        # ... POST ágban, miután megvan: question = attempted_question.question
-
-# 🔴 ha szöveges kérdés
-        if question.matching_pairs.exists():
-            # előző sorok törlése, ha újrapróbálják
-            attempted_question.attempted_matches.all().delete()
-
-            total = question.matching_pairs.count()
-            correct_count = 0
-
-            for pair in question.matching_pairs.all():
-                # bal oldal azonosítója: pair.id
-                # a play.html hidden inputja: name="mapping_<left_id>"
-                right_id_str = request.POST.get('mapping_{}'.format(pair.id))
-                chosen = None
-                if right_id_str:
-                    try:
-                        chosen = MatchingPair.objects.get(pk=int(right_id_str), question=question)
-                    except (ValueError, MatchingPair.DoesNotExist):
-                        chosen = None
-
-                # sor mentése
-                AttemptedMatch.objects.create(
-                    attempted_question=attempted_question,
-                    left_pair=pair,
-                    chosen_right_pair=chosen
-                )
-
-                # helyes akkor, ha ugyanazt a párt választotta (jobb oldali id a bal pár id-jával egyezik a felületen)
-                if chosen and chosen.id == pair.id:
-                    correct_count += 1
+        # az értékelés kérdéstípustól függetlenül a quiz.grading-en megy át
+        submission = grading.Submission.from_post(request.POST)
+        grading.grade_many([attempted_question], {attempted_question.pk: submission})
 
-            ratio = (float(correct_count) / float(total)) if total > 0 else 0.0
-            attempted_question.is_correct = (correct_count == total and total > 0)
-            attempted_question.marks_obtained = round(float(question.maximum_marks) * ratio, 2)
-            # nincs választáslista / szöveges válasz ebben a típusban
-            attempted_question.text_answer = None
-            attempted_question.save(update_fields=['is_correct', 'marks_obtained', 'text_answer'])
+        if quiz.immediate_feedback:
+            # a visszajelzés olvasása alatt megáll az óra
+            quiz_attempt.pause()
+            return redirect('quiz:submission_result', attempted_question.pk)
+        else:
+            return redirect('quiz:play', quiz_id=quiz.id)
 
-            quiz_profile.update_score()
+    else:
+        # ha eddig szünetelt az óra, a szünet hosszával kitoljuk a határidőt
+        quiz_attempt.resume()
 
-            if quiz.immediate_feedback:
-                request.session['quiz_paused'] = True
-                request.session['paused_remaining'] = remaining
-                return redirect('quiz:submission_result', attempted_question.pk)
-            else:
-                return redirect('quiz:play', quiz_id=quiz.id)
+        question, attempted_question = _serve_next_question(quiz, quiz_profile, quiz_attempt)
+        if question is None:
+            return redirect('quiz:quiz_end', quiz_id=quiz.id)
+        context = {
+            'question': question,
+            'quiz': quiz,
+            'attempted_question': attempted_question,
+            'remaining_time': quiz_attempt.time_left() or 0,
+            'choices': question.choices,
+        }
 
-        if question.correct_text_answer:
-            
-            user_text = request.POST.get('text_answer', '').strip()
-            correct_text = (question.correct_text_answer or '').strip()
+        return render(request, 'quiz/play.html', context)
+        
 
-            # kisbetű-független összehasonlítás
-            is_correct = user_text.lower() == correct_text.lower()
+@login_required()
+@require_POST
+def answer_api(request, quiz_id):
+    """
+    Válasz beküldése a play oldalról JSON-ban: értékelés, azonnali visszajelzésnél a
+    visszajelzés, és a következő kérdés egyetlen válaszban (quiz.play_api), redirect és
+    külön submission_result oldal nélkül. A visszajelzést a kliens a következő kérdés
+    fölött mutatja, ezért itt nem állítjuk meg az órát.
+    """
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    if not can_access(request.user, quiz):
+        return JsonResponse({'error': "Ehhez a kvízhez nincs hozzáférésed."}, status=403)
 
-            attempted_question.text_answer = user_text
-            attempted_question.is_correct = is_correct
-            attempted_question.marks_obtained = question.maximum_marks if is_correct else 0
-            attempted_question.save(update_fields=['text_answer', 'is_correct', 'marks_obtained'])
+    quiz_profile, created = QuizProfile.objects.get_or_create(user=request.user)
+    quiz_attempt = QuizAttempt.start_or_resume(quiz, quiz_profile)
+    end_url = reverse('quiz:quiz_end', args=[quiz.id])
+    if not quiz_attempt.is_finished and quiz_attempt.is_expired():
+        quiz_attempt.finish()
+    if quiz_attempt.is_finished:
+        return JsonResponse(play_api.answer_response(end_url, 0))
+
+    try:
+        attempted_question = quiz_attempt.attempted_question_for(request.POST.get('question_pk'))
+    except (AttemptedQuestion.DoesNotExist, ValueError):
+        return JsonResponse({'error': "Nincs ilyen kérdéskísérlet."}, status=404)
+
+    # ha a klasszikus play oldalról szünetelt az óra, itt folytatódik
+    quiz_attempt.resume()
+
+    pending = quiz_attempt.attempted_questions.order_by('-pk').only('pk', 'question_id').first()
+    if pending.pk != attempted_question.pk:
+        # ismételt beküldés (pl. elveszett válasz után): ezt már értékeltük és továbbléptünk,
+        # újraértékelés és léptetés nélkül a soron lévő kérdést adjuk vissza
+        return JsonResponse(play_api.answer_response(
+            end_url, quiz_attempt.time_left() or 0,
+            next_question=get_quiz_snapshot(quiz).get_question(pending.question_id), request=request
+        ))
+
+    submission = grading.Submission.from_post(request.POST)
+    result = grading.grade_many([attempted_question], {attempted_question.pk: submission})[attempted_question.pk]
+
+    feedback = None
+    if quiz.immediate_feedback:
+        answered = get_quiz_snapshot(quiz).get_question(attempted_question.question_id)
+        if answered is not None:
+            # a current_index már a következő kiszolgálandó kérdésre mutat
+            feedback = results.build_feedback(quiz_attempt.current_index, answered, submission, result)
+
+    question, next_attempted_question = _serve_next_question(quiz, quiz_profile, quiz_attempt)
+    return JsonResponse(play_api.answer_response(
+        end_url, quiz_attempt.time_left() or 0, feedback_item=feedback, next_question=question, request=request
+    ))
 
-            # pontszám frissítés
-            quiz_profile.update_score()
 
-            if quiz.immediate_feedback:
-                request.session['quiz_paused'] = True
-                request.session['paused_remaining'] = remaining
-                return redirect('quiz:submission_result', attempted_question.pk)
-            else:
-                return redirect('quiz:play', quiz_id=quiz.id)
+@login_required()
+def prefetch_quiz(request, quiz_id):
+    """
+    Azonnali visszajelzés nélküli kvíz teljes letöltése a futás adataival (quiz.prefetch).
+    A válaszokat ezután a sync_answers végpont fogadja kötegekben.
+    """
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    if not can_access(request.user, quiz):
+        return JsonResponse({'error': "Ehhez a kvízhez nincs hozzáférésed."}, status=403)
+    if quiz.immediate_feedback:
+        return JsonResponse({'error': "Azonnali visszajelzéses kvíz, kérdésenként kell beküldeni."}, status=409)
 
+    quiz_profile, created = QuizProfile.objects.get_or_create(user=request.user)
+    quiz_attempt = QuizAttempt.start_or_resume(quiz, quiz_profile)
 
-        if question.is_multiple_choice:
-            choice_pks = request.POST.getlist('choices')
-        else:
-            choice_pks = [request.POST.get('choice_pk')] if request.POST.get('choice_pk') else []
+    tag = prefetch.etag(quiz, quiz_attempt)
+    if tag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(prefetch.build_payload(quiz, quiz_attempt), content_type='application/json')
+    response['ETag'] = tag
+    # userenként más (a futás része), ezért csak a böngésző tárolhatja
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
-        selected_choices = question.choices.filter(pk__in=choice_pks)
-        quiz_profile.evaluate_attempt(attempted_question, selected_choices)
 
-        if quiz.immediate_feedback:
-            # eltesszük a maradék időt
-            request.session['quiz_paused'] = True
-            request.session['paused_remaining'] = remaining
-            return redirect('quiz:submission_result', attempted_question.pk)
-        else:
-            return redirect('quiz:play', quiz_id=quiz.id)
+@login_required()
+@require_POST
+def sync_answers(request, quiz_id):
+    """
+    Válaszköteg szinkronizálása JSON-ban: {"attempt": id, "answers": [...], "finish": bool}.
+    Idempotens, így hálózati hiba után ugyanaz a köteg nyugodtan újraküldhető.
+    """
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    if not can_access(request.user, quiz):
+        return JsonResponse({'error': "Ehhez a kvízhez nincs hozzáférésed."}, status=403)
+    if quiz.immediate_feedback:
+        # a visszajelzésben látott helyes válasz után ne lehessen kötegben "javítani"
+        return JsonResponse({'error': "Azonnali visszajelzéses kvíz, kérdésenként kell beküldeni."}, status=409)
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+        answers = data.get('answers') or []
+        if not isinstance(answers, list):
+            raise ValueError
+    except (AttributeError, UnicodeDecodeError, ValueError):
+        return JsonResponse({'error': "Hibás kérés."}, status=400)
 
-    else:
-        # ha eddig pause-oltunk, akkor MOST megszüntetjük a pause-t
-        if request.session.get('quiz_paused', False):
-            request.session.pop('quiz_paused', None)
-            # a paused_remaining maradhat, de nem muszáj
-
-        quiz_questions = quiz.quiz_questions.all()
-        answered_ids = quiz_profile.attempts.values_list('question_id', flat=True)
-        next_quiz_question = quiz_questions.exclude(question__id__in=answered_ids).first()
-
-        if next_quiz_question:
-            # store the created AttemptedQuestion (create_attempt most now returns it)
-            attempted_question = quiz_profile.create_attempt(next_quiz_question.question)
-            context = {
-                'question': next_quiz_question.question,
-                'quiz': quiz,
-                'attempted_question': attempted_question,
-                'remaining_time': remaining,
-                'choices': next_quiz_question.question.choices.all(),   # Helyes attr
-            }
-        else:
-            return redirect('quiz:quiz_end', quiz_id=quiz.id)
-        
-        return render(request, 'quiz/play.html', context)
-        
+    quiz_profile, created = QuizProfile.objects.get_or_create(user=request.user)
+    quiz_attempt = QuizAttempt.objects.filter(quiz=quiz, user=request.user).order_by('-pk').first()
+    if quiz_attempt is None or quiz_attempt.pk != data.get('attempt'):
+        # közben újrakezdte a kvízt (vagy nem is ez a futása): a kliensnek újra le kell töltenie
+        return JsonResponse({'error': "A futás már nem aktuális."}, status=409)
+
+    try:
+        result = prefetch.sync_answers(quiz, quiz_profile, quiz_attempt, answers, finish=bool(data.get('finish')))
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse({
+        'accepted': result.accepted,
+        'rejected': result.rejected,
+        'already_answered': result.already_answered,
+        'finished': result.finished,
+        'expired': result.expired,
+        'end_url': reverse('quiz:quiz_end', args=[quiz.id]),
+    })
 
-from django.contrib.auth.models import User, Group
 
 @login_required
 def quiz_settings_view(request, quiz_id):
     quiz = get_object_or_404(Quiz, id=quiz_id)
     questions = [qq.question for qq in quiz.quiz_questions.all()]
 
-    # összes user és csoport a kiválasztáshoz
-    all_users = User.objects.all().order_by('username')
-    all_groups = Group.objects.all().order_by('name')
-
     if request.method == 'POST':
         # user-ek
         selected_user_ids = request.POST.getlist('allowed_users')
@@ -453,47 +619,80 @@ def quiz_settings_view(request, quiz_id):
     return render(request, 'quiz/quiz_settings.html', {
         'quiz': quiz,
         'questions': questions,
-        'all_users': all_users,
-        'all_groups': all_groups,
+        # csak a már kijelöltek; a többit a választó a quiz:access_search végpontról keresi
+        'allowed_users': quiz.allowed_users.order_by('username').only('pk', 'username'),
+        'allowed_groups': quiz.allowed_groups.order_by('name'),
     })
 
-def get_accessible_quizzes_for_user(user):
+
+@login_required
+def access_search(request):
     """
-    Visszaadja azokat a kvízeket, amiket a user láthat/tölthet.
-    Logika:
-    - ha a kvízhez NINCS felhasználó és NINCS csoport hozzárendelve → mindenki láthatja
-    - ha VAN hozzárendelve user/csoport → csak az láthatja, aki érintett
-    - superuser mindent lát
+    A hozzáférés-választók keresője (quiz.pickers), JSON-ban:
+    ?kind=user|group&q=előtag[&after=kurzor][&students=1]
     """
-    from .models import Quiz  # hogy ne legyen körkörös import
+    if not get_capabilities(request).can_manage_quizzes:
+        return JsonResponse({'error': "Nincs jogosultságod a kvízek kezeléséhez."}, status=403)
+    kind = request.GET.get('kind', pickers.USERS)
+    if kind not in (pickers.USERS, pickers.GROUPS):
+        return JsonResponse({'error': "Ismeretlen keresés."}, status=400)
+
+    page = pickers.search(kind, request.GET.get('q', '')[:150], cursor=request.GET.get('after'),
+                          students_only=request.GET.get('students') == '1')
+    return JsonResponse({
+        'results': [{'id': pk, 'text': text} for pk, text in page.results],
+        'next': page.next,
+    })
 
-    if not user.is_authenticated:
-        # nem belépett user csak a nyitott kvízeket lássa
-        return Quiz.objects.filter(allowed_users__isnull=True, allowed_groups__isnull=True).distinct()
 
-    # belépett user
-    # nyitott kvízek
-    qs_open = Quiz.objects.filter(
-        allowed_users__isnull=True,
-        allowed_groups__isnull=True
-    )
+@login_required
+def question_search(request):
+    """
+    A kérdésbank keresője a kvíz beállításaihoz (quiz.search), relevancia szerint, JSON-ban:
+    ?q=szavak[&quiz=id] – a megadott kvízben már szereplő kérdések kimaradnak
+    """
+    if not get_capabilities(request).can_manage_quizzes:
+        return JsonResponse({'error': "Nincs jogosultságod a kvízek kezeléséhez."}, status=403)
+    queryset = Question.objects.only('pk', 'html')
+    quiz_id = request.GET.get('quiz', '')
+    if quiz_id.isdigit():
+        queryset = queryset.exclude(quizquestions__quiz_id=quiz_id)
+    questions = search.ranked(queryset, search.search_ids(request.GET.get('q', '')[:150]))
+    return JsonResponse({
+        'results': [{'id': question.pk, 'text': Truncator(search.plain_text(question.html)).chars(120)}
+                    for question in questions],
+    })
 
-    # userre engedélyezett kvízek
-    qs_user = Quiz.objects.filter(
-        allowed_users=user
-    )
 
-    # csoportra engedélyezett kvízek
-    qs_group = Quiz.objects.filter(
-        allowed_groups__in=user.groups.all()
-    )
+@login_required
+@require_POST
+def add_existing_question(request, quiz_id):
+    """Egy kérdésbankban már meglévő kérdés hozzáadása a kvíz végére."""
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    if not get_capabilities(request).can_manage_quizzes:
+        messages.error(request, "Nincs jogosultságod a kvízek kezeléséhez.")
+        return redirect('quiz:quiz_settings', quiz_id=quiz.id)
+    question = get_object_or_404(Question, id=request.POST.get('question_id') or 0)
 
-    # ha superuser → mindent lát
-    if user.is_superuser:
-        return Quiz.objects.all().distinct()
+    if QuizQuestion.objects.filter(quiz=quiz, question=question).exists():
+        messages.info(request, "A kérdés már szerepel a kvízben.")
+    else:
+        max_order = QuizQuestion.objects.filter(quiz=quiz).aggregate(Max('order'))['order__max'] or 0
+        QuizQuestion.objects.create(quiz=quiz, question=question, order=max_order + 1)
+        bump_content_version(quiz)
+        messages.success(request, "A kérdés hozzáadva a kvízhez.")
+    return redirect('quiz:quiz_settings', quiz_id=quiz.id)
 
-    # egyesítjük
-    return (qs_open | qs_user | qs_group).distinct()
+def get_accessible_quizzes_for_user(user):
+    """
+    Visszaadja azokat a kvízeket, amiket a user láthat/tölthet.
+    Logika:
+    - ha a kvízhez NINCS felhasználó és NINCS csoport hozzárendelve → mindenki láthatja
+    - ha VAN hozzárendelve user/csoport → csak az láthatja, aki érintett
+    - superuser mindent lát
+    A számolást a quiz.access végzi az előre karbantartott QuizAccess indexből.
+    """
+    return accessible_quizzes(user)
 
 @login_required
 def edit_question(request, quiz_id, question_id):
@@ -535,6 +734,7 @@ def edit_question(request, quiz_id, question_id):
                         right_text=right
                     )
 
+                bump_content_version_for_question(question)
                 messages.success(request, "A párosító kérdés frissítve lett.")
                 return redirect('quiz:quiz_settings', quiz_id=quiz.id)
 
@@ -547,6 +747,7 @@ def edit_question(request, quiz_id, question_id):
                 question.correct_text_answer = form.cleaned_data['correct_text_answer']
                 question.save()
 
+                bump_content_version_for_question(question)
                 messages.success(request, "A szöveges kérdés frissítve lett.")
                 return redirect('quiz:quiz_settings', quiz_id=quiz.id)
 
@@ -590,6 +791,7 @@ def edit_question(request, quiz_id, question_id):
                                 is_correct=(index == correct_index)
                             )
 
+                bump_content_version_for_question(question)
                 messages.success(request, "A feleletválasztós kérdés frissítve lett.")
                 return redirect('quiz:quiz_settings', quiz_id=quiz.id)
 
@@ -670,6 +872,8 @@ def delete_question(request, quiz_id, question_id):
         # - Choice-ok
         # - MatchingPair-ek
         # - AttemptedQuestion / AttemptedMatch rekordok (FK CASCADE miatt)
+        # a verziót még a törlés előtt növeljük, amíg a kvíz-kapcsolat megvan
+        bump_content_version_for_question(question)
         question.delete()
         messages.success(request, "A kérdés sikeresen törölve lett.")
     else:
@@ -680,20 +884,15 @@ def delete_question(request, quiz_id, question_id):
 @login_required
 def quiz_results(request, quiz_id):
     quiz = get_object_or_404(Quiz, id=quiz_id)
-    quiz_profile = QuizProfile.objects.get(user=request.user)
-
-    # Csak az adott kvízhez tartozó AttemptedQuestion-ök
-    attempts = AttemptedQuestion.objects.filter(
-        quiz_profile=quiz_profile,
-        question__quizquestions__quiz=quiz
-    ).select_related('question').prefetch_related('selected_choices')
 
-    # Összpontszám
-    total_score = attempts.aggregate(total=models.Sum('marks_obtained'))['total'] or 0
+    # a legutóbbi futás eredménye, előre kiszámolt nézet-modellből,
+    # lezárt futásnál a cache-ből (quiz.results)
+    quiz_attempt = QuizAttempt.objects.filter(quiz=quiz, user=request.user).order_by('-pk').first()
+    summary_html, total_score = results.render_summary(quiz, quiz_attempt)
 
     context = {
         'quiz': quiz,
-        'attempts': attempts,
+        'summary_html': summary_html,
         'total_score': total_score,
     }
     return render(request, 'quiz/quiz_results.html', context)
@@ -735,16 +934,11 @@ def restart_quiz(request, quiz_id=None):
     # get_or_create visszaad egy tuple-t (obj, created) — ezt ki kell bontani
     quiz_profile, created = QuizProfile.objects.get_or_create(user=request.user)
 
-    # Töröljük csak a kiválasztott kvízhez tartozó próbálkozásokat (ha van ilyen logika)
-    # Ha a QuizQuestion model-t használod a quiz-hez tartozó kérdésekhez:
-    question_ids = quiz.quiz_questions.values_list('question_id', flat=True)
-    quiz_profile.attempts.filter(question__id__in=question_ids).delete()
+    # új futás indul; az előző a válaszaival együtt előzményként megmarad,
+    # a profil pontszámából csak annak a pontjai vonódnak le
+    quiz_profile.restart_quiz(quiz)
 
-    # Nullázzuk az összpontszámot (update_fields-t használva hatékonyabb)
-    quiz_profile.total_score = 0
-    quiz_profile.save(update_fields=['total_score'])
-
-    messages.success(request, "A kvíz újrakezdve — az eddigi próbálkozások törölve, pontszám nullázva.")
+    messages.success(request, "A kvíz újrakezdve — az előző próbálkozásod az előzmények között megmaradt.")
 
     # Visszairányítás a play view-hoz: fontos a quiz_id átadása
     return redirect('quiz:play', quiz_id=quiz.id)
@@ -752,15 +946,14 @@ def restart_quiz(request, quiz_id=None):
 @login_required
 def quiz_end(request, quiz_id):
     quiz = get_object_or_404(Quiz, id=quiz_id)
-    quiz_profile = QuizProfile.objects.get(user=request.user)
 
-    if 'quiz_start_time' in request.session:
-        del request.session['quiz_start_time']
+    # a folyamatban lévő futást lezárjuk
+    quiz_attempt = QuizAttempt.objects.filter(quiz=quiz, user=request.user).order_by('-pk').first()
+    if quiz_attempt is not None and not quiz_attempt.is_finished:
+        quiz_attempt.finish()
 
-    # Teljes pontszám összesítése AttemptedQuestion alapján
-    total_score = quiz_profile.attempts.filter(
-        question__in=quiz.get_questions()
-    ).aggregate(total=models.Sum('marks_obtained'))['total'] or 0
+    # a futás összpontszámát a válaszonkénti delták már vezetik
+    total_score = quiz_attempt.total_score if quiz_attempt is not None else 0
 
     context = {
         'quiz': quiz,
@@ -771,6 +964,13 @@ def quiz_end(request, quiz_id):
 
 
 
+@staff_member_required
+def instrumentation_stats(request):
+    # URL-névenkénti késleltetés, lekérdezésszám és SQL idő (quiz.instrumentation)
+    stats = collected_stats()
+    return JsonResponse({name: stats[name].summary() for name in sorted(stats)})
+
+
 def login_view(request):
     title = "Login"
     form = UserLoginForm(request.POST or None)
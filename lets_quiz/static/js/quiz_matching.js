@@ -4,9 +4,10 @@
 // - minden bal doboz max 1 elemet tartalmaz
 // - egy jobb oldali elem egyszerre csak egy balhoz lehet hozzárendelve
 // - vissza is lehet húzni a pool-ba
+// A quiz_play.js a válasz-API-n érkező új kérdésnél újra meghívja (window.initQuizMatching).
 
-document.addEventListener('DOMContentLoaded', function () {
-    const pool = document.getElementById('matching-right-container');
+function initQuizMatching(root) {
+    const pool = root.querySelector('#matching-right-container');
     if (!pool) return; // nincs párosító kérdés ezen az oldalon
 
     // 1) Jobb oldali elemek random sorrendbe keverése
@@ -42,7 +43,7 @@ document.addEventListener('DOMContentLoaded', function () {
     items.forEach(makeDraggable);
 
     // 3) Bal oldali droptargetek
-    const drops = document.querySelectorAll('.matching-drop');
+    const drops = root.querySelectorAll('.matching-drop');
 
     drops.forEach(drop => {
         drop.addEventListener('dragover', function (ev) {
@@ -135,4 +136,10 @@ document.addEventListener('DOMContentLoaded', function () {
             }
         });
     });
+}
+
+window.initQuizMatching = initQuizMatching;
+
+document.addEventListener('DOMContentLoaded', function () {
+    initQuizMatching(document);
 });
@@ -0,0 +1,104 @@
+// Hozzáférés-választók (select[data-search-url]): a lista csak a kijelölt elemeket tartalmazza,
+// a többit gépelés közben a kereső-végpontról (quiz:access_search) töltjük, oldalanként.
+// - találatra kattintva az elem bekerül a (kijelölt) listába
+// - a listában egy elemre kattintva kikerül belőle
+// - a "Több találat" gomb a következő oldalt kéri le (keyset kurzorral)
+
+document.addEventListener('DOMContentLoaded', function () {
+    if (!window.fetch) return;
+
+    document.querySelectorAll('select[data-search-url]').forEach(function (select) {
+        const input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control mb-2';
+        input.placeholder = 'Keresés (név eleje)…';
+
+        const results = document.createElement('div');
+        results.className = 'list-group mb-2 picker-results';
+
+        const more = document.createElement('button');
+        more.type = 'button';
+        more.className = 'btn btn-sm btn-outline-secondary mb-2';
+        more.textContent = 'Több találat';
+        more.style.display = 'none';
+
+        select.parentNode.insertBefore(input, select);
+        select.parentNode.insertBefore(results, select);
+        select.parentNode.insertBefore(more, select);
+
+        let next = null;
+        let timer = null;
+        let requestId = 0;
+
+        function hasOption(id) {
+            return Array.prototype.some.call(select.options, function (option) {
+                return option.value === String(id);
+            });
+        }
+
+        function addResult(item) {
+            const button = document.createElement('button');
+            button.type = 'button';
+            button.className = 'list-group-item list-group-item-action py-1';
+            button.textContent = item.text;
+            button.addEventListener('click', function () {
+                if (!hasOption(item.id)) {
+                    select.appendChild(new Option(item.text, item.id, true, true));
+                }
+                button.remove();
+            });
+            results.appendChild(button);
+        }
+
+        function load(reset) {
+            const current = ++requestId;
+            const url = new URL(select.dataset.searchUrl, window.location.href);
+            url.searchParams.set('q', input.value);
+            if (!reset && next) url.searchParams.set('after', next);
+
+            fetch(url, {credentials: 'same-origin', headers: {'X-Requested-With': 'XMLHttpRequest'}})
+                .then(function (response) {
+                    if (!response.ok) throw new Error('HTTP ' + response.status);
+                    return response.json();
+                })
+                .then(function (data) {
+                    // egy közben elindított újabb keresés eredménye az érvényes
+                    if (current !== requestId) return;
+                    if (reset) results.innerHTML = '';
+                    data.results.forEach(function (item) {
+                        if (!hasOption(item.id)) addResult(item);
+                    });
+                    next = data.next;
+                    more.style.display = next ? '' : 'none';
+                })
+                .catch(function () {
+                    more.style.display = 'none';
+                });
+        }
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            if (!input.value.trim()) {
+                results.innerHTML = '';
+                more.style.display = 'none';
+                return;
+            }
+            timer = setTimeout(function () { load(true); }, 250);
+        });
+        more.addEventListener('click', function () { load(false); });
+
+        // a listában kattintás = eltávolítás (a kijelölés ne a böngésző szerint változzon)
+        select.addEventListener('mousedown', function (ev) {
+            if (ev.target.tagName === 'OPTION') {
+                ev.preventDefault();
+                ev.target.remove();
+            }
+        });
+        // beküldéskor minden listaelem kijelölt legyen
+        if (select.form) {
+            select.form.addEventListener('submit', function () {
+                Array.prototype.forEach.call(select.options, function (option) { option.selected = true; });
+            });
+        }
+    });
+});
@@ -0,0 +1,93 @@
+// A play oldal válaszküldése a válasz-API-n (answer_api) keresztül, oldalújratöltés nélkül:
+// - a szerver egy válaszban adja vissza a visszajelzést (azonnali visszajelzésnél) és a következő kérdést
+// - a kérdés-részt (#question-body) és a visszajelzést (#answer-feedback) kicseréljük
+// - ha a fetch nem érhető el, az űrlap a megszokott módon (POST) küldődik el
+// - hiba esetén nem küldjük el automatikusan újra a választ: a hibát kiírjuk, és a gomb
+//   újra használható; ha a szerver az előző próbálkozást már feldolgozta, az ismételt
+//   beküldésre értékelés nélkül a soron következő kérdést adja vissza
+// Azonnali visszajelzés nélküli kvíznél az űrlapot a quiz_prefetch.js kezeli, és csak akkor
+// adja át ide (window.initQuizAnswerApi), ha az előzetes letöltés nem sikerült.
+
+function initQuizAnswerApi(form) {
+    if (!window.fetch || !window.FormData) return;
+
+    const body = document.getElementById('question-body');
+    const feedbackBox = document.getElementById('answer-feedback');
+    const button = form.querySelector('button[type="submit"]');
+
+    function AnswerError(message) {
+        this.message = message;
+    }
+
+    function showError(message) {
+        const alert = document.createElement('div');
+        alert.className = 'alert alert-danger';
+        alert.textContent = message;
+        feedbackBox.innerHTML = '';
+        feedbackBox.appendChild(alert);
+    }
+
+    function showEnd(endUrl) {
+        // visszajelzés nélkül rögtön az eredményoldalra megyünk
+        if (!feedbackBox.innerHTML.trim()) {
+            window.location.href = endUrl;
+            return;
+        }
+        form.parentNode.innerHTML =
+            '<div class="text-center">' +
+            '<a class="btn btn-info" href="' + endUrl + '">Tovább az eredményhez</a>' +
+            '</div>';
+    }
+
+    form.addEventListener('submit', function (ev) {
+        ev.preventDefault();
+        button.disabled = true;
+
+        fetch(form.dataset.answerUrl, {
+            method: 'POST',
+            body: new FormData(form),
+            credentials: 'same-origin',
+            headers: {'X-Requested-With': 'XMLHttpRequest'}
+        })
+            .then(function (response) {
+                if (!response.ok) {
+                    return response.json().catch(function () { return {}; }).then(function (data) {
+                        throw new AnswerError(data.error || 'A válasz beküldése nem sikerült (HTTP ' +
+                                              response.status + ').');
+                    });
+                }
+                return response.json();
+            })
+            .then(function (data) {
+                feedbackBox.innerHTML = data.feedback_html || '';
+                if (window.syncQuizTimer && data.remaining_time) {
+                    window.syncQuizTimer(data.remaining_time);
+                }
+                if (data.finished) {
+                    showEnd(data.end_url);
+                    return;
+                }
+                body.innerHTML = data.question_html;
+                if (window.initQuizMatching) window.initQuizMatching(body);
+                button.disabled = false;
+                window.scrollTo(0, 0);
+            })
+            .catch(function (error) {
+                if (error instanceof AnswerError) {
+                    showError(error.message);
+                    button.disabled = false;
+                    return;
+                }
+                // hálózati hiba: nem tudjuk, megérkezett-e a válasz; az ismétlést a user indítja
+                showError('Megszakadt a kapcsolat. Ellenőrizd a hálózatot, és küldd be újra a választ.');
+                button.disabled = false;
+            });
+    });
+}
+
+window.initQuizAnswerApi = initQuizAnswerApi;
+
+document.addEventListener('DOMContentLoaded', function () {
+    const form = document.querySelector('form.quiz-form[data-answer-url]');
+    if (form && !form.dataset.prefetchUrl) initQuizAnswerApi(form);
+});
@@ -0,0 +1,282 @@
+// Azonnali visszajelzés nélküli kvíz kitöltése előre letöltve (prefetch_quiz + sync_answers):
+// - a play oldal betöltése után egy kéréssel letöltjük a futás összes kérdését
+// - a kérdések között nincs szerverkérés: a válaszokat helyben gyűjtjük, és kötegekben
+//   (SYNC_EVERY válaszonként, a végén lezárással) küldjük a sync végpontra
+// - a még el nem küldött válaszok a localStorage-ban is megvannak, így oldalújratöltés
+//   vagy hálózati hiba után a köteg újraküldhető (a szinkron idempotens)
+// - ha a letöltés nem sikerül, a válasz-API-s mód (quiz_play.js) veszi át az űrlapot
+// - ha a futás közben lecserélődött (409, pl. újrakezdés másik fülön), újratöltjük az oldalt
+
+document.addEventListener('DOMContentLoaded', function () {
+    const form = document.querySelector('form.quiz-form[data-prefetch-url]');
+    if (!form) return;
+    if (!window.fetch || !window.FormData || !window.JSON) {
+        if (window.initQuizAnswerApi) window.initQuizAnswerApi(form);
+        return;
+    }
+
+    const SYNC_EVERY = 5;
+    const body = document.getElementById('question-body');
+    const feedbackBox = document.getElementById('answer-feedback');
+    const button = form.querySelector('button[type="submit"]');
+    const csrfToken = form.querySelector('input[name="csrfmiddlewaretoken"]').value;
+
+    let attempt = null;
+    let questions = {};
+    let index = 0;
+    let pending = [];
+    let syncing = null;
+
+    function storageKey() {
+        return 'quiz_sync:' + attempt.id;
+    }
+
+    function saveLocal() {
+        try {
+            window.localStorage.setItem(storageKey(), JSON.stringify(pending));
+        } catch (e) { /* privát mód: csak memóriában tartjuk */ }
+    }
+
+    function loadLocal() {
+        try {
+            return JSON.parse(window.localStorage.getItem(storageKey()) || '[]');
+        } catch (e) {
+            return [];
+        }
+    }
+
+    function showError(message) {
+        const alert = document.createElement('div');
+        alert.className = 'alert alert-danger';
+        alert.textContent = message;
+        feedbackBox.innerHTML = '';
+        feedbackBox.appendChild(alert);
+    }
+
+    function el(tag, className, text) {
+        const node = document.createElement(tag);
+        if (className) node.className = className;
+        if (text !== undefined) node.textContent = text;
+        return node;
+    }
+
+    function hidden(name, value) {
+        const input = el('input');
+        input.type = 'hidden';
+        input.name = name;
+        input.value = value;
+        return input;
+    }
+
+    function choiceLabel(type, name, choice, labelClass, textTag) {
+        const label = el('label', labelClass);
+        const input = el('input');
+        input.type = type;
+        input.name = name;
+        input.value = choice.id;
+        const text = el(textTag, textTag === 'p' ? 'text' : '');
+        // a kérdés és a válaszlehetőségek HTML-je ugyanúgy megy ki, mint a szerveroldali sablonban
+        text.innerHTML = choice.html;
+        label.appendChild(input);
+        label.appendChild(text);
+        return label;
+    }
+
+    // a quiz/play_question.html sablon kliensoldali megfelelője
+    function renderQuestion(question) {
+        body.innerHTML = '';
+        body.appendChild(hidden('question_pk', question.id));
+        const text = el('div', 'question-text mb-4');
+        text.innerHTML = question.html;
+        body.appendChild(text);
+
+        if (question.kind === 'matching') {
+            const hint = el('p', 'text-center mb-3');
+            hint.appendChild(el('strong', '', 'Húzd rá a jobb oldali elemeket a megfelelő bal oldali párjukra!'));
+            body.appendChild(hint);
+            const row = el('div', 'row');
+            const left = el('div', 'col-md-6 mb-3');
+            question.pairs.left.forEach(function (pair) {
+                const drop = el('div', 'matching-drop mb-3');
+                drop.dataset.leftId = pair.id;
+                drop.appendChild(el('div', 'matching-left-text', pair.text));
+                drop.appendChild(el('div', 'matching-hint', 'Ide húzd a párját →'));
+                drop.appendChild(el('div', 'matching-slot mt-2'));
+                const input = hidden('mapping_' + pair.id, '');
+                input.id = 'mapping_' + pair.id;
+                drop.appendChild(input);
+                left.appendChild(drop);
+            });
+            const right = el('div', 'col-md-6 mb-3');
+            const pool = el('div');
+            pool.id = 'matching-right-container';
+            question.pairs.right.forEach(function (item) {
+                const node = el('div', 'matching-right-item', item.text);
+                node.draggable = true;
+                node.dataset.rightId = item.id;
+                pool.appendChild(node);
+            });
+            right.appendChild(pool);
+            row.appendChild(left);
+            row.appendChild(right);
+            body.appendChild(row);
+            if (window.initQuizMatching) window.initQuizMatching(body);
+        } else if (question.kind === 'multiple') {
+            const hint = el('p', 'text-center mb-3');
+            hint.appendChild(el('strong', '', 'Több helyes válasz is lehetséges!'));
+            body.appendChild(hint);
+            const box = el('div', 'checkbox-container');
+            question.choices.forEach(function (choice) {
+                box.appendChild(choiceLabel('checkbox', 'choices', choice, 'checkbox-label', 'span'));
+            });
+            body.appendChild(box);
+        } else if (question.kind === 'text') {
+            const group = el('div', 'form-group mt-3');
+            group.appendChild(el('label', 'font-weight-semibold', 'Írd be a válaszod:'));
+            const input = el('input', 'form-control');
+            input.type = 'text';
+            input.name = 'text_answer';
+            input.placeholder = 'Válasz...';
+            group.appendChild(input);
+            body.appendChild(group);
+        } else {
+            const box = el('div', 'radio-input mt-2');
+            question.choices.forEach(function (choice) {
+                box.appendChild(choiceLabel('radio', 'choice_pk', choice, 'label', 'p'));
+            });
+            body.appendChild(box);
+        }
+        window.scrollTo(0, 0);
+    }
+
+    // az űrlap aktuális állapota a sync végpont válaszformátumában
+    function collectAnswer() {
+        const data = new FormData(form);
+        const answer = {question: parseInt(data.get('question_pk'), 10), mapping: {}};
+        answer.choices = data.getAll('choices').concat(data.getAll('choice_pk')).map(function (value) {
+            return parseInt(value, 10);
+        });
+        if (data.get('text_answer') !== null) answer.text = data.get('text_answer');
+        form.querySelectorAll('input[name^="mapping_"]').forEach(function (input) {
+            if (input.value) answer.mapping[input.name.slice(8)] = input.value;
+        });
+        return answer;
+    }
+
+    function postJson(url, data) {
+        return fetch(url, {
+            method: 'POST',
+            body: JSON.stringify(data),
+            credentials: 'same-origin',
+            headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrfToken}
+        }).then(function (response) {
+            if (response.status === 409) {
+                window.location.reload();
+                return new Promise(function () {});
+            }
+            return response.json().catch(function () { return {}; }).then(function (result) {
+                if (!response.ok) {
+                    throw new Error(result.error || 'A válaszok mentése nem sikerült (HTTP ' + response.status + ').');
+                }
+                return result;
+            });
+        });
+    }
+
+    // a függő válaszok elküldése; egyszerre csak egy köteg megy, a többi a következővel
+    function flush(finish) {
+        if (syncing) {
+            return syncing.then(function () { return flush(finish); });
+        }
+        const batch = pending.slice();
+        syncing = postJson(form.dataset.syncUrl, {attempt: attempt.id, answers: batch, finish: !!finish})
+            .then(function (result) {
+                pending = pending.slice(batch.length);
+                saveLocal();
+                if (result.finished) {
+                    window.location.href = result.end_url;
+                    return new Promise(function () {});
+                }
+                return result;
+            })
+            .finally(function () {
+                syncing = null;
+            });
+        return syncing;
+    }
+
+    function showQuestion() {
+        if (index >= attempt.order.length) {
+            button.disabled = true;
+            flush(true).catch(function (error) {
+                showError(error.message + ' Kattints újra a beküldéshez.');
+                button.disabled = false;
+            });
+            return;
+        }
+        const question = questions[attempt.order[index]];
+        if (!question) {
+            // közben törölt kérdés: kihagyjuk, ahogy a szerveroldali play is
+            index += 1;
+            showQuestion();
+            return;
+        }
+        renderQuestion(question);
+    }
+
+    function start() {
+        form.addEventListener('submit', function (ev) {
+            ev.preventDefault();
+            feedbackBox.innerHTML = '';
+            if (index < attempt.order.length) {
+                pending.push(collectAnswer());
+                saveLocal();
+                index += 1;
+                if (pending.length >= SYNC_EVERY && index < attempt.order.length) {
+                    // háttérben megy; hiba esetén a válaszok a következő köteggel újra mennek
+                    flush(false).catch(function () {});
+                }
+            }
+            showQuestion();
+        });
+
+        // a lejáró óra előbb elküldi (és lezárja) a még függő válaszokat
+        window.onQuizTimeout = function (endUrl) {
+            flush(true).catch(function () {
+                window.location.href = endUrl;
+            });
+        };
+
+        // egy korábbi (újratöltött) oldalon el nem küldött válaszok
+        const stored = loadLocal();
+        pending = stored;
+        const served = attempt.order.indexOf(parseInt(form.querySelector('input[name="question_pk"]').value, 10));
+        index = served < 0 ? attempt.start_index : served;
+        stored.forEach(function (answer) {
+            index = Math.max(index, attempt.order.indexOf(answer.question) + 1);
+        });
+        if (index !== served) showQuestion();
+        if (pending.length) flush(false).catch(function () {});
+    }
+
+    fetch(form.dataset.prefetchUrl, {credentials: 'same-origin', headers: {'X-Requested-With': 'XMLHttpRequest'}})
+        .then(function (response) {
+            if (!response.ok) throw new Error('HTTP ' + response.status);
+            return response.json();
+        })
+        .then(function (data) {
+            if (data.attempt.finished) {
+                window.location.href = form.dataset.endUrl;
+                return;
+            }
+            attempt = data.attempt;
+            data.questions.forEach(function (question) {
+                questions[question.id] = question;
+            });
+            start();
+        })
+        .catch(function () {
+            // letöltés nélkül kérdésenként küldünk a válasz-API-n
+            if (window.initQuizAnswerApi) window.initQuizAnswerApi(form);
+        });
+});
@@ -0,0 +1,59 @@
+// Kérdésbank-kereső a kvíz beállításaiban (form[data-search-url]): gépelés közben a
+// teljes szöveges keresőtől (quiz:question_search) kéri a találatokat relevancia szerint,
+// egy találatra kattintva a kérdés a kvíz végére kerül (quiz:add_existing_question).
+
+document.addEventListener('DOMContentLoaded', function () {
+    if (!window.fetch) return;
+
+    document.querySelectorAll('form.question-bank-picker[data-search-url]').forEach(function (form) {
+        const input = form.querySelector('input[type=search]');
+        const results = form.querySelector('.picker-results');
+
+        let timer = null;
+        let requestId = 0;
+
+        function addResult(item) {
+            const button = document.createElement('button');
+            button.type = 'submit';
+            button.name = 'question_id';
+            button.value = item.id;
+            button.className = 'list-group-item list-group-item-action py-1';
+            button.textContent = item.text;
+            results.appendChild(button);
+        }
+
+        function load() {
+            const current = ++requestId;
+            const url = new URL(form.dataset.searchUrl, window.location.href);
+            url.searchParams.set('q', input.value);
+
+            fetch(url, {credentials: 'same-origin', headers: {'X-Requested-With': 'XMLHttpRequest'}})
+                .then(function (response) {
+                    if (!response.ok) throw new Error('HTTP ' + response.status);
+                    return response.json();
+                })
+                .then(function (data) {
+                    // egy közben elindított újabb keresés eredménye az érvényes
+                    if (current !== requestId) return;
+                    results.innerHTML = '';
+                    data.results.forEach(addResult);
+                })
+                .catch(function () {
+                    results.innerHTML = '';
+                });
+        }
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            if (!input.value.trim()) {
+                results.innerHTML = '';
+                return;
+            }
+            timer = setTimeout(load, 250);
+        });
+        // Enter a keresőmezőben ne küldje be az űrlapot kérdés nélkül
+        form.addEventListener('submit', function (ev) {
+            if (!ev.submitter || ev.submitter.name !== 'question_id') ev.preventDefault();
+        });
+    });
+});
@@ -24,7 +24,12 @@ document.addEventListener("DOMContentLoaded", () => {
 
         if (timeLeft <= 0) {
             display.innerHTML = "Lejárt az idő!";
-            window.location.href = display.dataset.endurl;
+            // előre letöltött kvíznél (quiz_prefetch.js) előbb a függő válaszok mennek el
+            if (window.onQuizTimeout) {
+                window.onQuizTimeout(display.dataset.endurl);
+            } else {
+                window.location.href = display.dataset.endurl;
+            }
             return;
         }
 
@@ -32,6 +37,11 @@ document.addEventListener("DOMContentLoaded", () => {
         timeLeft -= 1;
     }
 
+    // a válasz-API (quiz_play.js) minden válasszal visszaküldi a szerver szerinti hátralévő időt
+    window.syncQuizTimer = function (seconds) {
+        timeLeft = parseInt(seconds);
+    };
+
     tick();
     setInterval(tick, 1000);
 });